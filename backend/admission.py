@@ -0,0 +1,534 @@
+"""
+Admission control for model-backed analyses.
+
+Cache hits never reach this module; every analysis that needs the model
+first takes one of ADMISSION_MAX_CONCURRENT slots. Requests are classified
+from their headers into priority classes:
+
+- internal: callers presenting one of ADMISSION_INTERNAL_KEYS in the
+  X-Satya-Internal-Key header (batch jobs, operators)
+- authenticated: signed-in users, identified by the verified user ID a
+  trusted gateway passes in the header named by TRUSTED_USER_HEADER (the
+  gateway must strip that header from client requests)
+- anonymous: everything else, including requests with an Authorization
+  bearer token the gateway did not verify
+
+Each client (its user ID, a hash of its internal key, or its address for
+anonymous requests) has a token bucket sized by its class, and anonymous
+requests may hold at most ADMISSION_ANONYMOUS_SHARE of the slots, so a
+flood of anonymous checks always leaves room for signed-in users. When
+every slot is busy, requests wait in a bounded queue and are granted slots
+highest class first, oldest first within a class. A request is shed -
+answered by the heuristic analyzer instead of the model - when its client
+is over its rate, when the queue is full of requests at least as
+important, when a more important request pushes it out of a full queue, or
+when it has waited ADMISSION_MAX_WAIT seconds (less if its deadline is
+closer).
+
+Rates are per HTTP request, not per analysis: a batch takes one token
+before it fans out (charge_request), and its items then only compete for
+slots. A batch from a client over its rate has every item shed as rate
+limited, never a random subset.
+
+Bearer tokens are not verified here, and anyone can make one up: trusting
+them would let a single caller present a fresh token, and so a fresh
+authenticated bucket, on every request. Until the gateway verifies
+sign-ins and sets TRUSTED_USER_HEADER, every request without an internal
+key is anonymous and rate-limited by address.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import get_registry
+from resilience import remaining_budget
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') != '0'
+# Model-backed analyses running at once in this process
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 32))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 64))
+ADMISSION_MAX_WAIT = float(os.environ.get('ADMISSION_MAX_WAIT', 3))
+# Fraction of the slots anonymous requests may hold
+ADMISSION_ANONYMOUS_SHARE = float(os.environ.get('ADMISSION_ANONYMOUS_SHARE', 0.75))
+ADMISSION_INTERNAL_KEYS = [key for key in os.environ.get('ADMISSION_INTERNAL_KEYS', '').split(',') if key]
+# Proxies in front of the service that append to X-Forwarded-For
+ADMISSION_TRUSTED_PROXIES = int(os.environ.get('ADMISSION_TRUSTED_PROXIES', 1))
+ADMISSION_MAX_CLIENTS = int(os.environ.get('ADMISSION_MAX_CLIENTS', 10000))
+# Header carrying the verified user ID, set by a trusted gateway
+TRUSTED_USER_HEADER = os.environ.get('TRUSTED_USER_HEADER', '')
+
+INTERNAL_KEY_HEADER = 'X-Satya-Internal-Key'
+
+INTERNAL = 'internal'
+AUTHENTICATED = 'authenticated'
+ANONYMOUS = 'anonymous'
+
+# Rank (lower is served first) and per-client token bucket of each class;
+# a rate of None means no per-client limit
+PRIORITY_CLASSES = {
+    INTERNAL: {'rank': 0, 'rate': None, 'burst': None},
+    AUTHENTICATED: {
+        'rank': 1,
+        'rate': float(os.environ.get('ADMISSION_RATE_AUTHENTICATED', 2)),
+        'burst': float(os.environ.get('ADMISSION_BURST_AUTHENTICATED', 10))
+    },
+    ANONYMOUS: {
+        'rank': 2,
+        'rate': float(os.environ.get('ADMISSION_RATE_ANONYMOUS', 0.5)),
+        'burst': float(os.environ.get('ADMISSION_BURST_ANONYMOUS', 5))
+    }
+}
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ADMITTED = get_registry().counter(
+    'satya_admission_admitted_total', 'Analyses granted a model slot, by priority class.', ['priority']
+)
+SHED = get_registry().counter(
+    'satya_admission_shed_total',
+    'Analyses shed to the heuristic analyzer, by priority class and reason '
+    '(rate_limited, queue_full, evicted, wait_timeout).',
+    ['priority', 'reason']
+)
+WAIT_SECONDS = get_registry().histogram(
+    'satya_admission_wait_seconds', 'Time spent waiting for a model slot, by priority class.',
+    ['priority'], buckets=WAIT_BUCKETS
+)
+
+_current_client = contextvars.ContextVar('satya_admission_client', default=None)
+
+
+class AdmissionShedError(Exception):
+    """Raised when a request is shed instead of being given a model slot."""
+
+    def __init__(self, reason, priority):
+        super().__init__(f"Shed {priority} request ({reason})")
+        self.reason = reason
+        self.priority = priority
+
+
+class Client:
+    """
+    Priority class, rate-limit key and user of a request.
+
+    Args:
+        priority (str): Priority class
+        key (str): Rate-limit key
+        user (str): User the request's verdicts belong to; None for anonymous requests
+        prepaid (bool): Set by charge_request for a request charged up front:
+            True if the charge went through, so its analyses skip the token
+            bucket, False if the client was over its rate; None charges
+            each analysis
+        deferrable (bool): Whether a shed analysis can be retried later (a
+            queued job) instead of being answered by the heuristic
+    """
+
+    def __init__(self, priority, key, user=None, prepaid=None, deferrable=False):
+        self.priority = priority
+        self.key = key
+        self.user = user
+        self.prepaid = prepaid
+        self.deferrable = deferrable
+        self.rank = PRIORITY_CLASSES[priority]['rank']
+
+    def __repr__(self):
+        return f"Client({self.priority!r}, {self.key!r})"
+
+
+# Work started outside a request (warm-up, scripts) is never throttled
+LOCAL_CLIENT = Client(INTERNAL, 'local')
+
+
+def _digest(secret):
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:16]
+
+
+def client_address(headers, remote_addr):
+    """
+    Address of the caller, taken from X-Forwarded-For behind trusted proxies.
+
+    Entries added by the client itself are ignored: with N trusted proxies
+    the caller is the Nth entry from the right.
+    """
+    forwarded = headers.get('X-Forwarded-For')
+    if forwarded and ADMISSION_TRUSTED_PROXIES > 0:
+        hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+        if hops:
+            return hops[-min(ADMISSION_TRUSTED_PROXIES, len(hops))]
+    return remote_addr or 'unknown'
+
+
+def classify_client(headers, remote_addr=None):
+    """
+    Derive a request's priority class and client key from its headers.
+
+    Args:
+        headers: Request headers (flask or starlette, case-insensitive get)
+        remote_addr (str): Peer address of the connection
+
+    Returns:
+        Client: The classified client
+    """
+    user_id = headers.get(TRUSTED_USER_HEADER) if TRUSTED_USER_HEADER else None
+    user = f"user:{user_id.strip()}" if user_id and user_id.strip() else None
+
+    internal_key = headers.get(INTERNAL_KEY_HEADER)
+    if internal_key and any(hmac.compare_digest(internal_key, key) for key in ADMISSION_INTERNAL_KEYS):
+        key = f"internal:{_digest(internal_key)}"
+        return Client(INTERNAL, key, user or key)
+
+    # Only a verified identity earns priority; an unverified bearer token
+    # is rate-limited with the address it came from
+    if user is not None:
+        return Client(AUTHENTICATED, user, user)
+
+    return Client(ANONYMOUS, f"ip:{client_address(headers, remote_addr)}")
+
+
+@contextmanager
+def bind_client(client):
+    """
+    Make client the one admission control sees for work in this context.
+    """
+    token = _current_client.set(client)
+    try:
+        yield client
+    finally:
+        _current_client.reset(token)
+
+
+def current_client():
+    """
+    Return the client of the request being handled (LOCAL_CLIENT outside one).
+    """
+    return _current_client.get() or LOCAL_CLIENT
+
+
+class TokenBucket:
+    """
+    Per-client request rate limit.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _Waiter:
+    """
+    A queued request; woken when granted a slot or pushed out of the queue.
+    """
+
+    def __init__(self, client, sequence, loop=None):
+        self.client = client
+        self.sequence = sequence
+        self.granted = False
+        self.shed_reason = None
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionTicket:
+    """
+    A granted model slot; release it (or use it as a context manager) when done.
+    """
+
+    def __init__(self, controller, client):
+        self.controller = controller
+        self.client = client
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self.client)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Bounded priority queue in front of a fixed number of model slots.
+
+    Args:
+        max_concurrent (int): Slots, i.e. analyses holding the model at once
+        queue_size (int): Requests allowed to wait for a slot
+        max_wait (float): Longest a request waits before it is shed
+        anonymous_share (float): Fraction of the slots anonymous requests may hold
+        max_clients (int): Token buckets kept; the least recently used are dropped
+    """
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, queue_size=ADMISSION_QUEUE_SIZE,
+                 max_wait=ADMISSION_MAX_WAIT, anonymous_share=ADMISSION_ANONYMOUS_SHARE,
+                 max_clients=ADMISSION_MAX_CLIENTS):
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_size = max(0, queue_size)
+        self.max_wait = max_wait
+        self.max_clients = max_clients
+        self.class_limits = {name: self.max_concurrent for name in PRIORITY_CLASSES}
+        self.class_limits[ANONYMOUS] = max(1, math.floor(self.max_concurrent * anonymous_share))
+        self._active = 0
+        self._class_active = {name: 0 for name in PRIORITY_CLASSES}
+        self._queue = []
+        self._sequence = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, client):
+        settings = PRIORITY_CLASSES[client.priority]
+        if settings['rate'] is None:
+            return None
+        bucket = self._buckets.get(client.key)
+        if bucket is None:
+            bucket = self._buckets[client.key] = TokenBucket(settings['rate'], settings['burst'])
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client.key)
+        return bucket
+
+    def _has_slot(self, priority):
+        return self._active < self.max_concurrent and self._class_active[priority] < self.class_limits[priority]
+
+    def _take_slot(self, priority):
+        self._active += 1
+        self._class_active[priority] += 1
+
+    def _shed(self, client, reason):
+        SHED.inc(priority=client.priority, reason=reason)
+        return AdmissionShedError(reason, client.priority)
+
+    def _enter(self, client, loop):
+        """
+        Admit, queue or shed a request; call with the lock held.
+
+        Returns:
+            _Waiter: The queued waiter, or None if a slot was taken right away
+
+        Raises:
+            AdmissionShedError: If the client is over its rate or the queue is full
+        """
+        if client.prepaid is None:
+            bucket = self._bucket(client)
+            if bucket is not None and not bucket.take(time.monotonic()):
+                raise self._shed(client, 'rate_limited')
+        elif not client.prepaid:
+            raise self._shed(client, 'rate_limited')
+
+        # Queued requests are only ever waiting on a full pool or their own
+        # class limit, so a free slot needs no queue check
+        if self._has_slot(client.priority):
+            self._take_slot(client.priority)
+            return None
+
+        if len(self._queue) >= self.queue_size:
+            # Push out the newest request of the least important class, if it
+            # is less important than this one
+            victim = max(self._queue, key=lambda waiter: (waiter.client.rank, waiter.sequence), default=None)
+            if victim is None or victim.client.rank <= client.rank:
+                raise self._shed(client, 'queue_full')
+            self._queue.remove(victim)
+            victim.shed_reason = 'evicted'
+            victim.wake()
+
+        self._sequence += 1
+        waiter = _Waiter(client, self._sequence, loop)
+        self._queue.append(waiter)
+        return waiter
+
+    def _dispatch(self):
+        """
+        Grant free slots to the best eligible waiters; call with the lock held.
+        """
+        while self._queue and self._active < self.max_concurrent:
+            eligible = [waiter for waiter in self._queue if self._has_slot(waiter.client.priority)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda candidate: (candidate.client.rank, candidate.sequence))
+            self._queue.remove(waiter)
+            self._take_slot(waiter.client.priority)
+            waiter.granted = True
+            waiter.wake()
+
+    def _release(self, client):
+        with self._lock:
+            self._active -= 1
+            self._class_active[client.priority] -= 1
+            self._dispatch()
+
+    def _wait_timeout(self, timeout):
+        wait = self.max_wait if timeout is None else timeout
+        return max(0.0, min(wait, remaining_budget()))
+
+    def _settle(self, waiter, started):
+        """
+        Turn a finished wait into a ticket, or shed; call with the lock held.
+        """
+        client = waiter.client
+        if waiter.granted:
+            return self._admitted(client, started)
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+        raise self._shed(client, waiter.shed_reason or 'wait_timeout')
+
+    def _admitted(self, client, started):
+        ADMITTED.inc(priority=client.priority)
+        WAIT_SECONDS.observe(time.monotonic() - started, priority=client.priority)
+        return AdmissionTicket(self, client)
+
+    def acquire(self, client, timeout=None):
+        """
+        Take a model slot for client, waiting in priority order if none is free.
+
+        Args:
+            client (Client): From classify_client
+            timeout (float): Longest wait; max_wait (capped by the request's
+                remaining deadline) by default
+
+        Returns:
+            AdmissionTicket: The granted slot
+
+        Raises:
+            AdmissionShedError: If the request is shed
+        """
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._enter(client, None)
+            if waiter is None:
+                return self._admitted(client, started)
+        waiter.event.wait(self._wait_timeout(timeout))
+        with self._lock:
+            return self._settle(waiter, started)
+
+    async def acquire_async(self, client, timeout=None):
+        """
+        Async counterpart of acquire(); waits without blocking the event loop.
+        """
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._enter(client, asyncio.get_running_loop())
+            if waiter is None:
+                return self._admitted(client, started)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self._wait_timeout(timeout))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                granted = waiter.granted
+            if granted:
+                self._release(client)
+            raise
+        with self._lock:
+            return self._settle(waiter, started)
+
+    def charge(self, client):
+        """
+        Take one token for a request that fans out into several analyses.
+
+        Returns:
+            Client: client marked as prepaid, or as over its rate
+        """
+        with self._lock:
+            bucket = self._bucket(client)
+            paid = bucket is None or bucket.take(time.monotonic())
+        return Client(client.priority, client.key, client.user, prepaid=paid, deferrable=client.deferrable)
+
+    def queue_depths(self):
+        with self._lock:
+            depths = {name: 0 for name in PRIORITY_CLASSES}
+            for waiter in self._queue:
+                depths[waiter.client.priority] += 1
+            return depths
+
+    def in_flight(self):
+        with self._lock:
+            return dict(self._class_active)
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """
+    Return the process-wide admission controller, or None if ADMISSION_ENABLED is off.
+    """
+    global _controller
+    if not ADMISSION_ENABLED:
+        return None
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
+
+
+def charge_request(client):
+    """
+    Charge a multi-item request against its client's rate once, before it fans out.
+
+    Args:
+        client (Client): From classify_client
+
+    Returns:
+        Client: The client to bind for the request's analyses
+    """
+    controller = get_admission_controller()
+    if controller is None:
+        return client
+    return controller.charge(client)
+
+
+def collect_admission_metrics():
+    """
+    Metrics collector exposing queue depth and slots in use per priority class.
+
+    Returns:
+        list: (name, kind, documentation, samples) tuples for metrics.MetricsRegistry
+    """
+    if _controller is None:
+        return []
+    return [
+        ('satya_admission_queue_depth', 'gauge', 'Analyses waiting for a model slot.',
+         [({'priority': name}, depth) for name, depth in _controller.queue_depths().items()]),
+        ('satya_admission_in_flight', 'gauge', 'Model slots in use.',
+         [({'priority': name}, active) for name, active in _controller.in_flight().items()])
+    ]
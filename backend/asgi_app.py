@@ -0,0 +1,426 @@
+"""
+Async ASGI serving mode for the analysis backend.
+
+The Cloud Function entry points in main.py block a worker thread on the
+target site and on Vertex for the whole analysis. This app serves the same
+endpoints on an event loop instead: URL fetches go through the pooled
+httpx client in fetcher.AsyncURLFetcher and model calls through
+generate_content_async, so a single process can hold hundreds of analyses
+in flight. Validation, prompt building, response parsing and shaping,
+caching and the heuristic fallback are shared with main.py.
+
+Run locally with:
+    uvicorn asgi_app:app --port 8080
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import main
+from admission import AdmissionShedError, bind_client, charge_request, classify_client, current_client, get_admission_controller
+from chunking import plan_chunks
+from extractor import extract_text
+from fetcher import get_async_fetcher
+from image_input import ImageInputError, ImageTooLargeError, prepare_image
+from metrics import EXPOSITION_MIMETYPE, get_registry
+from request_limits import MAX_BATCH_REQUEST_BYTES, PayloadTooLargeError, content_preview, read_json_body_async
+from resilience import CircuitOpenError, fallback_reason, get_model_caller, record_fallback
+from serialization import JSON_MIMETYPE, render_json
+from singleflight import AsyncSingleFlight
+from tracing import stage, start_trace
+from triage import triage_content
+from verdict_store import record_verdict
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on analyses running at once in this process
+ASYNC_MAX_IN_FLIGHT = int(os.environ.get('ASYNC_MAX_IN_FLIGHT', 512))
+
+_in_flight = None
+_analysis_flights = AsyncSingleFlight('analysis')
+
+
+def _json(payload, status_code=200):
+    return JSONResponse(payload, status_code=status_code, headers=main.CORS_HEADERS)
+
+
+def _render(request, payload, status_code=200, headers=main.CORS_HEADERS):
+    """
+    Response through serialization.render_json, as main.json_response.
+    """
+    body, status_code, extra_headers = render_json(payload, status_code, request.headers, request.method)
+    return Response(body, status_code=status_code, headers={**headers, **extra_headers}, media_type=JSON_MIMETYPE)
+
+
+async def analyze(request):
+    """
+    Async equivalent of main.analyze_content.
+    """
+
+    if request.method == 'OPTIONS':
+        return Response(status_code=204, headers=main.CORS_HEADERS)
+
+    trace = start_trace('analyze')
+    with trace.stage('request_parse'):
+        try:
+            request_json = await read_json_body_async(request)
+        except PayloadTooLargeError as size_error:
+            logger.warning(f"Rejected request: {str(size_error)}")
+            return _json({'error': str(size_error)}, 413)
+        validation_error = main.validate_analysis_item(request_json) if request_json else None
+
+    if not request_json:
+        return _json({'error': 'Invalid JSON payload'}, 400)
+
+    if validation_error:
+        return _json({'error': validation_error}, 400)
+
+    content_type = request_json.get('type')
+    content_data = request_json.get('data')
+    client = classify_client(request.headers, request.client.host if request.client else None)
+    logger.info(f"Received async analysis request - Type: {content_type}, Priority: {client.priority}")
+    logger.info(f"Content data: {content_preview(content_type, content_data)}")
+
+    try:
+        with trace, bind_client(client):
+            async with _in_flight:
+                analysis_result = trace.annotate(await analyze_coalesced_async(content_type, content_data))
+    except main.ContentFetchError as url_error:
+        return _json({'error': f'Failed to fetch content from URL: {str(url_error)}'}, 400)
+    except ImageInputError as image_error:
+        return _json({'error': str(image_error)}, 413 if isinstance(image_error, ImageTooLargeError) else 400)
+    except ValueError as value_error:
+        logger.error(f"Value error: {str(value_error)}")
+        return _json({'error': 'Invalid data format or values provided.'}, 400)
+    except Exception as e:
+        logger.error(f"Unexpected error processing request: {str(e)}")
+        return _json({'error': 'An internal error occurred during analysis.'}, 500)
+
+    return _render(request, analysis_result)
+
+
+async def analyze_batch(request):
+    """
+    Async equivalent of main.analyze_batch.
+    """
+
+    if request.method == 'OPTIONS':
+        return Response(status_code=204, headers=main.CORS_HEADERS)
+
+    trace = start_trace('batch')
+    with trace.stage('request_parse'):
+        try:
+            request_json = await read_json_body_async(request, MAX_BATCH_REQUEST_BYTES)
+        except PayloadTooLargeError as size_error:
+            logger.warning(f"Rejected batch request: {str(size_error)}")
+            return _json({'error': str(size_error)}, 413)
+        items = request_json.get('items') if isinstance(request_json, dict) else None
+
+    if not isinstance(items, list) or not items:
+        return _json({'error': "Invalid request. 'items' must be a non-empty list."}, 400)
+    if len(items) > main.BATCH_MAX_ITEMS:
+        return _json({'error': f"Too many items. A batch may contain at most {main.BATCH_MAX_ITEMS} items."}, 400)
+
+    try:
+        concurrency = int(request_json.get('concurrency', main.BATCH_CONCURRENCY))
+    except (TypeError, ValueError):
+        concurrency = main.BATCH_CONCURRENCY
+    concurrency = max(1, min(concurrency, main.BATCH_CONCURRENCY))
+
+    results = [None] * len(items)
+    pending = {}
+    for index, item in enumerate(items):
+        validation_error = main.validate_analysis_item(item)
+        if validation_error:
+            results[index] = {'index': index, 'error': validation_error}
+            continue
+        pending.setdefault(main.batch_item_key(item), []).append(index)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(indexes):
+        item = items[indexes[0]]
+        async with semaphore, _in_flight:
+            try:
+                with start_trace('batch_item') as item_trace:
+                    outcome = {'result': item_trace.annotate(await analyze_coalesced_async(item['type'], item['data']))}
+            except main.ContentFetchError as url_error:
+                outcome = {'error': f'Failed to fetch content from URL: {str(url_error)}'}
+            except ImageInputError as image_error:
+                outcome = {'error': str(image_error)}
+            except ValueError:
+                outcome = {'error': 'Invalid data format or values provided.'}
+            except Exception as e:
+                logger.error(f"Batch item analysis failed: {str(e)}")
+                outcome = {'error': 'An internal error occurred during analysis.'}
+        for index in indexes:
+            results[index] = dict(outcome, index=index)
+
+    # One token for the whole batch, so its items are not shed piecemeal
+    client = charge_request(classify_client(request.headers, request.client.host if request.client else None))
+    with trace, bind_client(client):
+        await asyncio.gather(*(run_item(indexes) for indexes in pending.values()))
+
+    failed = sum(1 for result in results if 'error' in result)
+    return _render(request, {
+        'results': results,
+        'summary': {
+            'total': len(items),
+            'unique': len(pending),
+            'succeeded': len(results) - failed,
+            'failed': failed
+        }
+    })
+
+
+async def submit_job(request):
+    """
+    Async equivalent of a POST to main.analysis_jobs.
+    """
+
+    if request.method == 'OPTIONS':
+        return Response(status_code=204, headers=main.JOB_CORS_HEADERS)
+
+    try:
+        request_json = await read_json_body_async(request)
+    except PayloadTooLargeError as size_error:
+        logger.warning(f"Rejected job submission: {str(size_error)}")
+        return JSONResponse({'error': str(size_error)}, status_code=413, headers=main.JOB_CORS_HEADERS)
+
+    client = classify_client(request.headers, request.client.host if request.client else None)
+    # SQLite writes wait on the file lock; keep them off the event loop
+    payload, status_code = await asyncio.to_thread(main.submit_analysis_job, request_json, client)
+    return _render(request, payload, status_code, main.JOB_CORS_HEADERS)
+
+
+async def get_job(request):
+    """
+    Async equivalent of a GET to main.analysis_jobs.
+    """
+
+    if request.method == 'OPTIONS':
+        return Response(status_code=204, headers=main.JOB_CORS_HEADERS)
+
+    payload, status_code = await asyncio.to_thread(main.job_status, request.path_params['job_id'])
+    return _render(request, payload, status_code, main.JOB_CORS_HEADERS)
+
+
+async def verdict_history(request):
+    """
+    Async equivalent of main.verdict_history.
+    """
+
+    if request.method == 'OPTIONS':
+        return Response(status_code=204, headers=main.JOB_CORS_HEADERS)
+
+    client = classify_client(request.headers, request.client.host if request.client else None)
+    payload, status_code = await asyncio.to_thread(main.query_verdict_history, request.query_params, client)
+    return _render(request, payload, status_code, main.JOB_CORS_HEADERS)
+
+
+async def analyze_coalesced_async(content_type, content_data):
+    """
+    Async equivalent of main.analyze_coalesced.
+    """
+
+    key = main.batch_item_key({'type': content_type, 'data': content_data})
+    if main.COALESCE_ENABLED:
+        led = []
+
+        async def lead():
+            led.append(True)
+            return await fetch_and_analyze_async(content_type, content_data)
+
+        analysis_result = await _analysis_flights.do(main.flight_key(key), lead)
+        if not led and main.is_shed(analysis_result):
+            # The leader was shed on its own client's account; ours may be admitted
+            analysis_result = await fetch_and_analyze_async(content_type, content_data)
+    else:
+        analysis_result = await fetch_and_analyze_async(content_type, content_data)
+    record_verdict(content_type, content_data, analysis_result, current_client().user, content_hash=key[1])
+    return analysis_result
+
+
+async def fetch_and_analyze_async(content_type, content_data):
+    """
+    Async equivalent of main.fetch_and_analyze.
+
+    Raises:
+        ContentFetchError: If the content behind a URL cannot be retrieved
+        ImageInputError: If a submitted image is invalid or too large
+    """
+
+    processed_content = content_data
+    if content_type == 'url':
+        try:
+            processed_content = await fetch_url_content_async(content_data)
+            logger.info(f"Successfully fetched URL content, length: {len(processed_content)}")
+        except Exception as url_error:
+            logger.error(f"Failed to fetch URL content: {str(url_error)}")
+            raise main.ContentFetchError(str(url_error)) from url_error
+    elif content_type == 'image':
+        # Decoding and resizing are CPU-bound; keep them off the event loop
+        with stage('image_decode'):
+            processed_content = await asyncio.to_thread(prepare_image, content_data)
+
+    # Hashing, MinHash signatures and shared-tier reads are CPU and disk bound
+    cache_key, cached_result = await asyncio.to_thread(main.lookup_cached_verdict, content_type, processed_content)
+    if cached_result is not None:
+        return cached_result
+
+    with stage('triage'):
+        decision = triage_content(content_type, processed_content)
+    if decision is not None and decision.answered:
+        return main.triaged_analysis(content_type, processed_content, decision)
+
+    started = asyncio.get_running_loop().time()
+    analysis_result = await perform_admitted_analysis_async(content_type, processed_content)
+    main.mark_triage(analysis_result, decision)
+    await asyncio.to_thread(main.store_verdict, cache_key, analysis_result,
+                            asyncio.get_running_loop().time() - started, content_type, processed_content)
+    return analysis_result
+
+
+async def fetch_url_content_async(url):
+    """
+    Async equivalent of main.fetch_url_content.
+    """
+
+    # Input validation for URL
+    if not url or not isinstance(url, str):
+        raise main.ContentFetchError("URL must be a non-empty string")
+    if not (url.startswith('http://') or url.startswith('https://')):
+        raise main.ContentFetchError("URL must start with http:// or https://")
+
+    with stage('fetch'):
+        fetched = await get_async_fetcher().fetch(url)
+    if not fetched.content:
+        raise Exception("Empty response received from the URL")
+
+    # HTML extraction is CPU-bound; keep it off the event loop
+    try:
+        with stage('html_parse'):
+            return await asyncio.to_thread(extract_text, fetched.content)
+    except Exception as e:
+        raise Exception(f"Failed to fetch and parse webpage content: {str(e)}")
+
+
+async def generate_for_prompts_async(model, prompts):
+    """
+    Async equivalent of main.generate_for_prompts; chunks run concurrently.
+    """
+
+    caller = get_model_caller()
+    results = await asyncio.gather(
+        *(caller.call_async(model.generate_content_async, prompt) for prompt in prompts),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if len(errors) == len(results):
+        raise errors[0]
+    for error in errors:
+        logger.warning(f"Chunk analysis failed: {str(error)}")
+    return [None if isinstance(result, BaseException) else result for result in results]
+
+
+async def perform_admitted_analysis_async(content_type, content_data):
+    """
+    Async equivalent of main.perform_admitted_analysis.
+    """
+
+    controller = get_admission_controller()
+    if controller is None:
+        return await perform_ai_analysis_async(content_type, content_data)
+    try:
+        with stage('admission'):
+            ticket = await controller.acquire_async(current_client())
+    except AdmissionShedError as shed_error:
+        if current_client().deferrable:
+            raise
+        return main.shed_analysis(content_type, content_data, shed_error)
+    with ticket:
+        return await perform_ai_analysis_async(content_type, content_data)
+
+
+async def perform_ai_analysis_async(content_type, content_data):
+    """
+    Async equivalent of main.perform_ai_analysis.
+    """
+
+    # Input validation
+    if not content_type or not content_data:
+        raise ValueError("Content type and data are required for analysis")
+    if content_type not in main.VALID_CONTENT_TYPES:
+        raise ValueError(f"Invalid content type: {content_type}")
+
+    model = main.get_model()
+    if model is None:
+        logger.warning("Vertex AI model not available - falling back to enhanced mock analysis")
+        record_fallback('unavailable')
+        return main.generate_enhanced_mock_analysis(content_type, content_data)
+
+    try:
+        with stage('chunking'):
+            plan = plan_chunks(content_type, content_data)
+        with stage('prompt_build'):
+            prompts = [main.build_analysis_prompt(content_type, chunk) for chunk in plan.selected_chunks]
+        try:
+            with stage('model_call'):
+                responses = await generate_for_prompts_async(model, prompts)
+        except CircuitOpenError as open_error:
+            logger.warning(f"{str(open_error)} - falling back to enhanced mock analysis")
+            record_fallback('circuit_open')
+            return main.generate_enhanced_mock_analysis(content_type, content_data)
+        except Exception as model_error:
+            raise Exception(f"AI analysis service temporarily unavailable: {str(model_error)}") from model_error
+        with stage('response_parse'):
+            ai_analysis = main.parse_chunk_responses(content_type, plan, responses)
+        with stage('response_shape'):
+            frontend_response = main.build_frontend_response(content_type, content_data, ai_analysis)
+            frontend_response['analysisMetadata']['prompt'] = main.prompt_metadata(plan, prompts, responses)
+            return frontend_response
+    except Exception as ai_error:
+        logger.error(f"Error in async AI analysis pipeline: {str(ai_error)}")
+        # Fall back to mock analysis if AI fails
+        record_fallback(fallback_reason(ai_error))
+        return main.generate_enhanced_mock_analysis(content_type, content_data)
+
+
+async def export_metrics(request):
+    return Response(get_registry().render(), media_type=EXPOSITION_MIMETYPE)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _in_flight
+    _in_flight = asyncio.Semaphore(ASYNC_MAX_IN_FLIGHT)
+    # A long-lived server pays the cold start before taking traffic, and
+    # first requests never block the event loop on SDK imports
+    await asyncio.to_thread(main.warmup)
+    # Resume jobs left queued or running by a previous process
+    try:
+        await asyncio.to_thread(main.ensure_job_workers)
+    except sqlite3.Error as db_error:
+        logger.error(f"Failed to start job workers: {str(db_error)}")
+    yield
+    await get_async_fetcher().aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/', analyze, methods=['POST', 'OPTIONS']),
+        Route('/batch', analyze_batch, methods=['POST', 'OPTIONS']),
+        Route('/jobs', submit_job, methods=['POST', 'OPTIONS']),
+        Route('/jobs/{job_id}', get_job, methods=['GET', 'OPTIONS']),
+        Route('/history', verdict_history, methods=['GET', 'OPTIONS']),
+        Route('/metrics', export_metrics, methods=['GET']),
+    ],
+    lifespan=lifespan
+)
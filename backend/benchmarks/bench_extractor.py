@@ -0,0 +1,78 @@
+"""
+Benchmark the HTML extraction engines over the saved fixture pages.
+
+For every page in fixtures/html this checks that the streaming extractor
+returns exactly what the BeautifulSoup engine returns (at the production
+character budget and with an unlimited budget), then times both engines.
+
+Usage:
+    python benchmarks/bench_extractor.py [--iterations 20] [--max-chars 5000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor import EXTRACT_MAX_CHARS, extract_text  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html')
+ENGINES = ['soup', 'streaming']
+
+
+def run_engine(engine, content, max_chars):
+    try:
+        return extract_text(content, max_chars=max_chars, engine=engine)
+    except Exception as e:
+        return f'<error: {e}>'
+
+
+def time_engine(engine, content, max_chars, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        run_engine(engine, content, max_chars)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--max-chars', type=int, default=EXTRACT_MAX_CHARS)
+    args = parser.parse_args()
+
+    fixtures = sorted(name for name in os.listdir(FIXTURE_DIR) if name.endswith('.html'))
+    mismatches = 0
+    totals = dict.fromkeys(ENGINES, 0.0)
+    total_bytes = 0
+
+    print(f"{'fixture':<24} {'bytes':>9} {'soup ms':>9} {'stream ms':>10} {'speedup':>8}  parity")
+    for name in fixtures:
+        with open(os.path.join(FIXTURE_DIR, name), 'rb') as fixture:
+            content = fixture.read()
+        total_bytes += len(content)
+
+        parity = all(
+            run_engine('soup', content, budget) == run_engine('streaming', content, budget)
+            for budget in (args.max_chars, sys.maxsize)
+        )
+        if not parity:
+            mismatches += 1
+
+        timings = {engine: time_engine(engine, content, args.max_chars, args.iterations) for engine in ENGINES}
+        for engine in ENGINES:
+            totals[engine] += timings[engine]
+        print(f"{name:<24} {len(content):>9} {timings['soup'] * 1000:>9.2f} {timings['streaming'] * 1000:>10.2f} "
+              f"{timings['soup'] / timings['streaming']:>7.1f}x  {'ok' if parity else 'MISMATCH'}")
+
+    megabytes = total_bytes / (1024 * 1024)
+    print()
+    for engine in ENGINES:
+        print(f"{engine:<10} {megabytes / totals[engine]:8.1f} MB/s over {len(fixtures)} fixtures")
+    print(f"parity: {len(fixtures) - mismatches}/{len(fixtures)} fixtures identical")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of the indicator scanner against the original per-category regexes.
+
+Builds synthetic posts from 100 bytes up to 1 MB that mix neutral, factual,
+sensational and conspiracy language, checks that the single-pass scanner
+returns the same counts as the original five findall scans plus two
+str.count calls, and times both.
+
+Usage:
+    python benchmarks/bench_indicators.py [--iterations 50]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import get_indicator_scanner  # noqa: E402
+
+SIZES = [100, 1024, 10 * 1024, 100 * 1024, 1024 * 1024]
+
+SNIPPETS = [
+    "According to a peer-reviewed study published in the journal, researchers found that",
+    "SHOCKING miracle cure that doctors hate! Big pharma doesn't want you to know the hidden truth.",
+    "Wake up sheeple, the mainstream media and the deep state control everything. It's a HOAX!",
+    "The city council met on Tuesday to discuss the budget for the new school building.",
+    "You won't believe this URGENT warning about the coming disaster. Must see!!!",
+    "Is this really true? Why would they hide it? What are they not telling us?",
+    "Statistics from the university data analysis show a modest change over ten years.",
+]
+
+# The original scans from generate_enhanced_mock_analysis
+LEGACY_PATTERNS = {
+    'factual': r'\b(research|study|university|professor|peer.reviewed|scientific|evidence|data|statistics|analysis|published|journal|academic|according to|found that)\b',
+    'suspicious': r'\b(cure|miracle|secret|they.{0,10}want|big.pharma|doctors.hate|breakthrough|amazing|shocking|revealed|exposed|hidden truth)\b',
+    'conspiracy': r'\b(fake|hoax|conspiracy|cover.up|mainstream.media|deep.state|they.control|wake.up|sheeple|truth|lies|manipulation|agenda)\b',
+    'emotional': r'\b(shocking|amazing|incredible|unbelievable|must.see|you.won.t.believe|mind.blown|urgent|crisis|danger|disaster)\b',
+}
+
+
+def legacy_scan(text):
+    content_lower = text.lower()
+    counts = {name: len(re.findall(pattern, content_lower)) for name, pattern in LEGACY_PATTERNS.items()}
+    counts['caps'] = len(re.findall(r'\b[A-Z]{2,}\b', text))
+    counts['questions'] = text.count('?')
+    counts['exclamations'] = text.count('!')
+    return counts
+
+
+def build_text(size, rng):
+    parts = []
+    length = 0
+    while length < size:
+        snippet = rng.choice(SNIPPETS)
+        parts.append(snippet)
+        length += len(snippet) + 1
+    return ' '.join(parts)[:size]
+
+
+def time_scan(scan, text, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        scan(text)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    scanner = get_indicator_scanner()
+    rng = random.Random(7)
+    mismatches = 0
+
+    print(f"{'size':>9} {'legacy ms':>10} {'scanner ms':>11} {'speedup':>8} {'MB/s':>8}  parity")
+    for size in SIZES:
+        text = build_text(size, rng)
+        # Keep total work per size roughly constant
+        iterations = max(3, args.iterations * 1024 // max(size, 1024))
+        parity = legacy_scan(text) == scanner.scan(text)
+        mismatches += 0 if parity else 1
+
+        legacy_seconds = time_scan(legacy_scan, text, iterations)
+        scanner_seconds = time_scan(scanner.scan, text, iterations)
+        print(f"{size:>9} {legacy_seconds * 1000:>10.3f} {scanner_seconds * 1000:>11.3f} "
+              f"{legacy_seconds / scanner_seconds:>7.2f}x {size / scanner_seconds / 1e6:>8.1f}  "
+              f"{'ok' if parity else 'MISMATCH'}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Peak server memory under concurrent multi-megabyte submissions.
+
+Starts a server (sync Flask or async ASGI, as in load_test.py) with the stub
+model and the verdict cache off, then has --concurrency clients post a mix
+of large payloads:
+
+- text: a --size-mb text submission
+- image: a --size-mb image as a base64 data URL (a real noisy JPEG when
+  Pillow is installed here, otherwise JPEG-tagged random bytes)
+- oversize: a body larger than MAX_REQUEST_BYTES with a Content-Length,
+  which should be refused before it is read
+- chunked: the same body streamed without a Content-Length, which should
+  be cut off as soon as it crosses the limit
+
+Reports status codes per kind and the server's idle and peak RSS (read from
+/proc, so Linux-only). Set MAX_REQUEST_BYTES, IMAGE_MAX_BYTES or
+IMAGE_MAX_DIMENSION in the environment to see how the limits move the peak.
+
+Usage:
+    python benchmarks/bench_payload.py [--mode both] [--requests 64] [--concurrency 16] [--size-mb 4]
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from load_test import free_port, peak_rss_mb, serve, wait_for_port  # noqa: E402
+from request_limits import MAX_REQUEST_BYTES  # noqa: E402
+
+KINDS = ['text', 'image', 'oversize', 'chunked']
+
+
+def make_image(size_bytes, seed=0):
+    """
+    Encoded image of roughly size_bytes, and its MIME type.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        rng = random.Random(seed)
+        return b'\xff\xd8\xff\xe0' + rng.randbytes(size_bytes - 4), 'image/jpeg'
+
+    # Noise compresses badly, so a modest JPEG quality reaches the size quickly
+    side = 1024
+    while True:
+        image = Image.effect_noise((side, side * 3 // 4), 64).convert('RGB')
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=90)
+        if output.tell() >= size_bytes or side >= 8192:
+            return output.getvalue(), 'image/jpeg'
+        side *= 2
+
+
+def build_payloads(size_mb):
+    size_bytes = int(size_mb * 1024 * 1024)
+    image, mime_type = make_image(size_bytes * 3 // 4)
+    oversize = json.dumps({'type': 'text', 'data': 'x' * (MAX_REQUEST_BYTES + 1024)}).encode()
+    return {
+        'text': json.dumps({'type': 'text', 'data': 'The council met to debate the budget. ' * (size_bytes // 38)}).encode(),
+        'image': json.dumps({
+            'type': 'image',
+            'data': f'data:{mime_type};base64,' + base64.b64encode(image).decode('ascii')
+        }).encode(),
+        'oversize': oversize,
+        'chunked': oversize
+    }
+
+
+async def drive(port, payloads, total_requests, concurrency):
+    import httpx
+
+    url = f'http://127.0.0.1:{port}/'
+    statuses = {kind: collections.Counter() for kind in KINDS}
+    queue = asyncio.Queue()
+    for number in range(total_requests):
+        queue.put_nowait(KINDS[number % len(KINDS)])
+
+    async def stream_body(body, piece=256 * 1024):
+        for start in range(0, len(body), piece):
+            yield body[start:start + piece]
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def worker():
+            while True:
+                try:
+                    kind = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                headers = {'Content-Type': 'application/json'}
+                body = stream_body(payloads[kind]) if kind == 'chunked' else payloads[kind]
+                try:
+                    response = await client.post(url, content=body, headers=headers)
+                    statuses[kind][response.status_code] += 1
+                except httpx.HTTPError as e:
+                    # A server may close the connection on a refused upload
+                    statuses[kind][type(e).__name__] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return elapsed, statuses
+
+
+def run_mode(mode, payloads, args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_port(port):
+            print(f"{mode}: server did not start")
+            return
+        idle_rss = peak_rss_mb(server.pid)
+        elapsed, statuses = asyncio.run(drive(port, payloads, args.requests, args.concurrency))
+        print(f"{mode}: {elapsed:.1f}s, idle RSS {idle_rss:.1f} MB, peak RSS {peak_rss_mb(server.pid):.1f} MB")
+        for kind in KINDS:
+            counts = ', '.join(f"{status}: {count}" for status, count in sorted(statuses[kind].items(), key=str))
+            print(f"  {kind:<9} {len(payloads[kind]) / (1024 * 1024):>6.1f} MB  {counts}")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--size-mb', type=float, default=4, help='size of the text and image submissions')
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, 0.05)
+        return 0
+
+    payloads = build_payloads(args.size_mb)
+    print(f"{args.requests} requests, concurrency {args.concurrency}, body limit {MAX_REQUEST_BYTES / (1024 * 1024):.0f} MB")
+    modes = ['sync', 'async'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        run_mode(mode, payloads, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
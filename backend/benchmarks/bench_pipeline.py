@@ -0,0 +1,134 @@
+"""
+End-to-end latency benchmark of analyze_content against the stub model.
+
+Runs the analyze Cloud Function in-process with MODEL_PROVIDER=stub, so
+every request goes through request parsing, the verdict cache, prompt
+building, the (simulated) model call, response parsing and shaping exactly
+as in production, without touching Vertex. Requests are issued from a
+thread pool and the report gives overall p50/p95/p99 latency, throughput,
+how many requests fell back to the heuristic analyzer, and the per-stage
+percentiles recorded in analysisMetadata.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--requests 500] [--concurrency 16]
+        [--latency-ms 200] [--jitter-ms 50] [--error-rate 0.02]
+        [--response-chars 400] [--repeat 0.0]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORDS = ('the council said budget study shocking cure report data evidence claim city school '
+         'hidden truth published journal warning miracle breakthrough according to officials').split()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def build_payloads(count, repeat, rng):
+    """
+    Build text submissions; a `repeat` fraction re-sends earlier ones to exercise the cache.
+    """
+    payloads = []
+    for number in range(count):
+        if payloads and rng.random() < repeat:
+            payloads.append(rng.choice(payloads))
+            continue
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 300)))
+        payloads.append({'type': 'text', 'data': f'{number}: {text}'})
+    return payloads
+
+
+def configure(args):
+    os.environ['MODEL_PROVIDER'] = 'stub'
+    os.environ['STUB_MODEL_LATENCY_MS'] = str(args.latency_ms)
+    os.environ['STUB_MODEL_JITTER_MS'] = str(args.jitter_ms)
+    os.environ['STUB_MODEL_ERROR_RATE'] = str(args.error_rate)
+    os.environ['STUB_MODEL_RESPONSE_CHARS'] = str(args.response_chars)
+    # All requests share one client; admission control would shed most of them
+    os.environ['ADMISSION_ENABLED'] = '0'
+    # Measure the model path even for content triage would answer itself
+    os.environ['TRIAGE_MODE'] = 'off'
+    if not args.cache:
+        os.environ['VERDICT_CACHE_ENABLED'] = '0'
+        os.environ['NEAR_DUP_ENABLED'] = '0'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--response-chars', type=int, default=400)
+    parser.add_argument('--repeat', type=float, default=0.0, help='fraction of requests re-sending earlier content')
+    parser.add_argument('--cache', action='store_true', help='keep the verdict cache and near-duplicate matching enabled')
+    args = parser.parse_args()
+
+    configure(args)
+    from flask import Flask, request
+    import main as backend
+
+    # Failures are counted in the report instead
+    logging.disable(logging.ERROR)
+    app = Flask(__name__)
+    payloads = build_payloads(args.requests, args.repeat, random.Random(7))
+
+    def run(payload):
+        with app.test_request_context('/', method='POST', json=payload):
+            started = time.perf_counter()
+            response = app.make_response(backend.analyze_content(request))
+            elapsed = time.perf_counter() - started
+            return elapsed, response.status_code, response.get_json()
+
+    # The pipeline prints model failures; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            outcomes = list(executor.map(run, payloads))
+        wall_seconds = time.perf_counter() - started
+
+    latencies = sorted(elapsed for elapsed, _, _ in outcomes)
+    errors = sum(1 for _, status, _ in outcomes if status != 200)
+    metadata = [body.get('analysisMetadata', {}) for _, status, body in outcomes if status == 200]
+    fallbacks = sum(1 for meta in metadata if 'aiModel' not in meta)
+    cached = sum(1 for meta in metadata if meta.get('cached'))
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub latency {args.latency_ms:.0f}"
+          f"±{args.jitter_ms:.0f} ms, error rate {args.error_rate}, response {args.response_chars} chars")
+    print(f"throughput {args.requests / wall_seconds:.1f} req/s, errors {errors}, "
+          f"heuristic fallbacks {fallbacks}, cache hits {cached}")
+    print()
+    print(f"{'':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print(f"{'end to end':<16} {percentile(latencies, 0.5) * 1000:>9.2f} {percentile(latencies, 0.95) * 1000:>9.2f} "
+          f"{percentile(latencies, 0.99) * 1000:>9.2f} {latencies[-1] * 1000:>9.2f}")
+
+    stage_samples = {}
+    for meta in metadata:
+        for name, milliseconds in meta.get('stages', {}).items():
+            stage_samples.setdefault(name, []).append(milliseconds)
+    for name, samples in sorted(stage_samples.items()):
+        samples.sort()
+        print(f"{name:<16} {percentile(samples, 0.5):>9.2f} {percentile(samples, 0.95):>9.2f} "
+              f"{percentile(samples, 0.99):>9.2f} {samples[-1]:>9.2f}")
+
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Prompt delivery benchmark: request size and latency per prompt mode.
+
+Compares how the fixed analyst instructions reach the model:
+
+    legacy    indented instructions at the head of every prompt (the old literal)
+    inline    dedented instructions at the head of every prompt (PROMPT_MODE=inline)
+    system    registered once as the model's system instruction (PROMPT_MODE=system)
+    cached    stored as a Vertex cached context (PROMPT_MODE=cached)
+
+Request size is the JSON body of a Vertex generateContent call for a short,
+a medium and a chunk-sized submission; a system instruction still travels
+with every request, a cached context is referenced by name. Latency is
+prompt building plus the model call per request, against the stub model
+(no latency, so the figures are local CPU cost) unless --provider vertex
+is given and credentials are available.
+
+Usage:
+    python benchmarks/bench_prompt.py [--requests 2000] [--provider stub]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import textwrap
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = ('legacy', 'inline', 'system', 'cached')
+
+SENTENCE = 'Officials published the budget study on Tuesday and the council said the data was reviewed. '
+
+# Stand-in resource name; the real one has the same shape
+CACHED_CONTENT_NAME = 'projects/satya-hackathon-project/locations/us-central1/cachedContents/1234567890123456789'
+
+
+def sample_texts():
+    from chunking import CHARS_PER_TOKEN, CHUNK_TOKEN_BUDGET
+
+    chunk_chars = int(CHUNK_TOKEN_BUDGET * CHARS_PER_TOKEN)
+    return {
+        'short': SENTENCE * 3,
+        'medium': SENTENCE * 22,
+        'chunk': (SENTENCE * (chunk_chars // len(SENTENCE) + 1))[:chunk_chars]
+    }
+
+
+def legacy_instructions(instructions):
+    """
+    The instructions as the old per-call literal sent them, indentation included.
+    """
+    return '\n' + textwrap.indent(instructions, '    ') + '\n    '
+
+
+def build_prompt(backend, mode, text):
+    if mode == 'legacy':
+        return [legacy_instructions(backend.ANALYST_INSTRUCTIONS), f"Content Type: text\nContent: {text}"]
+    return backend.build_analysis_prompt('text', text, inline=mode == 'inline')
+
+
+def request_body(backend, mode, prompt):
+    """
+    JSON body of the generateContent request for one prompt.
+    """
+    body = {'contents': [{'role': 'user', 'parts': [{'text': part} for part in prompt]}]}
+    if mode == 'system':
+        body['systemInstruction'] = {'parts': [{'text': backend.ANALYST_INSTRUCTIONS}]}
+    elif mode == 'cached':
+        body['cachedContent'] = CACHED_CONTENT_NAME
+    return json.dumps(body).encode('utf-8')
+
+
+def measure_latency(backend, mode, provider_name, text, requests):
+    from model_provider import create_provider
+
+    registered = mode in ('system', 'cached')
+    provider = create_provider(
+        backend.MODEL_NAME,
+        provider=provider_name,
+        system_instruction=backend.ANALYST_INSTRUCTIONS if registered else None,
+        prompt_cache=mode == 'cached'
+    )
+    if provider is None:
+        raise SystemExit(f"could not create the {provider_name} provider")
+
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        provider.generate_content(build_prompt(backend, mode, text))
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--provider', choices=['stub', 'vertex'], default='stub')
+    args = parser.parse_args()
+
+    os.environ.setdefault('STUB_MODEL_LATENCY_MS', '0')
+    logging.disable(logging.INFO)
+    import main as backend
+
+    texts = sample_texts()
+    print(f"instructions: {len(backend.ANALYST_INSTRUCTIONS)} chars dedented, "
+          f"{len(legacy_instructions(backend.ANALYST_INSTRUCTIONS))} chars as the old literal")
+    print()
+    print('request body bytes')
+    print(f"{'submission':<12}" + ''.join(f"{mode:>10}" for mode in MODES) + f"{'saved':>10}")
+    for label, text in texts.items():
+        sizes = [len(request_body(backend, mode, build_prompt(backend, mode, text))) for mode in MODES]
+        print(f"{label:<12}" + ''.join(f"{size:>10}" for size in sizes)
+              + f"{(1 - sizes[-1] / sizes[0]) * 100:>9.0f}%")
+
+    print()
+    print(f"latency per request, {args.provider} provider, medium submission, {args.requests} requests")
+    print(f"{'mode':<12} {'p50 us':>10} {'p95 us':>10}")
+    for mode in MODES:
+        p50, p95 = measure_latency(backend, mode, args.provider, texts['medium'], args.requests)
+        print(f"{mode:<12} {p50 * 1e6:>10.1f} {p95 * 1e6:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Bytes sent and time spent per JSON response, by encoder and content coding.
+
+Builds representative response payloads - a text verdict, a URL verdict
+with a long overallSummary, a 50-item batch and a 50-entry history page -
+and renders each one:
+
+- jsonify: Flask's jsonify, as every response was sent before
+- json / orjson: serialization.render_json with the standard json module
+  or orjson (when installed), sent as is, gzip- or brotli-compressed (when
+  Brotli is installed)
+- 304: a GET revalidated with a matching If-None-Match
+
+Times are the mean wall time per response over --iterations renders,
+including hashing for the ETag and compression.
+
+Usage:
+    python benchmarks/bench_serialization.py [--iterations 2000] [--summary-chars 3000]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORDS = ('the council said budget study shocking cure report data evidence claim city school '
+         'hidden truth published journal warning miracle breakthrough according to officials').split()
+
+
+def sentence(rng, chars):
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def build_payloads(summary_chars, rng):
+    import main as backend
+
+    text_verdict = backend.generate_enhanced_mock_analysis('text', sentence(rng, 600))
+    url_verdict = backend.generate_enhanced_mock_analysis('url', sentence(rng, 4000))
+    url_verdict['overallSummary'] = sentence(rng, summary_chars)
+    batch = {
+        'results': [
+            {'index': index, 'result': backend.generate_enhanced_mock_analysis('text', sentence(rng, 400))}
+            for index in range(50)
+        ],
+        'summary': {'total': 50, 'unique': 50, 'succeeded': 50, 'failed': 0}
+    }
+    history = {
+        'items': [
+            {
+                'id': index,
+                'createdAt': 1790000000.0 + index,
+                'type': 'url',
+                'contentHash': f'{index:064x}',
+                'url': f'https://news.example.com/story/{index}',
+                'domain': 'news.example.com',
+                'healthScore': url_verdict['healthScore'],
+                'servedBy': 'model',
+                'cached': False,
+                'verdict': url_verdict
+            }
+            for index in range(50)
+        ],
+        'nextCursor': '1790000000.0:1'
+    }
+    return {'text verdict': text_verdict, 'url verdict': url_verdict, 'batch (50)': batch, 'history (50)': history}
+
+
+def mean_seconds(render, iterations):
+    render()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--summary-chars', type=int, default=3000, help='length of the URL verdict summary')
+    args = parser.parse_args()
+
+    os.environ['VERDICT_STORE_ENABLED'] = '0'
+    logging.disable(logging.WARNING)
+    from flask import Flask, jsonify
+    import serialization
+
+    payloads = build_payloads(args.summary_chars, random.Random(7))
+    app = Flask(__name__)
+    installed_orjson = serialization.orjson
+    encoders = [('json', None)] + ([('orjson', installed_orjson)] if installed_orjson is not None else [])
+    codings = [('identity', ''), ('gzip', 'gzip')] + ([('br', 'br')] if serialization.brotli is not None else [])
+
+    print(f"orjson {'installed' if installed_orjson else 'not installed'}, "
+          f"Brotli {'installed' if serialization.brotli else 'not installed'}, {args.iterations} iterations")
+    print()
+    print(f"{'payload':<14} {'variant':<16} {'bytes':>9} {'us/resp':>9}")
+    for name, payload in payloads.items():
+        with app.app_context():
+            body = jsonify(payload).get_data()
+            seconds = mean_seconds(lambda: jsonify(payload).get_data(), args.iterations)
+        print(f"{name:<14} {'jsonify':<16} {len(body):>9} {seconds * 1e6:>9.1f}")
+
+        for encoder_name, encoder in encoders:
+            serialization.orjson = encoder
+            for coding_name, accept in codings:
+                headers = {'Accept-Encoding': accept}
+                body, _, _ = serialization.render_json(payload, 200, headers, 'GET')
+                seconds = mean_seconds(lambda: serialization.render_json(payload, 200, headers, 'GET'), args.iterations)
+                print(f"{name:<14} {f'{encoder_name} {coding_name}':<16} {len(body):>9} {seconds * 1e6:>9.1f}")
+
+            _, _, response_headers = serialization.render_json(payload, 200, {}, 'GET')
+            headers = {'If-None-Match': response_headers['ETag']}
+            body, status, _ = serialization.render_json(payload, 200, headers, 'GET')
+            assert status == 304
+            seconds = mean_seconds(lambda: serialization.render_json(payload, 200, headers, 'GET'), args.iterations)
+            print(f"{name:<14} {f'{encoder_name} 304':<16} {len(body):>9} {seconds * 1e6:>9.1f}")
+        serialization.orjson = installed_orjson
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
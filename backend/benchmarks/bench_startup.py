@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark: time from process start to the first response.
+
+Each measurement runs in a fresh interpreter that imports main.py and serves
+one request through analyze_content. The eager mode (WARMUP_ON_START=eager)
+initializes everything at import time, as the module used to; the lazy mode
+(the default) defers the model backend, fetch session and parsers to first
+use. Scenarios:
+
+    options   CORS preflight
+    invalid   request rejected by validation
+    text      text analysis (stub model with no latency, so no network)
+
+The preflight and invalid scenarios use the configured MODEL_PROVIDER
+(Vertex by default), which is where eager start-up pays for the SDK import.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'options': ('OPTIONS', None),
+    'invalid': ('POST', {'type': 'video', 'data': 'x'}),
+    'text': ('POST', {'type': 'text', 'data': 'Officials published the budget study on Tuesday.'}),
+}
+
+
+def child(scenario):
+    """
+    Import the backend, serve one request and print the timings as JSON.
+    """
+    started = time.perf_counter()
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+    imported = time.perf_counter()
+
+    from flask import Flask, request
+
+    method, payload = SCENARIOS[scenario]
+    app = Flask(__name__)
+    with app.test_request_context('/', method=method, json=payload):
+        response = app.make_response(main.analyze_content(request))
+    responded = time.perf_counter()
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'first_response_ms': (responded - started) * 1000,
+        'status': response.status_code
+    }))
+
+
+def measure(scenario, warmup_mode, runs):
+    env = dict(os.environ, WARMUP_ON_START=warmup_mode, VERDICT_CACHE_ENABLED='0')
+    if scenario == 'text':
+        env.update(MODEL_PROVIDER='stub', STUB_MODEL_LATENCY_MS='0')
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', scenario],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return (
+        statistics.median(sample['import_ms'] for sample in samples),
+        statistics.median(sample['first_response_ms'] for sample in samples),
+        samples[-1]['status']
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    print(f"median of {args.runs} fresh processes per cell, times in ms from interpreter start")
+    print(f"{'scenario':<10} {'status':>6} {'eager import':>13} {'eager first':>12} "
+          f"{'lazy import':>12} {'lazy first':>11} {'saved':>8}")
+    for scenario in SCENARIOS:
+        eager_import, eager_first, status = measure(scenario, 'eager', args.runs)
+        lazy_import, lazy_first, _ = measure(scenario, 'off', args.runs)
+        print(f"{scenario:<10} {status:>6} {eager_import:>13.0f} {eager_first:>12.0f} "
+              f"{lazy_import:>12.0f} {lazy_first:>11.0f} {eager_first - lazy_first:>8.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Load test of the sync (Flask) and async (ASGI) serving modes against a local stub model.
+
+Each mode is started in its own server process with MODEL_PROVIDER=stub,
+so the model sleeps for --latency seconds and returns a valid verdict and the numbers reflect how many analyses one process can keep in
+flight rather than Vertex throughput. The verdict cache and admission
+control are disabled so every request reaches the model.
+
+Reports requests/sec, latency percentiles and the server's peak RSS
+(read from /proc, so memory figures are Linux-only). The load generator runs
+on the same machine, so use a multi-core host and raise --latency to see the
+difference between thread-per-request and event-loop serving.
+
+Usage:
+    python benchmarks/load_test.py [--mode both] [--requests 2000] [--concurrency 200] [--latency 0.2]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def serve(mode, port, latency):
+    """
+    Run one serving mode in this process with the stub model installed.
+    """
+    os.environ['VERDICT_CACHE_ENABLED'] = '0'
+    # Every request comes from one local client; measure serving, not rate limits
+    os.environ['ADMISSION_ENABLED'] = '0'
+    # Every request should reach the (stub) model
+    os.environ['TRIAGE_MODE'] = 'off'
+    os.environ['MODEL_PROVIDER'] = 'stub'
+    os.environ['STUB_MODEL_LATENCY_MS'] = str(latency * 1000)
+    import main
+
+    if mode == 'async':
+        import uvicorn
+        from asgi_app import app
+
+        uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning', access_log=False)
+    else:
+        import logging
+        from flask import Flask, request
+
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        app = Flask(__name__)
+
+        @app.route('/', methods=['POST', 'OPTIONS'])
+        def local_analyze():
+            return main.analyze_content(request)
+
+        app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def drive(port, total_requests, concurrency):
+    import httpx
+
+    url = f'http://127.0.0.1:{port}/'
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for number in range(total_requests):
+        queue.put_nowait(number)
+
+    # A fresh connection per request: httpx's pool gets slow with hundreds of
+    # idle keep-alive connections, which would make the client the bottleneck
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    number = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                payload = {'type': 'text', 'data': f'Load test submission number {number} about the city budget.'}
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return elapsed, sorted(latencies), errors
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_mode(mode, args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port), '--latency', str(args.latency)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_port(port):
+            print(f"{mode}: server did not start")
+            return
+        baseline_rss = peak_rss_mb(server.pid)
+        elapsed, latencies, errors = asyncio.run(drive(port, args.requests, args.concurrency))
+        print(f"{mode:<6} {args.requests / elapsed:>9.1f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+              f"{baseline_rss:>9.1f} {peak_rss_mb(server.pid):>9.1f} {errors:>7}")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub model latency in seconds')
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.latency)
+        return 0
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub latency {args.latency * 1000:.0f} ms")
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'idle MB':>9} {'peak MB':>9} {'errors':>7}")
+    modes = ['sync', 'async'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        run_mode(mode, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
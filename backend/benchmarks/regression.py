@@ -0,0 +1,355 @@
+"""
+Offline end-to-end regression suite over the fixture corpus.
+
+Every entry of fixtures/corpus.json goes through analyze_content in-process,
+with MODEL_PROVIDER=stub and the saved HTML pages replayed by a local HTTP
+server, so fetching, extraction, triage, prompt building and response
+shaping all run exactly as in production without the network or Vertex.
+The verdict cache, the verdict store, near-duplicate matching and
+admission control are disabled so every round does the full work.
+
+After one unmeasured warm-up round the corpus is submitted --rounds times,
+each round concurrently. The suite reports throughput, latency percentiles
+and peak RSS (from /proc on Linux), and the health score of every item,
+both as served and as the heuristic analyzer alone rates the content, so
+changes to the prompt, the indicator lexicons or the HTML extraction show
+up as score drift.
+
+The results are compared with the stored baseline (benchmarks/baseline.json)
+and the suite exits with status 1 when throughput drops, p95 latency or
+peak memory grows past its threshold, or any score moves by more than
+--max-score-drift points. Timings are only comparable on the machine that
+recorded the baseline: regenerate it there with --update-baseline, and
+whenever the corpus version or a score changes on purpose.
+
+Usage:
+    python benchmarks/regression.py [--rounds 5] [--concurrency 4]
+        [--model-latency-ms 50] [--page-latency-ms 20] [--page-jitter-ms 10]
+        [--baseline benchmarks/baseline.json] [--update-baseline]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+CORPUS_PATH = os.path.join(BENCHMARK_DIR, 'fixtures', 'corpus.json')
+HTML_DIR = os.path.join(BENCHMARK_DIR, 'fixtures', 'html')
+DEFAULT_BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """
+    Serves fixture pages by file name after the server's configured delay.
+    """
+
+    def do_GET(self):
+        name = self.path.lstrip('/').split('?')[0]
+        page = self.server.pages.get(name)
+        self.server.pause()
+        if page is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        # No charset, as many real servers send it; the extractor sniffs the encoding
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Local HTTP server replaying the saved HTML fixtures with simulated latency.
+
+    Args:
+        pages (dict): File name to page bytes
+        latency_seconds (float): Mean delay before each response
+        jitter_seconds (float): Maximum deviation from the mean
+        seed (int): Random seed for the jitter
+    """
+
+    daemon_threads = True
+
+    def __init__(self, pages, latency_seconds=0.0, jitter_seconds=0.0, seed=0):
+        super().__init__(('127.0.0.1', 0), ReplayHandler)
+        self.pages = pages
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def pause(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_seconds, self.jitter_seconds) if self.jitter_seconds else 0.0
+        delay = self.latency_seconds + jitter
+        if delay > 0:
+            time.sleep(delay)
+
+    def url(self, name):
+        return f'http://127.0.0.1:{self.server_address[1]}/{name}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='replay-server', daemon=True).start()
+        return self
+
+
+def load_corpus():
+    """
+    Read the corpus and the pages it references.
+
+    Returns:
+        tuple: (corpus dict, dict of page file name to bytes)
+    """
+    with open(CORPUS_PATH, encoding='utf-8') as corpus_file:
+        corpus = json.load(corpus_file)
+    pages = {}
+    for page in corpus['pages']:
+        with open(os.path.join(HTML_DIR, page['file']), 'rb') as page_file:
+            pages[page['file']] = page_file.read()
+    return corpus, pages
+
+
+def build_items(corpus, server):
+    """
+    One (item id, request payload) pair per corpus entry.
+    """
+    items = [(entry['id'], {'type': 'text', 'data': entry['text']}) for entry in corpus['texts']]
+    items += [(entry['id'], {'type': 'url', 'data': server.url(entry['file'])}) for entry in corpus['pages']]
+    return items
+
+
+def configure(args):
+    os.environ['MODEL_PROVIDER'] = 'stub'
+    os.environ['STUB_MODEL_LATENCY_MS'] = str(args.model_latency_ms)
+    # Scores must be reproducible run to run
+    os.environ['STUB_MODEL_JITTER_MS'] = '0'
+    os.environ['STUB_MODEL_ERROR_RATE'] = '0'
+    os.environ['VERDICT_CACHE_ENABLED'] = '0'
+    os.environ['VERDICT_STORE_ENABLED'] = '0'
+    os.environ['NEAR_DUP_ENABLED'] = '0'
+    # All requests share one client and one replay host
+    os.environ['ADMISSION_ENABLED'] = '0'
+    os.environ['FETCH_HOST_RATE'] = '1000000'
+    os.environ['FETCH_HOST_BURST'] = '1000000'
+    os.environ['FETCH_HOST_CONCURRENCY'] = str(args.concurrency)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def run_suite(args, items):
+    """
+    Submit the corpus for a warm-up round and --rounds measured rounds.
+
+    Returns:
+        dict: Results in the baseline format
+    """
+    from flask import Flask, request
+    import main as backend
+
+    app = Flask(__name__)
+
+    def run(item):
+        item_id, payload = item
+        with app.test_request_context('/', method='POST', json=payload):
+            started = time.perf_counter()
+            response = app.make_response(backend.analyze_content(request))
+            elapsed = time.perf_counter() - started
+        body = response.get_json(silent=True) or {}
+        return item_id, elapsed, response.status_code, body
+
+    latencies = []
+    errors = 0
+    served = {}
+    wall_seconds = 0.0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run, items))
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            outcomes = list(executor.map(run, items))
+            wall_seconds += time.perf_counter() - started
+            for item_id, elapsed, status, body in outcomes:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors += 1
+                    continue
+                served.setdefault(item_id, {
+                    'served': body.get('healthScore'),
+                    'servedBy': body.get('analysisMetadata', {}).get('servedBy')
+                })
+
+    scores = {}
+    for item_id, payload in items:
+        content = payload['data']
+        if payload['type'] == 'url':
+            content = backend.fetch_url_content(content)
+        scores[item_id] = {
+            **served.get(item_id, {'served': None, 'servedBy': None}),
+            'heuristic': backend.generate_enhanced_mock_analysis(payload['type'], content)['healthScore']
+        }
+
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / wall_seconds,
+        'latencyMs': {
+            'p50': percentile(latencies, 0.5) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000
+        },
+        'peakRssMb': peak_rss_mb(),
+        'errors': errors,
+        'scores': scores
+    }
+
+
+def compare(baseline, results, args):
+    """
+    Print current results against the baseline.
+
+    Returns:
+        list: Descriptions of the regressions found
+    """
+    regressions = []
+
+    def check(label, old, new, limit, higher_is_worse=True):
+        change = (new - old) / old if old else 0.0
+        regressed = (change > limit) if higher_is_worse else (change < -limit)
+        print(f"{label:<16} {old:>10.1f} {new:>10.1f} {change * 100:>+8.1f}%  {'REGRESSED' if regressed else 'ok'}")
+        if regressed:
+            regressions.append(f"{label} {change * 100:+.1f}% (limit {limit * 100:.0f}%)")
+
+    print(f"{'metric':<16} {'baseline':>10} {'current':>10} {'change':>9}")
+    check('throughput/s', baseline['throughput'], results['throughput'], args.max_throughput_drop,
+          higher_is_worse=False)
+    for name in ('p50', 'p95', 'p99'):
+        limit = args.max_latency_increase if name == 'p95' else float('inf')
+        check(f'{name} ms', baseline['latencyMs'][name], results['latencyMs'][name], limit)
+    check('peak RSS MB', baseline['peakRssMb'], results['peakRssMb'], args.max_memory_increase)
+    if results['errors']:
+        regressions.append(f"{results['errors']} requests failed")
+
+    print()
+    print(f"{'item':<22} {'served':>13} {'heuristic':>13}  served by")
+    for item_id, current in results['scores'].items():
+        previous = baseline['scores'].get(item_id)
+        if previous is None:
+            print(f"{item_id:<22} {'new':>13} {'new':>13}  {current['servedBy']}")
+            regressions.append(f"{item_id} has no baseline score")
+            continue
+        columns = []
+        for kind in ('served', 'heuristic'):
+            old, new = previous[kind], current[kind]
+            drift = abs(new - old) if old is not None and new is not None else float('inf')
+            if drift > args.max_score_drift:
+                regressions.append(f"{item_id} {kind} score {old} -> {new}")
+            columns.append(f"{old} -> {new}" if old != new else f"{new}")
+        print(f"{item_id:<22} {columns[0]:>13} {columns[1]:>13}  {current['servedBy']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--model-latency-ms', type=float, default=50)
+    parser.add_argument('--page-latency-ms', type=float, default=20)
+    parser.add_argument('--page-jitter-ms', type=float, default=10)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='record this run as the new baseline')
+    parser.add_argument('--max-throughput-drop', type=float, default=0.2, help='fraction (default 0.2)')
+    parser.add_argument('--max-latency-increase', type=float, default=0.25, help='p95, fraction (default 0.25)')
+    parser.add_argument('--max-memory-increase', type=float, default=0.2, help='fraction (default 0.2)')
+    parser.add_argument('--max-score-drift', type=float, default=0, help='points per item (default 0)')
+    args = parser.parse_args()
+
+    configure(args)
+    # Fetch and model failures are counted in the report instead
+    logging.disable(logging.ERROR)
+    corpus, pages = load_corpus()
+    server = ReplayServer(pages, args.page_latency_ms / 1000, args.page_jitter_ms / 1000).start()
+    settings = {
+        'corpusVersion': corpus['version'],
+        'rounds': args.rounds,
+        'concurrency': args.concurrency,
+        'modelLatencyMs': args.model_latency_ms,
+        'pageLatencyMs': args.page_latency_ms,
+        'pageJitterMs': args.page_jitter_ms
+    }
+    items = build_items(corpus, server)
+    print(f"corpus v{corpus['version']}: {len(corpus['texts'])} texts, {len(corpus['pages'])} pages; "
+          f"{args.rounds} rounds, concurrency {args.concurrency}, model {args.model_latency_ms:.0f} ms, "
+          f"pages {args.page_latency_ms:.0f}±{args.page_jitter_ms:.0f} ms")
+
+    try:
+        # The pipeline prints fetch and model failures; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_suite(args, items)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'settings': settings, **results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"throughput {results['throughput']:.1f} req/s, p95 {results['latencyMs']['p95']:.1f} ms, "
+              f"peak RSS {results['peakRssMb']:.1f} MB, errors {results['errors']}")
+        print(f"baseline written to {args.baseline}")
+        return 1 if results['errors'] else 0
+
+    try:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        print(f"no baseline at {args.baseline}; record one with --update-baseline")
+        return 1
+    if baseline.get('settings') != settings:
+        print(f"baseline was recorded with different settings: {baseline.get('settings')}")
+        print("rerun with those settings, or record a new baseline with --update-baseline")
+        return 1
+
+    print()
+    regressions = compare(baseline, results, args)
+    print()
+    if regressions:
+        print(f"FAILED: {len(regressions)} regressions")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("no regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Offline bulk scoring of a corpus with the heuristic analyzer.
+
+Streams JSONL or CSV records, scores them in batches across a process pool
+and writes one result per record, in input order, as JSONL or as CSV with
+one column per indicator count. Each batch is scanned for indicators in a
+single regex pass (IndicatorScanner.scan_many), and at most two batches per
+worker are in flight at once, so memory stays flat however large the input
+is.
+
+Usage:
+    python bulk_score.py posts.jsonl -o scores.csv [--text-field text]
+        [--id-field id] [--processes N] [--batch-size 1000]
+    cat posts.csv | python bulk_score.py - --input-format csv > scores.jsonl
+"""
+
+import argparse
+import collections
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from heuristic import score_many
+from indicators import get_indicator_scanner
+
+# Columns ahead of the indicator counts in CSV output
+CSV_COLUMNS = ['id', 'score', 'credibilityScore', 'confidence', 'summaryType', 'wordCount', 'techniques']
+TECHNIQUE_SEPARATOR = '|'
+# Stands in for a JSONL line that does not parse
+INVALID_JSON = object()
+
+
+def detect_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def parse_json_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return INVALID_JSON
+
+
+def read_records(stream, input_format, text_field, id_field):
+    """
+    Yield (id, text) pairs from a JSONL or CSV stream.
+
+    Lines that are not valid JSON and records without the text field are
+    skipped with a warning on stderr. The record's position in the input is
+    used when it has no id.
+    """
+    if input_format == 'csv':
+        csv.field_size_limit(sys.maxsize)
+        rows = csv.DictReader(stream)
+    else:
+        rows = (parse_json_line(line) for line in stream if line.strip())
+
+    for number, row in enumerate(rows, 1):
+        if row is INVALID_JSON:
+            print(f"record {number}: invalid JSON, skipped", file=sys.stderr)
+            continue
+        text = row.get(text_field) if isinstance(row, dict) else None
+        if not isinstance(text, str):
+            print(f"record {number}: no '{text_field}' text, skipped", file=sys.stderr)
+            continue
+        record_id = row.get(id_field)
+        yield (number if record_id in (None, '') else record_id), text
+
+
+def batched(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def init_worker():
+    # Compile the lexicon once per worker, not per batch
+    get_indicator_scanner()
+
+
+def score_batch(batch):
+    """
+    Score one batch of (id, text) pairs.
+
+    Returns:
+        list: Result rows with the id, scores, techniques and indicator counts
+    """
+    ids = [record_id for record_id, _ in batch]
+    verdicts = score_many([text for _, text in batch])
+    return [
+        {
+            'id': record_id,
+            'score': verdict.score,
+            'credibilityScore': verdict.credibility_score,
+            'confidence': round(verdict.confidence, 4),
+            'summaryType': verdict.summary_type,
+            'wordCount': verdict.word_count,
+            'techniques': verdict.techniques,
+            'indicators': verdict.indicators
+        }
+        for record_id, verdict in zip(ids, verdicts)
+    ]
+
+
+def score_batches(batches, processes):
+    """
+    Yield scored batches in input order, keeping at most 2 per worker in flight.
+    """
+    if processes <= 1:
+        init_worker()
+        for batch in batches:
+            yield score_batch(batch)
+        return
+
+    with multiprocessing.Pool(processes, initializer=init_worker) as pool:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(pool.apply_async(score_batch, (batch,)))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+class ResultWriter:
+    """
+    Writes result rows as JSONL or as CSV with one column per indicator.
+    """
+
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        self._csv = None
+
+    def write(self, rows):
+        if self.output_format == 'jsonl':
+            self.stream.write(''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows))
+            return
+        for row in rows:
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.stream, CSV_COLUMNS + list(row['indicators']))
+                self._csv.writeheader()
+            flat = {column: row[column] for column in CSV_COLUMNS}
+            flat['techniques'] = TECHNIQUE_SEPARATOR.join(row['techniques'])
+            flat.update(row['indicators'])
+            self._csv.writerow(flat)
+
+
+def run(input_stream, output_stream, input_format, output_format, text_field='text', id_field='id',
+        processes=None, batch_size=1000):
+    """
+    Score every record of input_stream into output_stream.
+
+    Returns:
+        int: Number of records scored
+    """
+    processes = processes or os.cpu_count() or 1
+    records = read_records(input_stream, input_format, text_field, id_field)
+    writer = ResultWriter(output_stream, output_format)
+    scored = 0
+    for rows in score_batches(batched(records, batch_size), processes):
+        writer.write(rows)
+        scored += len(rows)
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="JSONL or CSV file, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output file (.csv for CSV), default stdout as JSONL")
+    parser.add_argument('--input-format', choices=['jsonl', 'csv'])
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'])
+    parser.add_argument('--text-field', default='text')
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    input_format = detect_format(args.input, args.input_format)
+    output_format = detect_format(args.output, args.output_format)
+
+    input_stream = (io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='') if args.input == '-'
+                    else open(args.input, encoding='utf-8', newline=''))
+    output_stream = (sys.stdout if args.output == '-'
+                     else open(args.output, 'w', encoding='utf-8', newline=''))
+
+    started = time.perf_counter()
+    try:
+        scored = run(input_stream, output_stream, input_format, output_format,
+                     args.text_field, args.id_field, args.processes, args.batch_size)
+    finally:
+        input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    elapsed = time.perf_counter() - started
+    print(f"scored {scored} records in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):.0f} records/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
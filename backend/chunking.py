@@ -0,0 +1,265 @@
+"""
+Token-aware chunking of long content for model analysis.
+
+Content longer than the per-prompt token budget is split on paragraph and
+then sentence boundaries into chunks that each fit the budget. Up to
+CHUNK_MAX_ANALYZED chunks are analyzed (in parallel by the caller); when a
+document has more, the indicator scanner ranks them and the chunks with the
+most misinformation signals are kept, always together with the opening
+chunk for context. The per-chunk verdicts are merged into one.
+
+Token counts are estimates (CHARS_PER_TOKEN characters per token, about
+right for Gemini on English prose); no tokenizer is loaded.
+"""
+
+import math
+import os
+import re
+
+from indicators import get_indicator_scanner
+
+CHARS_PER_TOKEN = float(os.environ.get('CHARS_PER_TOKEN', 4))
+# Content tokens per prompt; the fixed instructions come on top
+CHUNK_TOKEN_BUDGET = int(os.environ.get('CHUNK_TOKEN_BUDGET', 2000))
+CHUNK_MAX_ANALYZED = int(os.environ.get('CHUNK_MAX_ANALYZED', 4))
+# Characters processed at a time when a whole text is only being measured or hashed
+SLICE_CHARS = 64 * 1024
+
+PARAGRAPH_BREAK_RE = re.compile(r'\n\s*\n|\r\n\s*\r\n')
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Weight of each indicator when ranking chunks; signals of manipulation
+# count most since those passages decide the verdict
+SIGNAL_WEIGHTS = {
+    'suspicious': 3,
+    'conspiracy': 3,
+    'emotional': 2,
+    'factual': 1,
+    'caps': 0.5,
+    'exclamations': 0.5,
+}
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of model tokens in a piece of text.
+
+    Binary parts (image_input.ImagePart) count as their fixed token cost.
+    """
+    if not isinstance(text, str):
+        return getattr(text, 'token_count', 0)
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def whitespace_slices(text, slice_chars=SLICE_CHARS):
+    """
+    Yield consecutive pieces of text of about slice_chars characters.
+
+    Every piece but the last ends just after an ASCII space or newline, so
+    no word, and no Unicode normalization, spans two pieces. Text without
+    such a break is yielded whole.
+    """
+    start = 0
+    length = len(text)
+    while start < length:
+        end = start + slice_chars
+        if end < length:
+            cut = max(text.rfind(' ', start, end), text.rfind('\n', start, end))
+            if cut == -1:
+                forward = [index for index in (text.find(' ', end), text.find('\n', end)) if index != -1]
+                cut = min(forward) if forward else length - 1
+            end = cut + 1
+        yield text[start:end]
+        start = end
+
+
+def count_words(text):
+    """
+    Count whitespace-separated words, as len(text.split()) would, without
+    building the list of words.
+    """
+    return sum(len(piece.split()) for piece in whitespace_slices(text))
+
+
+def _split_to_budget(text, max_chars):
+    """
+    Split one oversize piece on sentence ends, then on whitespace, then hard.
+    """
+    pieces = []
+    for sentence in SENTENCE_END_RE.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_into_chunks(text, token_budget=CHUNK_TOKEN_BUDGET):
+    """
+    Split text into chunks of at most token_budget estimated tokens.
+
+    Paragraphs are kept whole where they fit; longer ones are split between
+    sentences. Chunks are packed greedily, so consecutive short paragraphs
+    share a chunk.
+
+    Args:
+        text (str): Content to split
+        token_budget (int): Maximum estimated tokens per chunk
+
+    Returns:
+        list: Chunk strings in document order
+    """
+    max_chars = max(1, int(token_budget * CHARS_PER_TOKEN))
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    for paragraph in PARAGRAPH_BREAK_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, '\n\n'))
+        else:
+            pieces.extend((sentence, ' ') for sentence in _split_to_budget(paragraph, max_chars))
+
+    chunks = []
+    current = ''
+    for piece, separator in pieces:
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ''
+        current = current + separator + piece if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def signal_score(chunk, scanner=None):
+    """
+    Rank a chunk by the indicators it contains, per 1000 characters.
+    """
+    counts = (scanner or get_indicator_scanner()).scan(chunk)
+    weighted = sum(weight * counts.get(name, 0) for name, weight in SIGNAL_WEIGHTS.items())
+    return weighted * 1000 / max(len(chunk), 1)
+
+
+class ChunkPlan:
+    """
+    Which parts of a submission are sent to the model, and why.
+    """
+
+    def __init__(self, content_tokens, chunks, selected, strategy, token_budget):
+        self.content_tokens = content_tokens
+        self.chunks = chunks
+        self.selected = selected
+        self.strategy = strategy
+        self.token_budget = token_budget
+
+    @property
+    def selected_chunks(self):
+        return [self.chunks[index] for index in self.selected]
+
+    def metadata(self, prompts):
+        """
+        Prompt and truncation details for analysisMetadata.
+
+        Args:
+            prompts (list): The prompt parts sent for each selected chunk
+        """
+        analyzed_tokens = sum(estimate_tokens(chunk) for chunk in self.selected_chunks)
+        return {
+            'strategy': self.strategy,
+            'contentTokens': self.content_tokens,
+            'analyzedTokens': analyzed_tokens,
+            'promptTokens': sum(estimate_tokens(part) for parts in prompts for part in parts),
+            'chunkTokenBudget': self.token_budget,
+            'chunks': len(self.chunks),
+            'analyzedChunks': list(self.selected),
+            'truncated': len(self.selected) < len(self.chunks)
+        }
+
+
+def plan_chunks(content_type, content_data, token_budget=CHUNK_TOKEN_BUDGET, max_analyzed=CHUNK_MAX_ANALYZED):
+    """
+    Decide how a submission is split and which chunks are analyzed.
+
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The content to analyze (fetched text for URLs)
+        token_budget (int): Maximum estimated content tokens per prompt
+        max_analyzed (int): Maximum number of chunks sent to the model
+
+    Returns:
+        ChunkPlan: The plan; strategy is 'single', 'parallel' or 'top_n'
+    """
+    # Images are passed through whole; only prose is split
+    if content_type == 'image':
+        return ChunkPlan(estimate_tokens(content_data), [content_data], [0], 'single', token_budget)
+
+    text = str(content_data)
+    content_tokens = estimate_tokens(text)
+    if content_tokens <= token_budget:
+        return ChunkPlan(content_tokens, [text], [0], 'single', token_budget)
+
+    chunks = split_into_chunks(text, token_budget)
+    max_analyzed = max(1, max_analyzed)
+    if len(chunks) <= max_analyzed:
+        return ChunkPlan(content_tokens, chunks, list(range(len(chunks))), 'parallel', token_budget)
+
+    # Keep the opening chunk for context plus the highest-signal rest
+    scanner = get_indicator_scanner()
+    ranked = sorted(range(1, len(chunks)), key=lambda index: signal_score(chunks[index], scanner), reverse=True)
+    selected = sorted([0] + ranked[:max_analyzed - 1])
+    return ChunkPlan(content_tokens, chunks, selected, 'top_n', token_budget)
+
+
+def merge_analyses(analyses, weights):
+    """
+    Merge per-chunk model analyses into one verdict.
+
+    The credibility score is the weighted mean of the chunk scores (weighted
+    by chunk size), pulled toward the worst chunk so a single fabricated
+    passage is not averaged away. The summary comes from the least credible
+    chunk, and techniques are the union in order of how often they appear.
+
+    Args:
+        analyses (list): Parsed analyses (output of parse_ai_response)
+        weights (list): Relative weight of each analysis, e.g. token counts
+
+    Returns:
+        dict: A single analysis in the prompt schema
+    """
+    if len(analyses) == 1:
+        return analyses[0]
+
+    scores = []
+    for analysis in analyses:
+        try:
+            scores.append(float(analysis.get('credibility', {}).get('score', 5)))
+        except (TypeError, ValueError):
+            scores.append(5.0)
+    total_weight = sum(weights) or len(weights)
+    mean_score = sum(score * weight for score, weight in zip(scores, weights)) / total_weight
+    worst = min(range(len(analyses)), key=lambda index: scores[index])
+    score = round((mean_score + scores[worst]) / 2)
+
+    technique_counts = {}
+    for analysis in analyses:
+        for technique in analysis.get('techniques', []) or []:
+            technique_counts[technique] = technique_counts.get(technique, 0) + 1
+    techniques = sorted(technique_counts, key=lambda name: -technique_counts[name])
+
+    worst_details = analyses[worst].get('credibility', {}).get('details', '')
+    return {
+        'summary': analyses[worst].get('summary', 'Analysis completed'),
+        'credibility': {
+            'score': max(1, min(10, score)),
+            'details': f"Combined from {len(analyses)} sections (lowest section score {scores[worst]:g}/10). {worst_details}".strip()
+        },
+        'techniques': techniques,
+        'imageAnalysis': analyses[0].get('imageAnalysis', 'No image submitted.')
+    }
@@ -0,0 +1,347 @@
+"""
+HTML text extraction for URL analysis.
+
+Two engines are available, selected with the HTML_EXTRACTOR environment
+variable:
+
+    streaming (default): a single-pass html.parser state machine that
+        collects paragraph text as it goes and stops parsing as soon as the
+        character budget is filled.
+    soup: the original BeautifulSoup tree walk.
+
+Both engines produce the same text: every <p> element's stripped strings
+concatenated, paragraphs joined with spaces, and the whole <body> text as a
+fallback for pages without any paragraphs. benchmarks/bench_extractor.py
+checks parity and throughput over the saved fixture pages.
+"""
+
+import codecs
+import logging
+import os
+import re
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+HTML_EXTRACTOR = os.environ.get('HTML_EXTRACTOR', 'streaming')
+# Limit text length to avoid processing issues. Long articles are split
+# into token-budgeted chunks downstream (see chunking.py), so this only
+# bounds parsing work on pathological pages
+EXTRACT_MAX_CHARS = int(os.environ.get('EXTRACT_MAX_CHARS', 100000))
+TRUNCATION_SUFFIX = "... (content truncated)"
+
+# Text is fed to the streaming parser in slices of this many characters so
+# parsing can stop early once the budget is reached
+FEED_CHUNK_CHARS = 32 * 1024
+
+# Tags BeautifulSoup closes immediately, so they never contain text
+VOID_TAGS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame',
+    'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta',
+    'nextid', 'param', 'source', 'spacer', 'track', 'wbr'
+])
+# Tags whose strings BeautifulSoup's get_text() leaves out
+NON_TEXT_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.IGNORECASE)
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def extract_text(content, max_chars=EXTRACT_MAX_CHARS, engine=None):
+    """
+    Extract readable text from an HTML document.
+
+    Args:
+        content (bytes): Raw HTML as fetched
+        max_chars (int): Character budget for the extracted text
+        engine (str): 'streaming' or 'soup'; defaults to HTML_EXTRACTOR
+
+    Returns:
+        str: Extracted text content from the webpage
+
+    Raises:
+        Exception: If no readable text can be extracted
+    """
+
+    engine = engine or HTML_EXTRACTOR
+    if engine == 'soup':
+        return extract_text_soup(content, max_chars)
+    if engine != 'streaming':
+        logger.warning(f"Unknown HTML_EXTRACTOR '{engine}', using streaming extractor")
+    return extract_text_streaming(content, max_chars)
+
+
+def preload_extractor(engine=None):
+    """
+    Import the parser behind an extraction engine ahead of first use.
+
+    Args:
+        engine (str): 'streaming' or 'soup'; defaults to HTML_EXTRACTOR
+    """
+    if (engine or HTML_EXTRACTOR) == 'soup':
+        import bs4  # noqa: F401
+
+
+def extract_text_soup(content, max_chars=EXTRACT_MAX_CHARS):
+    """
+    Extract text by building a full BeautifulSoup tree (the original engine).
+    """
+
+    from bs4 import BeautifulSoup
+
+    try:
+        # Parse the HTML content
+        soup = BeautifulSoup(content, 'html.parser')
+    except Exception as parse_error:
+        raise Exception(f"Failed to parse HTML content: {str(parse_error)}")
+
+    # Extract text from all paragraph tags
+    paragraphs = soup.find_all('p')
+
+    # If no paragraphs found, try to get text from common content containers
+    if not paragraphs:
+        # Try alternative selectors for content
+        content_selectors = ['article', '.content', '.main', '.post', '.entry']
+        for selector in content_selectors:
+            try:
+                elements = soup.select(selector)
+                if elements:
+                    paragraphs = elements[0].find_all('p')
+                    if paragraphs:
+                        break
+            except Exception:
+                continue  # If selector fails, try the next one
+
+    # If still no paragraphs, get text from the body
+    if not paragraphs:
+        body = soup.find('body')
+        if body:
+            try:
+                # Get all text but limit to avoid huge content
+                text_content = body.get_text(separator=' ', strip=True)
+                return text_content[:max_chars] if len(text_content) > max_chars else text_content
+            except Exception:
+                raise Exception("Failed to extract text from webpage body")
+
+    # Concatenate text from all paragraphs
+    try:
+        extracted_text = ' '.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
+    except Exception:
+        raise Exception("Failed to extract text from paragraph elements")
+
+    return _finish_paragraph_text(extracted_text, max_chars)
+
+
+def extract_text_streaming(content, max_chars=EXTRACT_MAX_CHARS):
+    """
+    Extract text in a single streaming pass, stopping at the character budget.
+    """
+
+    text = decode_html(content)
+    parser = ParagraphExtractor(max_chars)
+    for start in range(0, len(text), FEED_CHUNK_CHARS):
+        parser.feed(text[start:start + FEED_CHUNK_CHARS])
+        if parser.done:
+            break
+    else:
+        parser.close()
+
+    if parser.paragraphs:
+        extracted_text = ' '.join(
+            ''.join(parts) for parts in parser.paragraphs if parts
+        )
+        return _finish_paragraph_text(extracted_text, max_chars)
+
+    if parser.saw_body:
+        text_content = ' '.join(parser.body_parts)
+        return text_content[:max_chars]
+
+    raise Exception("No readable text content found on the webpage")
+
+
+def _finish_paragraph_text(extracted_text, max_chars):
+    # Ensure we have some content
+    if not extracted_text.strip():
+        raise Exception("No readable text content found on the webpage")
+
+    if len(extracted_text) > max_chars:
+        extracted_text = extracted_text[:max_chars] + TRUNCATION_SUFFIX
+
+    return extracted_text
+
+
+def decode_html(content):
+    """
+    Decode an HTML byte string the way BeautifulSoup's encoding detection does.
+
+    A byte-order mark wins, then a <meta> charset declaration, then UTF-8,
+    and finally windows-1252 with replacement characters.
+
+    Args:
+        content (bytes or str): Raw HTML
+
+    Returns:
+        str: Decoded HTML
+    """
+
+    if isinstance(content, str):
+        return content
+
+    candidates = []
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            candidates.append(encoding)
+            break
+    else:
+        declared = META_CHARSET_RE.search(content[:4096])
+        if declared:
+            try:
+                candidates.append(codecs.lookup(declared.group(1).decode('ascii')).name)
+            except (LookupError, UnicodeDecodeError):
+                pass
+    candidates.extend(['utf-8', 'windows-1252'])
+
+    for encoding in candidates:
+        try:
+            return content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return content.decode('windows-1252', errors='replace')
+
+
+class ParagraphExtractor(HTMLParser):
+    """
+    Incremental parser that collects <p> text with BeautifulSoup semantics.
+
+    Only a stack of open tag names is kept - no tree is built. Each <p> gets a
+    slot in document order; stripped strings are appended to every open
+    paragraph (so nested paragraphs repeat their text, as get_text() does).
+    Body text is collected on the side in case the page has no paragraphs.
+    """
+
+    def __init__(self, max_chars):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.done = False
+        self.paragraphs = []
+        self.saw_body = False
+        self.body_parts = []
+        self._body_length = 0
+        self._stack = []
+        self._open_slots = []
+        self._closed = []
+        self._lengths = []
+        self._pending = []
+        self._skip_depth = 0
+        self._body_depth = 0
+        # Joined length of the leading run of closed paragraphs
+        self._settled = 0
+        self._settled_count = 0
+        self._settled_nonempty = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag in VOID_TAGS:
+            return
+        slot = None
+        if tag == 'p':
+            slot = len(self.paragraphs)
+            self.paragraphs.append([])
+            self._closed.append(False)
+            self._lengths.append(0)
+            self._open_slots.append(slot)
+        elif tag in NON_TEXT_TAGS:
+            self._skip_depth += 1
+        elif tag == 'body':
+            self._body_depth += 1
+            self.saw_body = True
+        self._stack.append((tag, slot))
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        stack = self._stack
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index][0] == tag:
+                break
+        else:
+            return  # Stray end tag, ignored like BeautifulSoup does
+        while len(stack) > index:
+            name, slot = stack.pop()
+            if slot is not None:
+                self._open_slots.remove(slot)
+                self._closed[slot] = True
+            elif name in NON_TEXT_TAGS:
+                self._skip_depth -= 1
+            elif name == 'body':
+                self._body_depth -= 1
+        if tag == 'p':
+            self._check_budget()
+
+    def handle_data(self, data):
+        # html.parser may deliver one text node in several pieces when it
+        # straddles a feed() boundary, so strip only once the node is complete
+        self._pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def handle_decl(self, decl):
+        self._flush_text()
+
+    def handle_pi(self, data):
+        self._flush_text()
+
+    def unknown_decl(self, data):
+        self._flush_text()
+        # BeautifulSoup keeps CDATA sections as text
+        if data.startswith('CDATA['):
+            self._pending.append(data[6:])
+            self._flush_text()
+
+    def close(self):
+        super().close()
+        self._flush_text()
+
+    def _flush_text(self):
+        if not self._pending:
+            return
+        data = ''.join(self._pending)
+        self._pending.clear()
+        if self._skip_depth:
+            return
+        text = data.strip()
+        if not text:
+            return
+        if self._open_slots:
+            for slot in self._open_slots:
+                self.paragraphs[slot].append(text)
+                self._lengths[slot] += len(text)
+            self._check_budget()
+        elif self._body_depth and not self.paragraphs and self._body_length <= self.max_chars:
+            self.body_parts.append(text)
+            self._body_length += len(text) + 1
+
+    def _check_budget(self):
+        """
+        Stop once the text that can no longer change exceeds the budget.
+        """
+        lengths = self._lengths
+        closed = self._closed
+        count = len(lengths)
+        while self._settled_count < count and closed[self._settled_count]:
+            length = lengths[self._settled_count]
+            if length:
+                self._settled += length + (1 if self._settled_nonempty else 0)
+                self._settled_nonempty += 1
+            self._settled_count += 1
+        determined = self._settled
+        # The first open paragraph only ever grows, so its text so far is final
+        if self._settled_count < count and lengths[self._settled_count]:
+            determined += lengths[self._settled_count] + (1 if self._settled_nonempty else 0)
+        if determined > self.max_chars:
+            self.done = True
@@ -0,0 +1,329 @@
+"""
+Per-host politeness for URL fetches.
+
+Every fetch first takes a slot from its host's state:
+
+- a concurrency cap, so a burst of submissions pointing at one site opens at
+  most FETCH_HOST_CONCURRENCY connections to it;
+- a token bucket, so requests to a host are spread at FETCH_HOST_RATE per
+  second after an initial burst;
+- a back-off window, set from Retry-After on 429/503 responses, or after
+  FETCH_HOST_FAILURE_THRESHOLD consecutive timeouts, connection failures
+  or 5xx responses (the negative cache).
+
+A fetch that would have to wait longer than FETCH_HOST_MAX_WAIT seconds, or
+that targets a host in its back-off window, fails immediately with
+HostBackoffError instead of tying up a worker.
+
+The sync fetcher blocks on a condition variable; the async fetcher polls
+the same state with short sleeps, so both serving modes share the limits.
+"""
+
+import asyncio
+import email.utils
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+FETCH_HOST_CONCURRENCY = int(os.environ.get('FETCH_HOST_CONCURRENCY', 4))
+FETCH_HOST_RATE = float(os.environ.get('FETCH_HOST_RATE', 2))
+FETCH_HOST_BURST = float(os.environ.get('FETCH_HOST_BURST', 4))
+# Longest a fetch may queue for its host before failing
+FETCH_HOST_MAX_WAIT = float(os.environ.get('FETCH_HOST_MAX_WAIT', 5))
+FETCH_HOST_FAILURE_THRESHOLD = int(os.environ.get('FETCH_HOST_FAILURE_THRESHOLD', 2))
+# How long a failing host is skipped
+FETCH_NEGATIVE_TTL = float(os.environ.get('FETCH_NEGATIVE_TTL', 30))
+# Upper bound on a Retry-After we are willing to honour
+FETCH_RETRY_AFTER_MAX = float(os.environ.get('FETCH_RETRY_AFTER_MAX', 300))
+FETCH_SCHEDULER_MAX_HOSTS = int(os.environ.get('FETCH_SCHEDULER_MAX_HOSTS', 4096))
+
+ASYNC_POLL_SECONDS = 0.02
+
+ADMISSIONS = get_registry().counter(
+    'satya_fetch_host_admissions_total',
+    'URL fetches by scheduling outcome (admitted, backoff while the host is blocked, wait when the queue was too long).',
+    ['outcome']
+)
+BACKOFFS = get_registry().counter(
+    'satya_fetch_host_backoffs_total',
+    'Hosts put into back-off, by reason (retry_after or failures).',
+    ['reason']
+)
+
+
+class HostBackoffError(Exception):
+    """Raised when a fetch is refused because its host is backing off or saturated."""
+
+
+def host_of(url):
+    """
+    Scheduling key of a URL: its lowercased host and port.
+    """
+    parts = urlsplit(url)
+    return (parts.netloc or parts.path).lower()
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parse a Retry-After header into seconds from now.
+
+    Args:
+        value (str): Delay in seconds or an HTTP date
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - (now or time.time()))
+
+
+class HostState:
+    """
+    Concurrency, rate and back-off state of one host.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.failures = 0
+
+    def refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        else:
+            self.tokens = self.burst
+        self.refilled_at = now
+
+    def token_wait(self):
+        """
+        Seconds until a token is available (0 if one is available now).
+        """
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FetchScheduler:
+    """
+    Admits fetches per host under concurrency, rate and back-off limits.
+
+    Args:
+        concurrency (int): Maximum in-flight fetches per host
+        rate (float): Sustained requests per second per host
+        burst (float): Token bucket size
+        max_wait (float): Longest a fetch may queue for its host
+        failure_threshold (int): Consecutive failures before a host is skipped
+        negative_ttl (float): Seconds a failing host is skipped
+        max_hosts (int): Host states kept; idle ones are dropped first
+    """
+
+    def __init__(self, concurrency=FETCH_HOST_CONCURRENCY, rate=FETCH_HOST_RATE, burst=FETCH_HOST_BURST,
+                 max_wait=FETCH_HOST_MAX_WAIT, failure_threshold=FETCH_HOST_FAILURE_THRESHOLD,
+                 negative_ttl=FETCH_NEGATIVE_TTL, max_hosts=FETCH_SCHEDULER_MAX_HOSTS):
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_wait = max_wait
+        self.failure_threshold = max(1, failure_threshold)
+        self.negative_ttl = negative_ttl
+        self.max_hosts = max_hosts
+        self._hosts = OrderedDict()
+        self._condition = threading.Condition()
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState(self.rate, self.burst)
+            if len(self._hosts) > self.max_hosts:
+                # Drop the least recently used idle host that is not backing off
+                now = time.monotonic()
+                for key, old in self._hosts.items():
+                    if key != host and old.in_flight == 0 and old.blocked_until <= now:
+                        del self._hosts[key]
+                        break
+        else:
+            self._hosts.move_to_end(host)
+        return state
+
+    def _try_admit(self, host, deadline):
+        """
+        Take a slot for host if possible; call with the condition held.
+
+        Returns:
+            float: 0 when admitted, otherwise seconds worth waiting before retrying
+
+        Raises:
+            HostBackoffError: If the host is backing off past the deadline
+        """
+        now = time.monotonic()
+        state = self._state(host)
+        if state.blocked_until > now:
+            if state.blocked_until > deadline:
+                ADMISSIONS.inc(outcome='backoff')
+                raise HostBackoffError(
+                    f"Host {host} is backing off for {state.blocked_until - now:.0f}s after errors or rate limiting"
+                )
+            return state.blocked_until - now
+        state.refill(now)
+        token_wait = state.token_wait()
+        if token_wait > 0:
+            return token_wait
+        if state.in_flight >= self.concurrency:
+            return self.max_wait
+        state.tokens -= 1
+        state.in_flight += 1
+        ADMISSIONS.inc(outcome='admitted')
+        return 0.0
+
+    def _release(self, host):
+        with self._condition:
+            state = self._hosts.get(host)
+            if state is not None:
+                state.in_flight = max(0, state.in_flight - 1)
+            self._condition.notify_all()
+
+    def _queue_timeout(self, host):
+        ADMISSIONS.inc(outcome='wait')
+        return HostBackoffError(f"Too many pending fetches for host {host}; try again shortly")
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Hold a fetch slot for the URL's host, blocking up to max_wait.
+
+        Raises:
+            HostBackoffError: If the host is backing off or no slot frees up in time
+        """
+        host = host_of(url)
+        deadline = time.monotonic() + self.max_wait
+        with self._condition:
+            while True:
+                wait = self._try_admit(host, deadline)
+                if wait == 0:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._queue_timeout(host)
+                self._condition.wait(min(wait, remaining))
+        try:
+            yield host
+        finally:
+            self._release(host)
+
+    @asynccontextmanager
+    async def slot_async(self, url):
+        """
+        Async counterpart of slot(); polls instead of blocking the event loop.
+        """
+        host = host_of(url)
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self._condition:
+                wait = self._try_admit(host, deadline)
+            if wait == 0:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._queue_timeout(host)
+            await asyncio.sleep(min(wait, remaining, ASYNC_POLL_SECONDS))
+        try:
+            yield host
+        finally:
+            self._release(host)
+
+    def record_response(self, host, status_code, retry_after=None):
+        """
+        Update host state from an HTTP response.
+
+        Args:
+            host (str): Key from host_of
+            status_code (int): Response status
+            retry_after (str): Retry-After header value, if any
+        """
+        if status_code in (429, 503):
+            delay = parse_retry_after(retry_after)
+            if delay is not None:
+                self._block(host, min(delay, FETCH_RETRY_AFTER_MAX), 'retry_after')
+                return
+        if status_code == 429 or status_code >= 500:
+            self.record_failure(host)
+            return
+        with self._condition:
+            self._state(host).failures = 0
+
+    def record_failure(self, host):
+        """
+        Count a timeout, connection failure or server error against the host.
+        """
+        with self._condition:
+            state = self._state(host)
+            state.failures += 1
+            failures = state.failures
+        if failures >= self.failure_threshold:
+            self._block(host, self.negative_ttl, 'failures')
+
+    def _block(self, host, seconds, reason):
+        with self._condition:
+            state = self._state(host)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+            state.failures = 0
+        BACKOFFS.inc(reason=reason)
+        logger.warning(f"Backing off host {host} for {seconds:.0f}s ({reason})")
+
+    def blocked_hosts(self):
+        now = time.monotonic()
+        with self._condition:
+            return sum(1 for state in self._hosts.values() if state.blocked_until > now)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_fetch_scheduler():
+    """
+    Return the process-wide fetch scheduler shared by both fetchers.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FetchScheduler()
+    return _scheduler
+
+
+def collect_scheduler_metrics():
+    """
+    Metrics collector exposing how many hosts are currently backing off.
+
+    Returns:
+        list: (name, kind, documentation, samples) tuples for metrics.MetricsRegistry
+    """
+    if _scheduler is None:
+        return []
+    return [
+        ('satya_fetch_hosts_backing_off', 'gauge', 'Hosts currently skipped by the fetch scheduler.',
+         [({}, _scheduler.blocked_hosts())])
+    ]
@@ -0,0 +1,461 @@
+"""
+Pooled, streaming HTTP fetcher used for URL analysis.
+
+A single keep-alive session is shared by every request so repeat visits to a
+host skip the DNS/TCP/TLS handshake. Bodies are streamed and reading stops
+once the byte budget is spent or the wall-clock deadline passes, and
+responses carrying validators (ETag / Last-Modified) are kept in a small
+local cache so later fetches can be revalidated with a conditional request.
+
+AsyncURLFetcher provides the same behaviour on top of httpx for the async
+serving mode (see asgi_app.py). Both take each fetch's slot from the shared
+per-host scheduler in fetch_scheduler.py and report timeouts, failures and
+Retry-After back to it.
+
+requests and httpx are imported on first use, so cold starts that never
+fetch a URL do not pay for them.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fetch_scheduler import get_fetch_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Separate connect and read timeouts so one slow site cannot tie up a worker
+FETCH_CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', 5))
+FETCH_READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', 10))
+# Wall-clock budget for the whole download, checked between streamed chunks
+FETCH_TOTAL_TIMEOUT = float(os.environ.get('FETCH_TOTAL_TIMEOUT', 20))
+# Stop reading the body after this many bytes
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 2 * 1024 * 1024))
+FETCH_POOL_SIZE = int(os.environ.get('FETCH_POOL_SIZE', 32))
+FETCH_CACHE_MAX_ENTRIES = int(os.environ.get('FETCH_CACHE_MAX_ENTRIES', 256))
+FETCH_CACHE_MAX_BYTES = int(os.environ.get('FETCH_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+FETCH_CHUNK_SIZE = 16 * 1024
+
+# Set headers to mimic a regular browser request
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+class FetchError(Exception):
+    """Raised when a URL cannot be fetched."""
+
+
+class FetchResult:
+    """
+    Body and metadata of a fetched page.
+    """
+
+    def __init__(self, url, status_code, content, encoding=None, truncated=False,
+                 etag=None, last_modified=None, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.truncated = truncated
+        self.etag = etag
+        self.last_modified = last_modified
+        self.from_cache = from_cache
+
+
+class ResponseCache:
+    """
+    Bounded LRU of fetched bodies that carry HTTP validators.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            result = self._entries.get(url)
+            if result is not None:
+                self._entries.move_to_end(url)
+            return result
+
+    def set(self, url, result):
+        if len(result.content) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            if previous is not None:
+                self._bytes -= len(previous.content)
+            self._entries[url] = result
+            self._bytes += len(result.content)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.content)
+
+
+class URLFetcher:
+    """
+    Fetches pages over a shared keep-alive session with streaming byte budgets.
+    """
+
+    def __init__(self, connect_timeout=FETCH_CONNECT_TIMEOUT, read_timeout=FETCH_READ_TIMEOUT,
+                 total_timeout=FETCH_TOTAL_TIMEOUT, max_bytes=FETCH_MAX_BYTES,
+                 pool_size=FETCH_POOL_SIZE, response_cache=None, scheduler=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.pool_size = pool_size
+        self.response_cache = response_cache
+        self.scheduler = scheduler
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.revalidated = 0
+
+    @property
+    def session(self):
+        """
+        The shared requests.Session, created on first use.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers.update(DEFAULT_HEADERS)
+                    self._session = session
+        return self._session
+
+    def fetch(self, url):
+        """
+        Fetch a URL, reading at most max_bytes of the body.
+
+        Args:
+            url (str): The URL to fetch
+
+        Returns:
+            FetchResult: The (possibly truncated) body and response metadata
+
+        Raises:
+            FetchError: On timeouts, connection failures and HTTP errors
+            HostBackoffError: If the host is backing off or saturated
+        """
+        if self.scheduler is None:
+            return self._fetch(url, None)
+        with self.scheduler.slot(url) as host:
+            return self._fetch(url, host)
+
+    def _fetch(self, url, host):
+        import requests
+
+        cached = self.response_cache.get(url) if self.response_cache is not None else None
+        request_headers = {}
+        if cached is not None:
+            if cached.etag:
+                request_headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                request_headers['If-Modified-Since'] = cached.last_modified
+
+        deadline = time.monotonic() + self.total_timeout
+        try:
+            response = self.session.get(
+                url,
+                headers=request_headers,
+                timeout=(self.connect_timeout, self.read_timeout),
+                stream=True
+            )
+        except requests.exceptions.Timeout:
+            self._record_failure(host)
+            raise FetchError("Request timed out - the webpage took too long to respond")
+        except requests.exceptions.ConnectionError:
+            self._record_failure(host)
+            raise FetchError("Failed to connect to the URL - check if the URL is accessible")
+        except requests.exceptions.RequestException as e:
+            raise FetchError(f"Request failed: {str(e)}")
+
+        self._record_response(host, response.status_code, response.headers.get('Retry-After'))
+        try:
+            if response.status_code == 304 and cached is not None:
+                self.revalidated += 1
+                logger.info(f"Conditional fetch not modified, serving cached body for {url}")
+                return FetchResult(url, 200, cached.content, cached.encoding, cached.truncated,
+                                   cached.etag, cached.last_modified, from_cache=True)
+
+            try:
+                response.raise_for_status()  # Raise an exception for bad status codes
+            except requests.exceptions.HTTPError as e:
+                raise FetchError(f"HTTP error occurred: {e.response.status_code} - {e.response.reason}")
+
+            try:
+                content, truncated = self._read_body(response, deadline)
+            except FetchError:
+                self._record_failure(host)
+                raise
+        finally:
+            response.close()
+
+        result = FetchResult(
+            url,
+            response.status_code,
+            content,
+            encoding=response.encoding,
+            truncated=truncated,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+        if self.response_cache is not None and (result.etag or result.last_modified):
+            self.response_cache.set(url, result)
+        return result
+
+    def _record_response(self, host, status_code, retry_after):
+        if host is not None:
+            self.scheduler.record_response(host, status_code, retry_after)
+
+    def _record_failure(self, host):
+        if host is not None:
+            self.scheduler.record_failure(host)
+
+    def _read_body(self, response, deadline):
+        """
+        Stream the body until the byte budget or the deadline is reached.
+
+        Returns:
+            tuple: (bytes read, whether the body was cut short)
+        """
+        import requests
+
+        chunks = []
+        received = 0
+        try:
+            for chunk in self._iter_chunks(response):
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= self.max_bytes:
+                    return b''.join(chunks)[:self.max_bytes], True
+                if time.monotonic() > deadline:
+                    raise FetchError("Request timed out - the webpage took too long to respond")
+        except requests.exceptions.Timeout:
+            raise FetchError("Request timed out - the webpage took too long to respond")
+        except requests.exceptions.ConnectionError:
+            raise FetchError("Failed to connect to the URL - check if the URL is accessible")
+        except requests.exceptions.RequestException as e:
+            raise FetchError(f"Request failed: {str(e)}")
+        return b''.join(chunks), False
+
+    @staticmethod
+    def _iter_chunks(response):
+        """
+        Yield body chunks as soon as the socket delivers them.
+
+        urllib3 2.x exposes read1(), which returns after a single socket read
+        instead of blocking until a full chunk is buffered, so the deadline is
+        checked even when a server trickles bytes. Older urllib3 falls back to
+        iter_content.
+        """
+        import requests
+        import urllib3
+
+        raw = response.raw
+        if not hasattr(raw, 'read1'):
+            yield from response.iter_content(chunk_size=FETCH_CHUNK_SIZE)
+            return
+        while True:
+            try:
+                chunk = raw.read1(FETCH_CHUNK_SIZE, decode_content=True)
+            except urllib3.exceptions.ReadTimeoutError:
+                raise requests.exceptions.ReadTimeout("Read timed out")
+            except urllib3.exceptions.ProtocolError as e:
+                raise requests.exceptions.ConnectionError(e)
+            if not chunk:
+                if raw.closed or raw.isclosed():
+                    return
+                continue
+            yield chunk
+
+
+class AsyncURLFetcher:
+    """
+    Async counterpart of URLFetcher built on a pooled httpx.AsyncClient.
+
+    The client is bound to the event loop that first uses it, so one
+    instance should serve a single event loop (one per ASGI worker process).
+    """
+
+    def __init__(self, connect_timeout=FETCH_CONNECT_TIMEOUT, read_timeout=FETCH_READ_TIMEOUT,
+                 total_timeout=FETCH_TOTAL_TIMEOUT, max_bytes=FETCH_MAX_BYTES,
+                 pool_size=FETCH_POOL_SIZE, response_cache=None, scheduler=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.pool_size = pool_size
+        self.response_cache = response_cache
+        self.scheduler = scheduler
+        self._client = None
+        self.revalidated = 0
+
+    @property
+    def client(self):
+        """
+        The shared httpx.AsyncClient, created on first use.
+        """
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size * 4, max_keepalive_connections=self.pool_size)
+            )
+        return self._client
+
+    async def aclose(self):
+        """
+        Close the pooled client.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url):
+        """
+        Fetch a URL, reading at most max_bytes of the body.
+
+        Args:
+            url (str): The URL to fetch
+
+        Returns:
+            FetchResult: The (possibly truncated) body and response metadata
+
+        Raises:
+            FetchError: On timeouts, connection failures and HTTP errors
+            HostBackoffError: If the host is backing off or saturated
+        """
+        if self.scheduler is None:
+            return await self._fetch_guarded(url, None)
+        async with self.scheduler.slot_async(url) as host:
+            return await self._fetch_guarded(url, host)
+
+    async def _fetch_guarded(self, url, host):
+        import httpx
+
+        try:
+            return await asyncio.wait_for(self._fetch(url, host), timeout=self.total_timeout)
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            if host is not None:
+                self.scheduler.record_failure(host)
+            raise FetchError("Request timed out - the webpage took too long to respond")
+        except httpx.ConnectError:
+            if host is not None:
+                self.scheduler.record_failure(host)
+            raise FetchError("Failed to connect to the URL - check if the URL is accessible")
+        except httpx.HTTPError as e:
+            raise FetchError(f"Request failed: {str(e)}")
+
+    async def _fetch(self, url, host):
+        cached = self.response_cache.get(url) if self.response_cache is not None else None
+        request_headers = {}
+        if cached is not None:
+            if cached.etag:
+                request_headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                request_headers['If-Modified-Since'] = cached.last_modified
+
+        async with self.client.stream('GET', url, headers=request_headers) as response:
+            if host is not None:
+                self.scheduler.record_response(host, response.status_code, response.headers.get('Retry-After'))
+            if response.status_code == 304 and cached is not None:
+                self.revalidated += 1
+                logger.info(f"Conditional fetch not modified, serving cached body for {url}")
+                return FetchResult(url, 200, cached.content, cached.encoding, cached.truncated,
+                                   cached.etag, cached.last_modified, from_cache=True)
+
+            if response.status_code >= 400:
+                raise FetchError(f"HTTP error occurred: {response.status_code} - {response.reason_phrase}")
+
+            chunks = []
+            received = 0
+            truncated = False
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= self.max_bytes:
+                    truncated = True
+                    break
+            content = b''.join(chunks)[:self.max_bytes]
+
+        result = FetchResult(
+            url,
+            response.status_code,
+            content,
+            encoding=response.charset_encoding,
+            truncated=truncated,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+        if self.response_cache is not None and (result.etag or result.last_modified):
+            self.response_cache.set(url, result)
+        return result
+
+
+_fetcher = None
+_async_fetcher = None
+_response_cache = None
+_fetcher_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Return the process-wide conditional-request cache shared by both fetchers.
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _fetcher_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(FETCH_CACHE_MAX_ENTRIES, FETCH_CACHE_MAX_BYTES)
+    return _response_cache
+
+
+def get_fetcher():
+    """
+    Return the process-wide URL fetcher configured from the environment.
+
+    Returns:
+        URLFetcher: The shared fetcher
+    """
+    global _fetcher
+    if _fetcher is None:
+        response_cache = get_response_cache()
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = URLFetcher(response_cache=response_cache, scheduler=get_fetch_scheduler())
+    return _fetcher
+
+
+def get_async_fetcher():
+    """
+    Return the process-wide async URL fetcher for the ASGI serving mode.
+
+    Returns:
+        AsyncURLFetcher: The shared async fetcher
+    """
+    global _async_fetcher
+    if _async_fetcher is None:
+        response_cache = get_response_cache()
+        with _fetcher_lock:
+            if _async_fetcher is None:
+                _async_fetcher = AsyncURLFetcher(response_cache=response_cache, scheduler=get_fetch_scheduler())
+    return _async_fetcher
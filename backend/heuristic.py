@@ -0,0 +1,143 @@
+"""
+Scoring rules of the heuristic analyzer.
+
+The indicator counts of a piece of content decide its credibility score,
+the kind of summary it gets and the techniques reported. The rules are kept
+free of request and response handling so the same verdict can be produced
+by the analyze fallback (main.generate_enhanced_mock_analysis) and by
+offline bulk scoring (bulk_score.py).
+"""
+
+import hashlib
+
+from chunking import count_words
+from indicators import get_indicator_scanner
+
+
+class HeuristicVerdict:
+    """
+    Score, summary type and techniques for one piece of content.
+
+    Args:
+        content_text (str): The content that was scored
+        indicators (dict): Counts from IndicatorScanner.scan
+    """
+
+    def __init__(self, content_text, indicators):
+        self.indicators = indicators
+        self.content_length = len(content_text)
+        self.word_count = count_words(content_text)
+
+        # Create a consistent hash for content to ensure same content gets same result
+        self.content_hash = int(hashlib.md5(content_text.encode()).hexdigest()[:8], 16)
+
+        factual = indicators['factual']
+        suspicious = indicators['suspicious']
+        conspiracy = indicators['conspiracy']
+        emotional = indicators['emotional']
+        exclamations = indicators['exclamations']
+
+        # Base score calculation using content characteristics
+        base_score = 50
+
+        # Adjust score based on indicators
+        base_score += factual * 8  # Factual language increases score
+        base_score -= suspicious * 12  # Suspicious claims decrease score
+        base_score -= conspiracy * 15  # Conspiracy language heavily decreases score
+        base_score -= emotional * 5  # Emotional manipulation decreases score
+        base_score -= exclamations * 2  # Too many exclamations decrease score
+        base_score -= indicators['caps'] * 3  # All caps words decrease score
+
+        # Content length adjustments
+        if self.content_length < 20:
+            base_score = max(base_score - 20, 10)  # Very short content is harder to verify
+        elif self.content_length < 100:
+            base_score = max(base_score - 10, 15)  # Short content has limitations
+        elif self.content_length > 2000:
+            base_score += 5  # Longer content often more detailed
+
+        # Use hash to add some deterministic variation
+        self.hash_variation = (self.content_hash % 21) - 10  # Random-ish number between -10 and 10
+        base_score += self.hash_variation
+
+        # Ensure score is within bounds
+        self.score = max(10, min(95, base_score))
+        self.credibility_score = max(10, min(95, self.score + self.hash_variation // 2))
+        self.confidence = min(0.95, 0.6 + (factual * 0.05) - (suspicious * 0.08))
+
+        if factual >= 3:
+            self.summary_type = "factual"
+        elif suspicious >= 2 or conspiracy >= 2:
+            self.summary_type = "suspicious"
+        elif emotional >= 3 or exclamations >= 5:
+            self.summary_type = "emotional"
+        elif self.content_length < 50:
+            self.summary_type = "brief"
+        else:
+            self.summary_type = "general"
+
+        self.techniques = self._techniques()
+
+    def _techniques(self):
+        counts = self.indicators
+        if self.summary_type == "factual":
+            techniques = ["Evidence-based Language", "Academic Citations", "Professional Tone"]
+            if counts['suspicious'] > 0:
+                techniques.append("Minor Sensational Elements")
+        elif self.summary_type == "suspicious":
+            techniques = ["Unsubstantiated Claims", "Emotional Manipulation", "Anti-establishment Rhetoric"]
+            if counts['suspicious'] >= 3:
+                techniques.append("Health Misinformation Patterns")
+            if counts['conspiracy'] >= 2:
+                techniques.append("Conspiracy Theory Elements")
+        elif self.summary_type == "emotional":
+            techniques = ["Emotional Manipulation", "Sensational Language", "Potential Bias"]
+            if counts['questions'] >= 3:
+                techniques.append("Leading Questions")
+        elif self.summary_type == "brief":
+            techniques = ["Insufficient Context", "Brevity Limitations"]
+            if counts['suspicious'] > 0:
+                techniques.append("Unverified Claims")
+        else:  # general
+            techniques = ["Mixed Credibility Signals", "Verification Needed"]
+            if counts['emotional'] >= 2:
+                techniques.append("Moderate Emotional Appeal")
+            if counts['suspicious'] + counts['conspiracy'] >= 2:
+                techniques.append("Some Questionable Claims")
+
+        # Add hash-based variation to techniques for same content consistency
+        if self.content_hash % 3 == 0 and self.score < 70:
+            techniques.append("Selective Information Presentation")
+        if self.content_hash % 4 == 0 and counts['emotional'] > 0:
+            techniques.append("Persuasive Language Detected")
+        return techniques
+
+
+def score_content(content_text, indicators=None):
+    """
+    Score one piece of content with the heuristic rules.
+
+    Args:
+        content_text (str): Content to score
+        indicators (dict): Precomputed indicator counts; scanned if omitted
+
+    Returns:
+        HeuristicVerdict: The verdict
+    """
+    if indicators is None:
+        indicators = get_indicator_scanner().scan(content_text)
+    return HeuristicVerdict(content_text, indicators)
+
+
+def score_many(texts):
+    """
+    Score a batch of texts, scanning them for indicators in one pass.
+
+    Args:
+        texts (list): Contents to score
+
+    Returns:
+        list: HeuristicVerdict per text, in order
+    """
+    counts = get_indicator_scanner().scan_many(texts)
+    return [HeuristicVerdict(text, indicators) for text, indicators in zip(texts, counts)]
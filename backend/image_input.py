@@ -0,0 +1,229 @@
+"""
+Decoding and downscaling of submitted images.
+
+The web app sends images as base64 data URLs. Instead of pasting that text
+into the prompt, prepare_image decodes it, checks the real format from the
+file's magic bytes and, when Pillow is installed, shrinks the image to at
+most IMAGE_MAX_DIMENSION pixels on its longer side and re-encodes it as
+JPEG. The result is an ImagePart: a bounded binary part the model receives
+as an image, whose str() is a short digest line used for logs, cache keys
+and the stub model.
+
+JPEG input is decoded at reduced scale (Image.draft), so a large photo
+never exists at full resolution in memory, and at most
+IMAGE_DECODE_CONCURRENCY images are decoded at once.
+
+Without Pillow, images in a format the model accepts are passed through as
+decoded, still bounded by IMAGE_MAX_BYTES.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+# Largest decoded image accepted
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 7 * 1024 * 1024))
+# Larger images are refused before decoding their pixels (decompression bombs)
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 50_000_000))
+# Longer side of the image sent to the model
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 1024))
+IMAGE_JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 85))
+IMAGE_DECODE_CONCURRENCY = int(os.environ.get('IMAGE_DECODE_CONCURRENCY', 2))
+
+# Tokens Gemini charges for one image, whatever its size
+IMAGE_TOKENS = 258
+
+# Formats the model accepts as-is
+MODEL_MIME_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'image/heic', 'image/heif'}
+
+PREPARED = get_registry().counter(
+    'satya_image_inputs_total',
+    'Submitted images by outcome (resized, passthrough, rejected).',
+    ['outcome']
+)
+
+_decode_slots = threading.BoundedSemaphore(max(1, IMAGE_DECODE_CONCURRENCY))
+
+
+class ImageInputError(ValueError):
+    """Raised when submitted image data cannot be used."""
+
+
+class ImageTooLargeError(ImageInputError):
+    """Raised when a submitted image is over the size or pixel limits."""
+
+
+class ImagePart:
+    """
+    A bounded binary image ready to send to the model.
+
+    Args:
+        data (bytes): Encoded image
+        mime_type (str): Its MIME type
+        width (int): Width in pixels, if known
+        height (int): Height in pixels, if known
+        source_bytes (int): Size of the image as submitted
+    """
+
+    token_count = IMAGE_TOKENS
+
+    def __init__(self, data, mime_type, width=None, height=None, source_bytes=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.source_bytes = len(data) if source_bytes is None else source_bytes
+        self.digest = hashlib.sha256(data).hexdigest()
+
+    def __str__(self):
+        size = f" {self.width}x{self.height}" if self.width else ''
+        return f"[{self.mime_type}{size}, {len(self.data)} bytes, sha256 {self.digest}]"
+
+    def __bool__(self):
+        return bool(self.data)
+
+
+def sniff_mime_type(data):
+    """
+    Identify an image format from its leading bytes.
+
+    Returns:
+        str: MIME type, or None if the bytes are not a known image format
+    """
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data.startswith(b'BM'):
+        return 'image/bmp'
+    if data[4:8] == b'ftyp':
+        brand = data[8:12]
+        if brand in (b'heic', b'heix', b'heim', b'heis'):
+            return 'image/heic'
+        if brand in (b'mif1', b'msf1', b'heif'):
+            return 'image/heif'
+    return None
+
+
+def decode_image_data(image_data):
+    """
+    Decode a base64 data URL (or bare base64) into image bytes.
+
+    The decoded size is checked from the encoded length first, so an
+    oversize image is refused without being decoded.
+
+    Returns:
+        tuple: (image bytes, MIME type from the magic bytes)
+
+    Raises:
+        ImageInputError: If the data is not a base64-encoded image
+        ImageTooLargeError: If it decodes to more than IMAGE_MAX_BYTES
+    """
+    if not isinstance(image_data, str):
+        raise ImageInputError("Image data must be a base64 data URL")
+
+    start = 0
+    if image_data.startswith('data:'):
+        # The header is short; never search the payload for the comma
+        comma = image_data.find(',', 0, 256)
+        if comma == -1 or ';base64' not in image_data[:comma]:
+            raise ImageInputError("Image data URLs must be base64-encoded")
+        start = comma + 1
+
+    if (len(image_data) - start) * 3 // 4 > IMAGE_MAX_BYTES:
+        raise ImageTooLargeError(f"Image exceeds the {IMAGE_MAX_BYTES // (1024 * 1024)} MB limit")
+
+    try:
+        data = base64.b64decode(image_data[start:] if start else image_data)
+    except (binascii.Error, ValueError):
+        raise ImageInputError("Image data is not valid base64")
+
+    mime_type = sniff_mime_type(data)
+    if mime_type is None:
+        raise ImageInputError("Image data is not a supported image format")
+    return data, mime_type
+
+
+def downscale_image(data, mime_type):
+    """
+    Fit an image within IMAGE_MAX_DIMENSION and re-encode it as JPEG.
+
+    Images already small enough and in a model format are kept as they are.
+    Without Pillow every image in a model format is kept as it is.
+
+    Returns:
+        ImagePart: The image to send
+
+    Raises:
+        ImageInputError: If the image cannot be decoded or its format is unsupported
+        ImageTooLargeError: If it has more than IMAGE_MAX_PIXELS pixels
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        if mime_type not in MODEL_MIME_TYPES:
+            raise ImageInputError(f"Unsupported image format: {mime_type}")
+        PREPARED.inc(outcome='passthrough')
+        return ImagePart(data, mime_type)
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            if width * height > IMAGE_MAX_PIXELS:
+                raise ImageTooLargeError(f"Image is too large ({width}x{height} pixels)")
+            if max(width, height) <= IMAGE_MAX_DIMENSION and mime_type in MODEL_MIME_TYPES:
+                PREPARED.inc(outcome='passthrough')
+                return ImagePart(data, mime_type, width, height)
+
+            # Let the JPEG decoder scale down by up to 8x while decoding
+            image.draft('RGB', (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            resized = ImageOps.exif_transpose(image)
+            resized.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            if resized.mode not in ('RGB', 'L'):
+                resized = resized.convert('RGB')
+            output = io.BytesIO()
+            resized.save(output, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+    except ImageInputError:
+        raise
+    except (Image.DecompressionBombError, OSError, ValueError) as decode_error:
+        raise ImageInputError(f"Image could not be decoded: {str(decode_error)}")
+
+    PREPARED.inc(outcome='resized')
+    return ImagePart(output.getvalue(), 'image/jpeg', resized.width, resized.height, len(data))
+
+
+def prepare_image(image_data):
+    """
+    Turn a submitted data URL into a bounded ImagePart for the model.
+
+    Args:
+        image_data (str): Base64 data URL as sent by the web app
+
+    Returns:
+        ImagePart: The decoded, downscaled image
+
+    Raises:
+        ImageInputError: If the image is invalid, unsupported or too large
+    """
+    with _decode_slots:
+        try:
+            data, mime_type = decode_image_data(image_data)
+            part = downscale_image(data, mime_type)
+        except ImageInputError as image_error:
+            PREPARED.inc(outcome='rejected')
+            logger.warning(f"Rejected image input: {str(image_error)}")
+            raise
+    logger.info(f"Prepared image input: {part.source_bytes} bytes submitted, {part}")
+    return part
@@ -0,0 +1,281 @@
+"""
+Single-pass indicator scanner for the heuristic analyzer.
+
+The indicator lexicons live in data/indicators.json (or the file named by
+INDICATOR_LEXICON_PATH) and are compiled once into one regular expression
+over the lowercased text. The pattern opens with the set of characters a
+term can start with, so the regex engine skips ahead with its fast charset
+search, and a guard built as a prefix trie of every term rejects the rest of
+the non-candidates. At the remaining positions one optional lookahead per
+category records which categories match there. Counting keeps each
+category's matches non-overlapping, so the counts are identical to running a
+separate re.findall per category.
+"""
+
+import bisect
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'indicators.json')
+
+# Words of two or more capital letters, matched on the original casing. Same
+# matches as \b[A-Z]{2,}\b, but starting with a character class lets the
+# regex engine skip to candidate positions instead of testing every one
+CAPS_RE = re.compile(r'[A-Z](?<!\w[A-Z])[A-Z]+\b')
+
+# Terms using groups, classes or alternation are kept whole in the trie
+OPAQUE_CHARS = frozenset('([|')
+QUANTIFIER_CHARS = frozenset('?*+{')
+
+
+def load_lexicon(path=None):
+    """
+    Load indicator lexicons from a JSON data file.
+
+    Args:
+        path (str): Path to the lexicon file; defaults to INDICATOR_LEXICON_PATH
+            or the bundled data/indicators.json
+
+    Returns:
+        dict: Mapping of category name to a list of regex term fragments
+
+    Raises:
+        ValueError: If the file does not contain a valid lexicon
+    """
+
+    path = path or os.environ.get('INDICATOR_LEXICON_PATH') or DEFAULT_LEXICON_PATH
+    with open(path, encoding='utf-8') as lexicon_file:
+        document = json.load(lexicon_file)
+
+    categories = document.get('categories') if isinstance(document, dict) else None
+    if not isinstance(categories, dict) or not categories:
+        raise ValueError(f"Lexicon file {path} has no 'categories' mapping")
+    for name, terms in categories.items():
+        if not name.isidentifier() or name in ('caps', 'questions', 'exclamations'):
+            raise ValueError(f"Invalid indicator category name: {name!r}")
+        if not isinstance(terms, list) or not all(isinstance(term, str) and term for term in terms):
+            raise ValueError(f"Indicator category {name!r} must be a list of non-empty strings")
+    return categories
+
+
+def _split_atoms(term):
+    """
+    Split a regex term into atoms (a character or escape plus its quantifier).
+    """
+    if OPAQUE_CHARS.intersection(term):
+        return [f'(?:{term})']
+    atoms = []
+    index = 0
+    while index < len(term):
+        char = term[index]
+        atom_end = index + (2 if char == '\\' else 1)
+        if atom_end < len(term) and term[atom_end] in QUANTIFIER_CHARS:
+            if term[atom_end] == '{':
+                atom_end = term.index('}', atom_end) + 1
+            else:
+                atom_end += 1
+            if atom_end < len(term) and term[atom_end] == '?':
+                atom_end += 1  # Lazy quantifier
+        atoms.append(term[index:atom_end])
+        index = atom_end
+    return atoms
+
+
+def build_trie_pattern(terms):
+    """
+    Build a regex matching any of the terms, factored into a prefix trie.
+
+    The trie matches the same strings as a plain alternation but lets the
+    regex engine reject a position after one character comparison instead
+    of trying every term in turn. Alternative order is not preserved, so it
+    is only used where the match end does not matter.
+
+    Args:
+        terms (list): Regex term fragments
+
+    Returns:
+        str: Regex source for the trie
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for atom in _split_atoms(term):
+            node = node.setdefault(atom, {})
+        node[''] = True
+
+    def emit(node):
+        branches = [atom + emit(child) for atom, child in node.items() if atom != '']
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        body = f"(?:{'|'.join(branches)})"
+        return body + '?' if '' in node else body
+
+    return emit(trie)
+
+
+def _first_word_chars(terms):
+    """
+    Return the sorted first characters of the terms, or None if any term can
+    start with something other than a single literal word character.
+    """
+    first_chars = set()
+    for term in terms:
+        first_atom = _split_atoms(term)[0]
+        if len(first_atom) != 1 or not re.match(r'\w', first_atom):
+            return None
+        first_chars.add(first_atom)
+    return sorted(first_chars)
+
+
+class IndicatorScanner:
+    """
+    Counts every indicator category in a single regex pass.
+    """
+
+    def __init__(self, lexicon):
+        self.categories = list(lexicon)
+
+        all_terms = [term for terms in lexicon.values() for term in terms]
+        # Each probe keeps the lexicon's term order so match ends are unchanged
+        probes = ''.join(
+            f"(?:(?=(?P<{name}>(?:{'|'.join(terms)})\\b)))?" for name, terms in lexicon.items()
+        )
+        candidate = f'(?={build_trie_pattern(all_terms)}\\b){probes}'
+
+        first_chars = _first_word_chars(all_terms)
+        if first_chars:
+            # Consume the first character so the engine can search by charset,
+            # check the word boundary behind it, and run the guard and probes
+            # from the start of the word inside a one-character lookbehind.
+            # No term starts with a non-word character, so consuming it never
+            # skips another candidate.
+            char_class = '[' + ''.join(re.escape(char) for char in first_chars) + ']'
+            self.pattern = re.compile(f'{char_class}(?<!\\w{char_class})(?<={candidate}.)')
+        else:
+            self.pattern = re.compile(f'\\b{candidate}')
+
+    def scan(self, text):
+        """
+        Count indicators in a piece of text.
+
+        Args:
+            text (str): Content to scan (original casing)
+
+        Returns:
+            dict: Count per lexicon category plus 'caps', 'questions' and
+                'exclamations'
+        """
+
+        slots = range(len(self.categories))
+        counts = [0] * len(self.categories)
+        # End of the last counted match per category, to keep matches non-overlapping
+        next_allowed = [0] * len(self.categories)
+
+        for match in self.pattern.finditer(text.lower()):
+            start = match.start()
+            groups = match.groups()
+            for slot in slots:
+                matched = groups[slot]
+                if matched is not None and start >= next_allowed[slot]:
+                    counts[slot] += 1
+                    next_allowed[slot] = start + len(matched)
+
+        result = dict(zip(self.categories, counts))
+        # Capitalization is lost in the lowercased text, so all-caps words get
+        # their own scan; single-character counts use str.count (a C memchr loop)
+        result['caps'] = len(CAPS_RE.findall(text))
+        result['questions'] = text.count('?')
+        result['exclamations'] = text.count('!')
+        return result
+
+    def scan_many(self, texts):
+        """
+        Count indicators in a batch of texts with one regex pass.
+
+        The texts are joined with newlines, which no lexicon term spans, and
+        scanned once; each match is attributed to its text by position. This
+        saves the per-call setup of scan() that dominates on short posts. A
+        text with a match running past its end (possible only with custom
+        lexicons matching newlines) is rescanned on its own, so the counts
+        are always identical to scan().
+
+        Args:
+            texts (list): Contents to scan (original casing)
+
+        Returns:
+            list: One scan() result per text, in order
+        """
+
+        if not texts:
+            return []
+        slots = range(len(self.categories))
+        lowered = [text.lower() for text in texts]
+        # Offset just past each text's separator, i.e. where the next text starts
+        bounds = list(itertools.accumulate(len(text) + 1 for text in lowered))
+        counts = [[0] * len(self.categories) for _ in texts]
+        next_allowed = [0] * len(self.categories)
+        crossing = set()
+
+        item = 0
+        for match in self.pattern.finditer('\n'.join(lowered)):
+            start = match.start()
+            if start >= bounds[item]:
+                item = bisect.bisect_right(bounds, start, item)
+            item_counts = counts[item]
+            groups = match.groups()
+            for slot in slots:
+                matched = groups[slot]
+                if matched is not None and start >= next_allowed[slot]:
+                    item_counts[slot] += 1
+                    next_allowed[slot] = start + len(matched)
+                    if next_allowed[slot] >= bounds[item]:
+                        crossing.add(item)
+
+        caps = [0] * len(texts)
+        item = 0
+        original_bounds = list(itertools.accumulate(len(text) + 1 for text in texts))
+        for match in CAPS_RE.finditer('\n'.join(texts)):
+            start = match.start()
+            if start >= original_bounds[item]:
+                item = bisect.bisect_right(original_bounds, start, item)
+            caps[item] += 1
+
+        results = []
+        for index, text in enumerate(texts):
+            if index in crossing:
+                results.append(self.scan(text))
+                continue
+            result = dict(zip(self.categories, counts[index]))
+            result['caps'] = caps[index]
+            result['questions'] = text.count('?')
+            result['exclamations'] = text.count('!')
+            results.append(result)
+        return results
+
+
+_scanner = None
+_scanner_lock = threading.Lock()
+
+
+def get_indicator_scanner():
+    """
+    Return the process-wide scanner, compiling the lexicon on first use.
+
+    Returns:
+        IndicatorScanner: The shared scanner
+    """
+    global _scanner
+    if _scanner is None:
+        with _scanner_lock:
+            if _scanner is None:
+                _scanner = IndicatorScanner(load_lexicon())
+                logger.info(f"Indicator scanner compiled for categories: {', '.join(_scanner.categories)}")
+    return _scanner
@@ -0,0 +1,696 @@
+"""
+Durable job queue for asynchronous analyses.
+
+Instead of holding a connection open through a slow fetch and model call, a
+client can submit an item as a job, get its ID back at once, and poll for
+the verdict (or name a callback URL to receive it). Jobs live in a local
+SQLite file (JOB_QUEUE_PATH), so they survive a process restart, and several
+worker processes on one host can share the file.
+
+A pool of JOB_WORKERS threads claims jobs in priority order. Claiming a job
+leases it for JOB_VISIBILITY_TIMEOUT seconds; a job whose worker crashed or
+hung is claimed again once its lease runs out, up to JOB_MAX_ATTEMPTS
+times. A worker only records the outcome of a job it still holds the lease
+on, so a slow worker never overwrites the result of the one that took over.
+Failures worth retrying go back to the queue with exponential back-off.
+A job that cannot run yet - its submitter is over its rate, or admission
+control has no model slot for it - is deferred: it goes back to the queue
+for JOB_DEFER_SECONDS without using up an attempt, so the queue absorbs
+load instead of answering jobs with heuristic stand-ins.
+
+Submitting an item identical to a pending job, or to one that finished
+within JOB_RESULT_TTL, returns that job instead of queueing another.
+
+Callbacks only go to hosts named in JOB_CALLBACK_ALLOWED_HOSTS or, when
+that is unset, to hosts that resolve to public addresses only, so a
+callback URL cannot make the server post results to itself, its network
+or a cloud metadata endpoint. The URL is checked when the job is
+submitted and again before each delivery, and redirects are not
+followed. Deliveries run on a few threads of their own, so a slow or dead
+callback endpoint never holds a worker back from the queue.
+"""
+
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from queue import Full, Queue
+from urllib.parse import urlsplit
+
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'satya-jobs.sqlite3'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+# Lease on a claimed job; must outlast a fetch plus REQUEST_DEADLINE_SECONDS
+JOB_VISIBILITY_TIMEOUT = float(os.environ.get('JOB_VISIBILITY_TIMEOUT', 120))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', 5))
+# Wait before a deferred job is tried again (one token of the anonymous rate)
+JOB_DEFER_SECONDS = float(os.environ.get('JOB_DEFER_SECONDS', 2))
+# How long finished jobs (and their results) can be polled
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 24 * 3600))
+# Submissions are refused once this many jobs are queued or running
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 10000))
+# Idle workers check for jobs submitted by other processes this often
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1))
+JOB_CALLBACK_TIMEOUT = float(os.environ.get('JOB_CALLBACK_TIMEOUT', 5))
+JOB_CALLBACK_ATTEMPTS = int(os.environ.get('JOB_CALLBACK_ATTEMPTS', 3))
+JOB_CALLBACK_WORKERS = int(os.environ.get('JOB_CALLBACK_WORKERS', 2))
+# Callbacks waiting for delivery; beyond this, new ones are dropped
+JOB_CALLBACK_MAX_PENDING = int(os.environ.get('JOB_CALLBACK_MAX_PENDING', 1000))
+# Hosts callbacks may go to, whatever they resolve to; any public host when unset
+JOB_CALLBACK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.environ.get('JOB_CALLBACK_ALLOWED_HOSTS', '').split(',') if host.strip()
+}
+
+PRUNE_INTERVAL_SECONDS = 60
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+JOB_EVENTS = get_registry().counter(
+    'satya_jobs_total',
+    'Job queue events (submitted, deduplicated, succeeded, failed, retried, deferred, recovered after a lost lease, stale results dropped).',
+    ['event']
+)
+CALLBACKS = get_registry().counter(
+    'satya_job_callbacks_total',
+    'Job completion callbacks by outcome (delivered, failed, rejected by the address check, dropped while backlogged).',
+    ['outcome']
+)
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at JOB_MAX_PENDING."""
+
+
+class JobFailedError(Exception):
+    """
+    Raised by a job handler with the error to report for the job.
+
+    Args:
+        message (str): Error shown to the client
+        retryable (bool): Whether another attempt may succeed
+    """
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class JobDeferredError(Exception):
+    """
+    Raised by a job handler when the job cannot run now but should later.
+
+    Args:
+        message (str): Why the job was deferred
+        delay (float): Seconds before it is tried again
+    """
+
+    def __init__(self, message, delay=JOB_DEFER_SECONDS):
+        super().__init__(message)
+        self.delay = delay
+
+
+class Job:
+    """
+    A job claimed by a worker.
+    """
+
+    def __init__(self, job_id, content_type, content_data, callback_url, priority, client_key, user_id, attempts,
+                 lease_token):
+        self.id = job_id
+        self.content_type = content_type
+        self.content_data = content_data
+        self.callback_url = callback_url
+        self.priority = priority
+        self.client_key = client_key
+        self.user_id = user_id
+        self.attempts = attempts
+        self.lease_token = lease_token
+
+    def __repr__(self):
+        return f"Job({self.id!r}, {self.content_type!r}, attempt {self.attempts})"
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue with leases, retries and result retention.
+
+    Args:
+        path (str): SQLite file holding the jobs
+        visibility_timeout (float): Seconds a claimed job stays leased
+        max_attempts (int): Claims before a job is failed
+        retry_base_seconds (float): Back-off before the first retry
+        result_ttl (float): Seconds finished jobs are kept
+        max_pending (int): Queued and running jobs accepted at once
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, visibility_timeout=JOB_VISIBILITY_TIMEOUT, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_base_seconds=JOB_RETRY_BASE_SECONDS, result_ttl=JOB_RESULT_TTL, max_pending=JOB_MAX_PENDING):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # Autocommit mode, so claims can take the write lock with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, dedupe_key TEXT NOT NULL, '
+            'content_type TEXT NOT NULL, content_data TEXT NOT NULL, callback_url TEXT, '
+            'priority TEXT NOT NULL, priority_rank INTEGER NOT NULL, client_key TEXT NOT NULL, '
+            'status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+            # When a queued job may run, or when a running job's lease expires
+            'available_at REAL NOT NULL, lease_token TEXT, '
+            'result TEXT, error TEXT, '
+            'created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL)'
+        )
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'user_id' not in columns:
+            # Queue files created before jobs recorded their submitter's user
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN user_id TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key)')
+
+    def submit(self, dedupe_key, content_type, content_data, callback_url=None, priority='anonymous',
+               priority_rank=2, client_key='', user_id=None):
+        """
+        Queue a job, or return the matching pending or recently finished one.
+
+        Args:
+            dedupe_key (str): Identity of the submission
+            content_type (str): Type of content (text, url, image)
+            content_data (str): The submitted content or URL
+            callback_url (str): URL to POST the outcome to, if any
+            priority (str): Admission priority class of the submitter
+            priority_rank (int): Its rank; lower ranks are claimed first
+            client_key (str): The submitter's admission rate-limit key
+            user_id (str): The submitter's user, for their verdict history
+
+        Returns:
+            tuple: (job ID, status, whether an existing job was returned)
+
+        Raises:
+            JobQueueFullError: If JOB_MAX_PENDING jobs are already waiting
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                existing = self._conn.execute(
+                    'SELECT id, status FROM jobs WHERE dedupe_key = ? AND status != ? '
+                    'AND (expires_at IS NULL OR expires_at > ?) ORDER BY created_at DESC LIMIT 1',
+                    (dedupe_key, FAILED, now)
+                ).fetchone()
+                if existing is not None:
+                    self._conn.execute('COMMIT')
+                    JOB_EVENTS.inc(event='deduplicated')
+                    return existing[0], existing[1], True
+
+                pending = self._conn.execute(
+                    'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)
+                ).fetchone()[0]
+                if pending >= self.max_pending:
+                    self._conn.execute('COMMIT')
+                    raise JobQueueFullError(f"The job queue is full ({pending} jobs pending)")
+
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    'INSERT INTO jobs (id, dedupe_key, content_type, content_data, callback_url, priority, '
+                    'priority_rank, client_key, user_id, status, available_at, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, dedupe_key, content_type, content_data, callback_url, priority,
+                     priority_rank, client_key, user_id, QUEUED, now, now, now)
+                )
+                self._conn.execute('COMMIT')
+            except sqlite3.Error:
+                self._conn.execute('ROLLBACK')
+                raise
+        JOB_EVENTS.inc(event='submitted')
+        return job_id, QUEUED, False
+
+    def claim(self):
+        """
+        Lease the next job that is ready to run.
+
+        Running jobs whose lease has expired count as ready: their worker
+        died or hung. Those already claimed max_attempts times are failed
+        instead.
+
+        Returns:
+            Job: The claimed job, or None if none is ready
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    row = self._conn.execute(
+                        'SELECT id, content_type, content_data, callback_url, priority, client_key, user_id, attempts, status '
+                        'FROM jobs WHERE status IN (?, ?) AND available_at <= ? '
+                        'ORDER BY priority_rank, available_at LIMIT 1',
+                        (QUEUED, RUNNING, now)
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute('COMMIT')
+                        return None
+                    job_id, content_type, content_data, callback_url, priority, client_key, user_id, attempts, status = row
+                    if status == RUNNING and attempts >= self.max_attempts:
+                        self._finish(job_id, None, FAILED, None,
+                                     f'The analysis did not complete after {attempts} attempts.', now)
+                        self._conn.execute('COMMIT')
+                        JOB_EVENTS.inc(event='failed')
+                        logger.warning(f"Job {job_id} failed after {attempts} lost leases")
+                        continue
+                    lease_token = uuid.uuid4().hex
+                    self._conn.execute(
+                        'UPDATE jobs SET status = ?, attempts = attempts + 1, available_at = ?, '
+                        'lease_token = ?, updated_at = ? WHERE id = ?',
+                        (RUNNING, now + self.visibility_timeout, lease_token, now, job_id)
+                    )
+                    self._conn.execute('COMMIT')
+                except sqlite3.Error:
+                    self._conn.execute('ROLLBACK')
+                    raise
+            if status == RUNNING:
+                JOB_EVENTS.inc(event='recovered')
+                logger.warning(f"Reclaimed job {job_id} after its lease expired")
+            return Job(job_id, content_type, content_data, callback_url, priority, client_key, user_id, attempts + 1,
+                       lease_token)
+
+    def _finish(self, job_id, lease_token, status, result, error, now):
+        """
+        Record a final outcome; call inside a transaction.
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        if lease_token is None:
+            condition, params = '', (job_id,)
+        else:
+            condition, params = ' AND lease_token = ?', (job_id, lease_token)
+        cursor = self._conn.execute(
+            # The content is no longer needed once the job is done
+            'UPDATE jobs SET status = ?, result = ?, error = ?, content_data = ?, lease_token = NULL, '
+            'updated_at = ?, expires_at = ? WHERE id = ?' + condition,
+            (status, result, error, '', now, now + self.result_ttl) + params
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, job, result):
+        """
+        Store a job's result.
+
+        Args:
+            job (Job): The claimed job
+            result (dict): The analysis result
+
+        Returns:
+            bool: False if the job's lease was lost and the result discarded
+        """
+        payload = json.dumps(result, separators=(',', ':'))
+        with self._lock:
+            stored = self._finish(job.id, job.lease_token, SUCCEEDED, payload, None, time.time())
+        JOB_EVENTS.inc(event='succeeded' if stored else 'stale')
+        return stored
+
+    def fail(self, job, error, retryable=False):
+        """
+        Record a failed attempt, re-queueing the job with back-off if allowed.
+
+        Args:
+            job (Job): The claimed job
+            error (str): Error shown to the client if the job fails for good
+            retryable (bool): Whether another attempt may succeed
+
+        Returns:
+            str: The job's new status, or None if its lease was lost
+        """
+        now = time.time()
+        with self._lock:
+            if retryable and job.attempts < self.max_attempts:
+                delay = self.retry_base_seconds * (2 ** (job.attempts - 1))
+                cursor = self._conn.execute(
+                    'UPDATE jobs SET status = ?, available_at = ?, error = ?, lease_token = NULL, updated_at = ? '
+                    'WHERE id = ? AND lease_token = ?',
+                    (QUEUED, now + delay, error, now, job.id, job.lease_token)
+                )
+                status = QUEUED if cursor.rowcount else None
+            else:
+                status = FAILED if self._finish(job.id, job.lease_token, FAILED, None, error, now) else None
+        JOB_EVENTS.inc(event={QUEUED: 'retried', FAILED: 'failed', None: 'stale'}[status])
+        return status
+
+    def defer(self, job, delay):
+        """
+        Put a claimed job back in the queue without counting the attempt.
+
+        Args:
+            job (Job): The claimed job
+            delay (float): Seconds before it may be claimed again
+
+        Returns:
+            bool: False if the job's lease was lost
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts - 1, available_at = ?, lease_token = NULL, '
+                'updated_at = ? WHERE id = ? AND lease_token = ?',
+                (QUEUED, now + delay, now, job.id, job.lease_token)
+            )
+            deferred = cursor.rowcount > 0
+        JOB_EVENTS.inc(event='deferred' if deferred else 'stale')
+        return deferred
+
+    def get(self, job_id):
+        """
+        Current state of a job as returned to clients.
+
+        Returns:
+            dict: Job ID, status, attempts, timestamps and, once finished, the
+            result or error; None if the job is unknown or has expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, attempts, result, error, created_at, updated_at, expires_at FROM jobs WHERE id = ?',
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, attempts, result, error, created_at, updated_at, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        job = {
+            'jobId': job_id,
+            'status': status,
+            'attempts': attempts,
+            'createdAt': created_at,
+            'updatedAt': updated_at
+        }
+        if status == SUCCEEDED:
+            job['result'] = json.loads(result)
+        elif status == FAILED:
+            job['error'] = error
+        return job
+
+    def prune(self):
+        """
+        Delete finished jobs past their retention.
+
+        Returns:
+            int: Number of jobs removed
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND expires_at <= ?', (SUCCEEDED, FAILED, time.time())
+            )
+            return cursor.rowcount
+
+    def counts(self):
+        """
+        Number of jobs per status.
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        counts.update(rows)
+        return counts
+
+
+def check_callback_url(callback_url):
+    """
+    Refuse callback URLs that would reach the server's own network.
+
+    Args:
+        callback_url (str): The URL to check
+
+    Raises:
+        ValueError: With the reason the URL is refused
+    """
+    parts = urlsplit(callback_url)
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in ('http', 'https') or not host:
+        raise ValueError("'callbackUrl' must be an http:// or https:// URL.")
+    if JOB_CALLBACK_ALLOWED_HOSTS:
+        if host not in JOB_CALLBACK_ALLOWED_HOSTS:
+            raise ValueError("'callbackUrl' host is not allowed.")
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (ValueError, OSError):
+        raise ValueError("'callbackUrl' host cannot be resolved.")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if getattr(address, 'ipv4_mapped', None):
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise ValueError("'callbackUrl' must resolve to a public address.")
+
+
+def deliver_callback(callback_url, payload):
+    """
+    POST a finished job's state to its callback URL, retrying a few times.
+
+    Delivery is best effort: a callback that still fails is logged, and the
+    outcome stays available by polling.
+
+    Returns:
+        bool: Whether the callback was accepted with a 2xx response
+    """
+    # Imported here so loading the queue does not pull requests into every cold start
+    import requests
+
+    for attempt in range(JOB_CALLBACK_ATTEMPTS):
+        try:
+            # The host may resolve differently than when the job was submitted
+            check_callback_url(callback_url)
+        except ValueError as url_error:
+            logger.warning(f"Refused callback for job {payload['jobId']}: {str(url_error)}")
+            CALLBACKS.inc(outcome='rejected')
+            return False
+        try:
+            response = requests.post(
+                callback_url, json=payload, timeout=JOB_CALLBACK_TIMEOUT, allow_redirects=False
+            )
+            if 200 <= response.status_code < 300:
+                CALLBACKS.inc(outcome='delivered')
+                return True
+            logger.warning(f"Callback for job {payload['jobId']} returned HTTP {response.status_code}")
+        except requests.RequestException as callback_error:
+            logger.warning(f"Callback for job {payload['jobId']} failed: {str(callback_error)}")
+        if attempt + 1 < JOB_CALLBACK_ATTEMPTS:
+            time.sleep(2 ** attempt)
+    CALLBACKS.inc(outcome='failed')
+    return False
+
+
+class JobWorkerPool:
+    """
+    Threads that claim jobs and run them through a handler.
+
+    Args:
+        queue (JobQueue): Queue to work from
+        handler (callable): Called with each Job; returns its result dict
+            or raises JobFailedError
+        workers (int): Number of worker threads
+        poll_seconds (float): Idle wait between checks for new jobs
+        callback_workers (int): Number of threads delivering callbacks
+    """
+
+    def __init__(self, queue, handler, workers=JOB_WORKERS, poll_seconds=JOB_POLL_SECONDS,
+                 callback_workers=JOB_CALLBACK_WORKERS):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_seconds = poll_seconds
+        self.callback_workers = max(1, callback_workers)
+        self._wakeups = threading.Semaphore(0)
+        self._stopping = threading.Event()
+        self._threads = []
+        self._callbacks = Queue(maxsize=JOB_CALLBACK_MAX_PENDING)
+        self._pruned_at = 0.0
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        # Not joined on stop: a pending callback must not hold up shutdown
+        for number in range(self.callback_workers):
+            threading.Thread(target=self._deliver_callbacks, name=f'job-callback-{number}', daemon=True).start()
+        logger.info(f"Started {self.workers} job workers on {self.queue.path}")
+
+    def notify(self):
+        """
+        Wake an idle worker for a job just submitted in this process.
+        """
+        self._wakeups.release()
+
+    def stop(self, timeout=None):
+        """
+        Stop the workers once their current jobs are done.
+        """
+        self._stopping.set()
+        for _ in self._threads:
+            self._wakeups.release()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as db_error:
+                logger.error(f"Failed to claim a job: {str(db_error)}")
+                job = None
+            if job is None:
+                self._maybe_prune()
+                self._wakeups.acquire(timeout=self.poll_seconds)
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        logger.info(f"Running job {job.id} - Type: {job.content_type}, attempt {job.attempts}")
+        try:
+            result = self.handler(job)
+        except JobDeferredError as deferral:
+            logger.info(f"Deferred job {job.id} for {deferral.delay:.1f}s: {str(deferral)}")
+            try:
+                self.queue.defer(job, deferral.delay)
+            except sqlite3.Error as db_error:
+                # The lease will run out and the job will be claimed again
+                logger.error(f"Failed to defer job {job.id}: {str(db_error)}")
+            return
+        except JobFailedError as job_error:
+            self._record_failure(job, str(job_error), job_error.retryable)
+            return
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            self._record_failure(job, 'An internal error occurred during analysis.', True)
+            return
+
+        try:
+            stored = self.queue.complete(job, result)
+        except sqlite3.Error as db_error:
+            # The lease will run out and the job will be retried
+            logger.error(f"Failed to store the result of job {job.id}: {str(db_error)}")
+            return
+        if not stored:
+            logger.warning(f"Discarded the result of job {job.id}: its lease expired and it was reclaimed")
+        elif job.callback_url:
+            self._send_callback(job, {'jobId': job.id, 'status': SUCCEEDED, 'result': result})
+
+    def _record_failure(self, job, error, retryable):
+        try:
+            status = self.queue.fail(job, error, retryable)
+        except sqlite3.Error as db_error:
+            logger.error(f"Failed to record the failure of job {job.id}: {str(db_error)}")
+            return
+        if status == FAILED and job.callback_url:
+            self._send_callback(job, {'jobId': job.id, 'status': FAILED, 'error': error})
+
+    def _send_callback(self, job, payload):
+        try:
+            self._callbacks.put_nowait((job.callback_url, payload))
+        except Full:
+            logger.warning(f"Dropped the callback for job {job.id}: {JOB_CALLBACK_MAX_PENDING} callbacks are pending")
+            CALLBACKS.inc(outcome='dropped')
+
+    def _deliver_callbacks(self):
+        while True:
+            callback_url, payload = self._callbacks.get()
+            try:
+                deliver_callback(callback_url, payload)
+            except Exception as e:
+                logger.error(f"Callback for job {payload['jobId']} failed: {str(e)}")
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if now - self._pruned_at < PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = now
+        try:
+            removed = self.queue.prune()
+        except sqlite3.Error as db_error:
+            logger.warning(f"Failed to prune finished jobs: {str(db_error)}")
+            return
+        if removed:
+            logger.info(f"Pruned {removed} finished jobs")
+
+
+_queue = None
+_workers = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    Return the process-wide job queue, opening JOB_QUEUE_PATH on first use.
+
+    Raises:
+        sqlite3.Error: If the queue file cannot be opened
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+def start_job_workers(handler):
+    """
+    Start the process-wide worker pool if it is not running yet.
+
+    Args:
+        handler (callable): Runs one Job; see JobWorkerPool
+
+    Returns:
+        JobWorkerPool: The running pool, or None when JOB_WORKERS is 0 (this
+        process only queues jobs for others to run)
+    """
+    global _workers
+    if JOB_WORKERS <= 0:
+        return None
+    if _workers is None:
+        queue = get_job_queue()
+        with _queue_lock:
+            if _workers is None:
+                _workers = JobWorkerPool(queue, handler)
+                _workers.start()
+    return _workers
+
+
+def collect_job_metrics():
+    """
+    Metrics collector exposing the number of jobs per status.
+
+    Returns:
+        list: (name, kind, documentation, samples) tuples for metrics.MetricsRegistry
+    """
+    if _queue is None:
+        return []
+    try:
+        counts = _queue.counts()
+    except sqlite3.Error:
+        return []
+    return [
+        ('satya_jobs', 'gauge', 'Jobs in the queue file by status.',
+         [({'status': status}, count) for status, count in sorted(counts.items())])
+    ]
@@ -1,25 +1,148 @@
 import functions_framework
+import contextvars
 import json
 import logging
-from flask import jsonify
-import vertexai
-from vertexai.generative_models import GenerativeModel
-import requests
-from bs4 import BeautifulSoup
+import os
+import sqlite3
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response, jsonify
+from admission import INTERNAL, AdmissionShedError, Client, bind_client, charge_request, classify_client, collect_admission_metrics, current_client, get_admission_controller
+from chunking import count_words, estimate_tokens, merge_analyses, plan_chunks
+from extractor import extract_text, preload_extractor
+from fetch_scheduler import collect_scheduler_metrics
+from fetcher import get_fetcher
+from heuristic import score_content
+from image_input import ImageInputError, ImagePart, ImageTooLargeError, prepare_image
+from indicators import get_indicator_scanner
+from job_queue import JobDeferredError, JobFailedError, JobQueueFullError, check_callback_url, collect_job_metrics, get_job_queue, start_job_workers
+from metrics import EXPOSITION_MIMETYPE, get_registry
+from model_provider import create_provider, provider_model_name
+from near_duplicate import collect_near_duplicate_metrics, find_near_duplicate, get_near_duplicate_index, index_near_duplicate
+from request_limits import MAX_BATCH_REQUEST_BYTES, PayloadTooLargeError, content_preview, read_json_body
+from resilience import CircuitOpenError, DeadlineExceededError, fallback_reason, get_model_caller, record_fallback, remaining_budget
+from serialization import JSON_MIMETYPE, render_json
+from singleflight import SingleFlight
+from streaming import SummaryStreamDecoder, format_event, stream_mimetype
+from structured_output import RESPONSE_SCHEMA, ModelOutputError, health_score, parse_analysis
+from tracing import stage, start_trace, timing_metadata
+from triage import collect_triage_metrics, triage_content
+from verdict_cache import collect_cache_metrics, content_digest, get_verdict_cache, make_cache_key
+from verdict_store import HISTORY_PAGE_SIZE, collect_store_metrics, get_verdict_store, record_verdict, url_domain
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Vertex AI
-try:
-    vertexai.init(project="satya-hackathon-project", location="us-central1")
-    # Instantiate the Gemini model
-    model = GenerativeModel("gemini-1.5-flash")
-    logger.info("Vertex AI initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Vertex AI: {str(e)}")
-    model = None
+# Model and prompt identity - part of every verdict cache key, so bump
+# PROMPT_VERSION whenever the analysis prompt changes
+MODEL_NAME = "gemini-1.5-flash"
+PROMPT_VERSION = "2026-10-v2"
+
+# Fixed analyst instructions, built once and without the source indentation
+ANALYST_INSTRUCTIONS = textwrap.dedent("""
+    You are an expert misinformation analyst. Your task is to analyze the following user-submitted content for signs of misinformation, manipulation, and logical fallacies.
+
+    You MUST return your analysis ONLY as a structured JSON object with the following schema and nothing else:
+    {
+      "summary": "A one-sentence summary of your findings.",
+      "credibility": {
+        "score": A numerical score from 1 (very untrustworthy) to 10 (very trustworthy),
+        "details": "A brief explanation for the score."
+      },
+      "techniques": ["A list of detected manipulation techniques or logical fallacies, e.g., 'Fear Mongering', 'Ad Hominem'"],
+      "imageAnalysis": "If an image is submitted, provide a brief analysis. Otherwise, state 'No image submitted.'"
+    }
+""").strip()
+
+# How the instructions reach the model: 'system' registers them once as the
+# model's system instruction, 'cached' additionally stores them as a Vertex
+# cached context, 'inline' sends them at the head of every prompt
+PROMPT_MODE = os.environ.get('PROMPT_MODE', 'system').lower()
+
+# Ask the backend for JSON constrained to RESPONSE_SCHEMA instead of free text
+STRUCTURED_OUTPUT = os.environ.get('STRUCTURED_OUTPUT', '1') != '0'
+
+# The model backend (Vertex AI unless MODEL_PROVIDER says otherwise) is
+# created on first use by get_model(), so cold starts that only serve
+# preflights, rejected requests or cache hits never import the Vertex SDK
+model = None
+_model_initialized = False
+_model_lock = threading.Lock()
+
+# Warm-up at import: 'off' (default, fully lazy), 'background' (start
+# initializing in a thread) or 'eager' (block the import until ready)
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'off').lower()
+
+
+def get_model():
+    """
+    Return the model backend, creating it on first use.
+    
+    Returns:
+        The model provider, or None if it could not be initialized
+    """
+    global model, _model_initialized
+    if model is None and not _model_initialized:
+        with _model_lock:
+            if model is None and not _model_initialized:
+                model = create_provider(
+                    MODEL_NAME,
+                    system_instruction=ANALYST_INSTRUCTIONS if PROMPT_MODE in ('system', 'cached') else None,
+                    prompt_cache=PROMPT_MODE == 'cached',
+                    response_schema=RESPONSE_SCHEMA if STRUCTURED_OUTPUT else None
+                )
+                _model_initialized = True
+    return model
+
+
+def active_model_name():
+    """
+    Name of the model producing verdicts, used in cache keys and responses.
+    
+    Does not initialize the model, so cache lookups stay cheap on a cold start.
+    """
+    return getattr(model, 'name', None) or provider_model_name(MODEL_NAME)
+
+# CORS headers shared by every HTTP entry point so the web app can call them
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, If-None-Match',
+    'Access-Control-Expose-Headers': 'ETag',
+    'Access-Control-Max-Age': '3600'
+}
+
+VALID_CONTENT_TYPES = ['text', 'url', 'image']
+
+# The job and history APIs are also read with GET
+JOB_CORS_HEADERS = {**CORS_HEADERS, 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'}
+CALLBACK_URL_MAX_LENGTH = 2048
+
+# Batch endpoint limits
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 50))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 8))
+
+# Concurrent identical submissions share one fetch and analysis
+COALESCE_ENABLED = os.environ.get('COALESCE_ENABLED', '1') != '0'
+analysis_flights = SingleFlight('analysis')
+
+# Stage and request histograms are registered by tracing; the verdict cache
+# keeps its own counters and is read at scrape time
+get_registry().register_collector(collect_cache_metrics)
+get_registry().register_collector(collect_near_duplicate_metrics)
+get_registry().register_collector(collect_scheduler_metrics)
+get_registry().register_collector(collect_admission_metrics)
+get_registry().register_collector(collect_triage_metrics)
+get_registry().register_collector(collect_job_metrics)
+get_registry().register_collector(collect_store_metrics)
+
+
+class ContentFetchError(Exception):
+    """Raised when the content behind a submitted URL cannot be retrieved."""
+
 
 @functions_framework.http
 def analyze_content(request):
@@ -33,13 +156,7 @@ def analyze_content(request):
         JSON response with analysis results
     """
     
-    # Set CORS headers to allow requests from web app
-    headers = {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': 'POST, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-        'Access-Control-Max-Age': '3600'
-    }
+    headers = CORS_HEADERS
     
     # Handle preflight OPTIONS request
     if request.method == 'OPTIONS':
@@ -51,61 +168,60 @@ def analyze_content(request):
             'error': 'Method not allowed. Only POST requests are accepted.'
         }), 405, headers
     
+    trace = start_trace('analyze')
+    
     # Wrap entire core logic in a main try...except block
     try:
-        # Parse the incoming JSON request
-        request_json = request.get_json(silent=True)
+        # Parse the incoming JSON request, refusing oversize bodies before reading them
+        with trace.stage('request_parse'):
+            request_json = read_json_body(request)
+            validation_error = validate_analysis_item(request_json) if request_json else None
         
         if not request_json:
             return jsonify({
                 'error': 'Invalid JSON payload'
             }), 400, headers
         
-        # Specific input validation - check if required fields are present
-        content_type = request_json.get('type')
-        content_data = request_json.get('data')
-        
-        if not content_type or not content_data:
+        if validation_error:
             return jsonify({
-                'error': "Invalid request. 'type' and 'data' fields are required."
+                'error': validation_error
             }), 400, headers
         
-        # Validate content_type is one of the accepted values
-        valid_types = ['text', 'url', 'image']
-        if content_type not in valid_types:
-            return jsonify({
-                'error': f"Invalid content type. Must be one of: {', '.join(valid_types)}"
-            }), 400, headers
+        content_type = request_json.get('type')
+        content_data = request_json.get('data')
         
-        # Validate that data is not empty
-        if not str(content_data).strip():
-            return jsonify({
-                'error': "Content data cannot be empty."
-            }), 400, headers
+        # Priority class and rate-limit key for admission control
+        client = classify_client(request.headers, request.remote_addr)
         
         # Log the received data
-        logger.info(f"Received analysis request - Type: {content_type}")
-        logger.info(f"Content data: {content_data[:100]}..." if len(str(content_data)) > 100 else f"Content data: {content_data}")
-        
-        # Process content based on type
-        processed_content = content_data
+        logger.info(f"Received analysis request - Type: {content_type}, Priority: {client.priority}")
+        logger.info(f"Content data: {content_preview(content_type, content_data)}")
         
-        # Handle URL content fetching
-        if content_type == 'url':
-            try:
-                processed_content = fetch_url_content(content_data)
-                logger.info(f"Successfully fetched URL content, length: {len(processed_content)}")
-            except Exception as url_error:
-                logger.error(f"Failed to fetch URL content: {str(url_error)}")
-                return jsonify({
-                    'error': f'Failed to fetch content from URL: {str(url_error)}'
-                }), 400, headers
+        # Opt-in streaming mode: progress events followed by the final verdict
+        stream_type = stream_mimetype(request)
+        if stream_type:
+            return Response(stream_analysis(content_type, content_data, stream_type, trace, client), mimetype=stream_type, headers=headers)
         
-        # Perform AI analysis using processed content
-        analysis_result = perform_ai_analysis(content_type, processed_content)
+        try:
+            with trace, bind_client(client):
+                analysis_result = trace.annotate(analyze_coalesced(content_type, content_data))
+        except ContentFetchError as url_error:
+            return jsonify({
+                'error': f'Failed to fetch content from URL: {str(url_error)}'
+            }), 400, headers
+        except ImageInputError as image_error:
+            return jsonify({
+                'error': str(image_error)
+            }), 413 if isinstance(image_error, ImageTooLargeError) else 400, headers
         
         # Return the AI analysis
-        return jsonify(analysis_result), 200, headers
+        return json_response(request, analysis_result, 200, headers)
+        
+    except PayloadTooLargeError as size_error:
+        logger.warning(f"Rejected request: {str(size_error)}")
+        return jsonify({
+            'error': str(size_error)
+        }), 413, headers
         
     except json.JSONDecodeError as json_error:
         # Specific handling for JSON parsing errors
@@ -132,6 +248,552 @@ def analyze_content(request):
         }), 500, headers
 
 
+@functions_framework.http
+def analyze_batch(request):
+    """
+    HTTP Cloud Function for analyzing several items in one request.
+    
+    Expects a JSON body of the form {"items": [{"type": ..., "data": ...}, ...]}
+    with an optional "concurrency" override (capped at BATCH_CONCURRENCY).
+    Identical items are analyzed once; URL fetches and model calls run
+    concurrently. Results come back in input order, each carrying either a
+    "result" or an "error" so one bad item never fails the whole batch.
+    
+    Admission control charges the caller's rate once per batch, not per
+    item; a batch from a caller over its rate gets heuristic verdicts for
+    all of its items.
+    
+    Args:
+        request (flask.Request): The request object containing JSON data
+        
+    Returns:
+        JSON response with per-item results
+    """
+    
+    headers = CORS_HEADERS
+    
+    if request.method == 'OPTIONS':
+        return ('', 204, headers)
+    
+    if request.method != 'POST':
+        return jsonify({
+            'error': 'Method not allowed. Only POST requests are accepted.'
+        }), 405, headers
+    
+    trace = start_trace('batch')
+    
+    try:
+        with trace.stage('request_parse'):
+            request_json = read_json_body(request, MAX_BATCH_REQUEST_BYTES)
+            items = request_json.get('items') if isinstance(request_json, dict) else None
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'error': "Invalid request. 'items' must be a non-empty list."
+            }), 400, headers
+        
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({
+                'error': f"Too many items. A batch may contain at most {BATCH_MAX_ITEMS} items."
+            }), 400, headers
+        
+        try:
+            concurrency = int(request_json.get('concurrency', BATCH_CONCURRENCY))
+        except (TypeError, ValueError):
+            concurrency = BATCH_CONCURRENCY
+        concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
+        
+        # One token for the whole batch, so its items are not shed piecemeal
+        client = charge_request(classify_client(request.headers, request.remote_addr))
+        logger.info(f"Received batch analysis request - Items: {len(items)}, Concurrency: {concurrency}, Priority: {client.priority}")
+        
+        with trace, bind_client(client):
+            results = run_batch_analysis(items, concurrency)
+        failed = sum(1 for result in results if 'error' in result)
+        
+        return json_response(request, {
+            'results': results,
+            'summary': {
+                'total': len(items),
+                'unique': len({batch_item_key(item) for item in items if not validate_analysis_item(item)}),
+                'succeeded': len(results) - failed,
+                'failed': failed
+            }
+        }, 200, headers)
+        
+    except PayloadTooLargeError as size_error:
+        logger.warning(f"Rejected batch request: {str(size_error)}")
+        return jsonify({
+            'error': str(size_error)
+        }), 413, headers
+        
+    except Exception as e:
+        logger.error(f"Unexpected error processing batch request: {str(e)}")
+        print(f"An error occurred: {e}")
+        return jsonify({
+            'error': 'An internal error occurred during batch analysis.'
+        }), 500, headers
+
+
+@functions_framework.http
+def analysis_jobs(request):
+    """
+    HTTP Cloud Function for the asynchronous job API.
+    
+    POST an analysis item ({"type", "data"} plus an optional "callbackUrl")
+    to queue it; the 202 response carries the job ID as soon as the job is
+    stored. GET /<jobId> (or ?id=<jobId>) returns the job's status and, once
+    it has finished, its result or error. The callback, if any, receives the
+    same finished state as a POST.
+    
+    Jobs are run by a worker pool in the serving process, so deployments
+    need CPU outside of requests (or the long-lived ASGI app).
+    
+    Args:
+        request (flask.Request): The request object
+        
+    Returns:
+        JSON response with the job's state
+    """
+    
+    headers = JOB_CORS_HEADERS
+    
+    if request.method == 'OPTIONS':
+        return ('', 204, headers)
+    
+    if request.method == 'GET':
+        job_id = request.path.strip('/').rpartition('/')[2] or request.args.get('id')
+        payload, status_code = job_status(job_id)
+        return json_response(request, payload, status_code, headers)
+    
+    if request.method != 'POST':
+        return jsonify({
+            'error': 'Method not allowed. Only GET and POST requests are accepted.'
+        }), 405, headers
+    
+    try:
+        request_json = read_json_body(request)
+    except PayloadTooLargeError as size_error:
+        logger.warning(f"Rejected job submission: {str(size_error)}")
+        return jsonify({
+            'error': str(size_error)
+        }), 413, headers
+    
+    client = classify_client(request.headers, request.remote_addr)
+    payload, status_code = submit_analysis_job(request_json, client)
+    return json_response(request, payload, status_code, headers)
+
+
+@functions_framework.http
+def verdict_history(request):
+    """
+    HTTP Cloud Function serving past verdicts from the verdict history.
+    
+    GET with any of contentHash, url, domain, since and until (Unix
+    seconds), limit, and cursor (the nextCursor of the previous page).
+    Signed-in callers see only their own verdicts; internal callers see
+    everyone's, optionally narrowed with user, for trend reports.
+    
+    Args:
+        request (flask.Request): The request object
+        
+    Returns:
+        JSON response with a page of verdicts, newest first
+    """
+    
+    headers = JOB_CORS_HEADERS
+    
+    if request.method == 'OPTIONS':
+        return ('', 204, headers)
+    
+    if request.method != 'GET':
+        return jsonify({
+            'error': 'Method not allowed. Only GET requests are accepted.'
+        }), 405, headers
+    
+    client = classify_client(request.headers, request.remote_addr)
+    payload, status_code = query_verdict_history(request.args, client)
+    return json_response(request, payload, status_code, headers)
+
+
+@functions_framework.http
+def export_metrics(request):
+    """
+    HTTP Cloud Function exposing pipeline metrics for Prometheus to scrape.
+    
+    Args:
+        request (flask.Request): The request object
+        
+    Returns:
+        Metrics in the Prometheus text exposition format
+    """
+    
+    return Response(get_registry().render(), mimetype=EXPOSITION_MIMETYPE)
+
+
+def json_response(request, payload, status_code, headers):
+    """
+    Flask response for a JSON payload, compressed and with an ETag when it applies.
+    
+    Args:
+        request (flask.Request): The request being answered
+        payload: Response payload
+        status_code (int): Response status
+        headers (dict): CORS headers of the endpoint
+        
+    Returns:
+        flask.Response: The response (304 with no body if the client's copy is current)
+    """
+    
+    body, status_code, extra_headers = render_json(payload, status_code, request.headers, request.method)
+    return Response(body, status=status_code, headers={**headers, **extra_headers}, mimetype=JSON_MIMETYPE)
+
+
+def validate_analysis_item(item):
+    """
+    Validate a single {type, data} analysis item.
+    
+    Args:
+        item (dict): The item to validate
+        
+    Returns:
+        str: An error message, or None if the item is valid
+    """
+    
+    if not isinstance(item, dict):
+        return "Invalid request. 'type' and 'data' fields are required."
+    
+    # Specific input validation - check if required fields are present
+    content_type = item.get('type')
+    content_data = item.get('data')
+    
+    if not content_type or not content_data:
+        return "Invalid request. 'type' and 'data' fields are required."
+    
+    # Validate content_type is one of the accepted values
+    if content_type not in VALID_CONTENT_TYPES:
+        return f"Invalid content type. Must be one of: {', '.join(VALID_CONTENT_TYPES)}"
+    
+    # Validate that data is not empty (without copying a large payload)
+    if str(content_data).isspace():
+        return "Content data cannot be empty."
+    
+    return None
+
+
+def fetch_and_analyze(content_type, content_data):
+    """
+    Run the full pipeline for one item: fetch URL content if needed, then analyze.
+    
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The submitted content or URL
+        
+    Returns:
+        dict: AI analysis results
+        
+    Raises:
+        ContentFetchError: If the content behind a URL cannot be retrieved
+        ImageInputError: If a submitted image is invalid or too large
+    """
+    
+    # Process content based on type
+    processed_content = content_data
+    
+    # Handle URL content fetching
+    if content_type == 'url':
+        try:
+            processed_content = fetch_url_content(content_data)
+            logger.info(f"Successfully fetched URL content, length: {len(processed_content)}")
+        except Exception as url_error:
+            logger.error(f"Failed to fetch URL content: {str(url_error)}")
+            raise ContentFetchError(str(url_error)) from url_error
+    
+    # Decode and downscale images into a binary part for the model
+    elif content_type == 'image':
+        with stage('image_decode'):
+            processed_content = prepare_image(content_data)
+    
+    # Perform AI analysis using processed content, reusing cached verdicts
+    return analyze_with_cache(content_type, processed_content)
+
+
+def analyze_coalesced(content_type, content_data):
+    """
+    Run fetch_and_analyze, sharing one run between concurrent identical requests.
+    
+    Requests are identical when their type and normalized content match, so a
+    URL that many users submit at once is fetched and analyzed only once.
+    Each caller's verdict is appended to the verdict history.
+    
+    Raises:
+        ContentFetchError: If the content behind a URL cannot be retrieved
+    """
+    
+    key = batch_item_key({'type': content_type, 'data': content_data})
+    if COALESCE_ENABLED:
+        led = []
+        
+        def lead():
+            led.append(True)
+            return fetch_and_analyze(content_type, content_data)
+        
+        analysis_result = analysis_flights.do(flight_key(key), lead)
+        if not led and is_shed(analysis_result):
+            # The leader was shed on its own client's account; ours may be admitted
+            analysis_result = fetch_and_analyze(content_type, content_data)
+    else:
+        analysis_result = fetch_and_analyze(content_type, content_data)
+    record_verdict(content_type, content_data, analysis_result, current_client().user, content_hash=key[1])
+    return analysis_result
+
+
+def flight_key(key):
+    """
+    Single-flight key of an analysis: its content key and the caller's admission class.
+    
+    Admission is decided for the leader of a flight, so callers of different
+    classes never share one: an internal caller must not inherit the shed of
+    an anonymous leader, nor an anonymous caller the slot of an internal one.
+    Jobs, which defer instead of being shed, only share flights with jobs.
+    """
+    client = current_client()
+    return key + (client.priority, client.deferrable)
+
+
+def is_shed(analysis_result):
+    """
+    Whether a verdict is the heuristic stand-in for a request admission control shed.
+    """
+    return analysis_result.get('analysisMetadata', {}).get('servedBy') == 'shed'
+
+
+def analyze_batch_item(content_type, content_data):
+    """
+    Run one batch item through the pipeline under its own trace.
+    """
+    with start_trace('batch_item') as trace:
+        return trace.annotate(analyze_coalesced(content_type, content_data))
+
+
+def batch_item_key(item):
+    """
+    Key used to dedupe identical items within a batch.
+    
+    A digest of the normalized content rather than the content itself, so a
+    large submission is not copied to build its key.
+    """
+    return (item.get('type'), content_digest(item.get('data')))
+
+
+def run_batch_analysis(items, concurrency):
+    """
+    Analyze a list of items concurrently, analyzing each distinct item once.
+    
+    Args:
+        items (list): Raw {type, data} items in request order
+        concurrency (int): Maximum number of items processed at once
+        
+    Returns:
+        list: One {"index", "result"} or {"index", "error"} entry per input item
+    """
+    
+    results = [None] * len(items)
+    pending = {}
+    
+    for index, item in enumerate(items):
+        validation_error = validate_analysis_item(item)
+        if validation_error:
+            results[index] = {'index': index, 'error': validation_error}
+            continue
+        pending.setdefault(batch_item_key(item), []).append(index)
+    
+    if not pending:
+        return results
+    
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(pending))) as executor:
+        futures = {}
+        for key, indexes in pending.items():
+            first_item = items[indexes[0]]
+            # Workers run in a copy of this context so admission control sees the caller
+            futures[executor.submit(contextvars.copy_context().run, analyze_batch_item, first_item['type'], first_item['data'])] = indexes
+        
+        for future, indexes in futures.items():
+            try:
+                outcome = {'result': future.result()}
+            except ContentFetchError as url_error:
+                outcome = {'error': f'Failed to fetch content from URL: {str(url_error)}'}
+            except ImageInputError as image_error:
+                outcome = {'error': str(image_error)}
+            except ValueError:
+                outcome = {'error': 'Invalid data format or values provided.'}
+            except Exception as e:
+                logger.error(f"Batch item analysis failed: {str(e)}")
+                outcome = {'error': 'An internal error occurred during analysis.'}
+            for index in indexes:
+                results[index] = dict(outcome, index=index)
+    
+    return results
+
+
+def submit_analysis_job(request_json, client):
+    """
+    Validate an analysis item and queue it as a job.
+    
+    Args:
+        request_json (dict): Parsed request body
+        client (admission.Client): Submitter; the job runs under its priority
+        
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    
+    if not request_json:
+        return {'error': 'Invalid JSON payload'}, 400
+    validation_error = validate_analysis_item(request_json)
+    if validation_error:
+        return {'error': validation_error}, 400
+    
+    callback_url = request_json.get('callbackUrl')
+    if callback_url is not None:
+        if not isinstance(callback_url, str) or len(callback_url) > CALLBACK_URL_MAX_LENGTH:
+            return {'error': "'callbackUrl' must be an http:// or https:// URL."}, 400
+        try:
+            # Results must not be posted to loopback, private or metadata addresses
+            check_callback_url(callback_url)
+        except ValueError as url_error:
+            return {'error': str(url_error)}, 400
+    
+    content_type = request_json.get('type')
+    content_data = request_json.get('data')
+    # The same item from another user or with a different callback is a
+    # separate job, so it reaches that user's history and each callback fires
+    dedupe_key = '\x1f'.join([
+        content_type, content_digest(content_data), PROMPT_VERSION, active_model_name(),
+        client.user or '', callback_url or ''
+    ])
+    
+    try:
+        job_id, status, deduplicated = get_job_queue().submit(
+            dedupe_key, content_type, content_data, callback_url,
+            priority=client.priority, priority_rank=client.rank, client_key=client.key, user_id=client.user
+        )
+        workers = ensure_job_workers()
+    except JobQueueFullError as full_error:
+        logger.warning(f"Rejected job submission: {str(full_error)}")
+        return {'error': 'Too many analyses are queued. Please try again later.'}, 503
+    except sqlite3.Error as db_error:
+        logger.error(f"Job queue unavailable: {str(db_error)}")
+        return {'error': 'The job queue is temporarily unavailable.'}, 503
+    
+    if workers is not None and not deduplicated:
+        workers.notify()
+    logger.info(f"Queued analysis job {job_id} - Type: {content_type}, Priority: {client.priority}, Deduplicated: {deduplicated}")
+    return {'jobId': job_id, 'status': status, 'deduplicated': deduplicated}, 202
+
+
+def job_status(job_id):
+    """
+    Look up a job for a poll request.
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    
+    if not job_id:
+        return {'error': 'A job ID is required.'}, 400
+    try:
+        # A restarted instance resumes the jobs left in its queue file
+        ensure_job_workers()
+        job = get_job_queue().get(job_id)
+    except sqlite3.Error as db_error:
+        logger.error(f"Job queue unavailable: {str(db_error)}")
+        return {'error': 'The job queue is temporarily unavailable.'}, 503
+    if job is None:
+        return {'error': 'Job not found. It may have expired.'}, 404
+    return job, 200
+
+
+def query_verdict_history(args, client):
+    """
+    Run a verdict history query on behalf of a caller.
+    
+    Args:
+        args: Query parameters (flask or starlette, with get)
+        client (admission.Client): The caller
+        
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    
+    if client.user is None:
+        return {'error': 'Sign in to view verdict history.'}, 401
+    store = get_verdict_store()
+    if store is None:
+        return {'error': 'Verdict history is not available.'}, 503
+    
+    user_id = args.get('user') if client.priority == INTERNAL else client.user
+    domain = args.get('domain')
+    try:
+        page = store.query(
+            content_hash=args.get('contentHash'),
+            url=args.get('url'),
+            domain=url_domain(f'http://{domain}') if domain else None,
+            user_id=user_id,
+            since=float(args['since']) if args.get('since') else None,
+            until=float(args['until']) if args.get('until') else None,
+            limit=int(args.get('limit', HISTORY_PAGE_SIZE)),
+            cursor=args.get('cursor')
+        )
+    except ValueError:
+        return {'error': 'Invalid query parameters.'}, 400
+    except sqlite3.Error as db_error:
+        logger.error(f"Verdict history query failed: {str(db_error)}")
+        return {'error': 'Verdict history is temporarily unavailable.'}, 503
+    return page, 200
+
+
+def ensure_job_workers():
+    """
+    Start this process's job workers if they are not running yet.
+    
+    Returns:
+        job_queue.JobWorkerPool: The pool, or None if JOB_WORKERS is 0
+    """
+    return start_job_workers(run_analysis_job)
+
+
+def run_analysis_job(job):
+    """
+    Run one queued item through the analysis pipeline under its submitter's priority.
+    
+    Args:
+        job (job_queue.Job): The claimed job
+        
+    Returns:
+        dict: The analysis result
+        
+    Raises:
+        JobDeferredError: If admission control sheds the analysis
+        JobFailedError: With the error to report if the item cannot be analyzed
+    """
+    
+    client = Client(job.priority, job.client_key, job.user_id, deferrable=True)
+    with start_trace('job') as trace, bind_client(client):
+        try:
+            return trace.annotate(analyze_coalesced(job.content_type, job.content_data))
+        except AdmissionShedError as shed_error:
+            # Over its submitter's rate or out of model slots; the queue holds it until there is room
+            raise JobDeferredError(str(shed_error)) from shed_error
+        except ContentFetchError as url_error:
+            # The site may be back by the next attempt
+            raise JobFailedError(f'Failed to fetch content from URL: {str(url_error)}', retryable=True) from url_error
+        except ImageInputError as image_error:
+            raise JobFailedError(str(image_error)) from image_error
+        except ValueError as value_error:
+            raise JobFailedError('Invalid data format or values provided.') from value_error
+
+
 def fetch_url_content(url):
     """
     Fetch content from a URL and extract text from paragraph tags.
@@ -155,78 +817,18 @@ def fetch_url_content(url):
         if not (url.startswith('http://') or url.startswith('https://')):
             raise ValueError("URL must start with http:// or https://")
         
-        # Set headers to mimic a regular browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Fetch the webpage content with timeout
-        try:
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()  # Raise an exception for bad status codes
-        except requests.exceptions.Timeout:
-            raise Exception("Request timed out - the webpage took too long to respond")
-        except requests.exceptions.ConnectionError:
-            raise Exception("Failed to connect to the URL - check if the URL is accessible")
-        except requests.exceptions.HTTPError as e:
-            raise Exception(f"HTTP error occurred: {e.response.status_code} - {e.response.reason}")
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Request failed: {str(e)}")
+        # Stream the page over the shared keep-alive session; reading stops
+        # at the fetcher's byte budget and wall-clock deadline
+        with stage('fetch'):
+            fetched = get_fetcher().fetch(url)
         
         # Validate response content
-        if not response.content:
+        if not fetched.content:
             raise Exception("Empty response received from the URL")
         
-        try:
-            # Parse the HTML content
-            soup = BeautifulSoup(response.content, 'html.parser')
-        except Exception as parse_error:
-            raise Exception(f"Failed to parse HTML content: {str(parse_error)}")
-        
-        # Extract text from all paragraph tags
-        paragraphs = soup.find_all('p')
-        
-        # If no paragraphs found, try to get text from common content containers
-        if not paragraphs:
-            # Try alternative selectors for content
-            content_selectors = ['article', '.content', '.main', '.post', '.entry']
-            for selector in content_selectors:
-                try:
-                    elements = soup.select(selector)
-                    if elements:
-                        paragraphs = elements[0].find_all('p')
-                        if paragraphs:
-                            break
-                except Exception:
-                    continue  # If selector fails, try the next one
-        
-        # If still no paragraphs, get text from the body
-        if not paragraphs:
-            body = soup.find('body')
-            if body:
-                try:
-                    # Get all text but limit to avoid huge content
-                    text_content = body.get_text(separator=' ', strip=True)
-                    # Limit text length to avoid processing issues
-                    return text_content[:5000] if len(text_content) > 5000 else text_content
-                except Exception:
-                    raise Exception("Failed to extract text from webpage body")
-        
-        # Concatenate text from all paragraphs
-        try:
-            extracted_text = ' '.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
-        except Exception:
-            raise Exception("Failed to extract text from paragraph elements")
-        
-        # Ensure we have some content
-        if not extracted_text.strip():
-            raise Exception("No readable text content found on the webpage")
-        
-        # Limit text length to avoid processing issues (max 5000 characters)
-        if len(extracted_text) > 5000:
-            extracted_text = extracted_text[:5000] + "... (content truncated)"
-        
-        return extracted_text
+        # Extract paragraph text with the configured HTML extraction engine
+        with stage('html_parse'):
+            return extract_text(fetched.content)
         
     except ValueError as ve:
         # Re-raise ValueError for input validation issues
@@ -240,23 +842,325 @@ def fetch_url_content(url):
             raise e
         else:
             raise Exception(f"Failed to fetch and parse webpage content: {str(e)}")
+
+
+def analyze_with_cache(content_type, content_data):
+    """
+    Serve a verdict from the verdict cache, running the AI analysis on a miss.
+    
+    Misses the heuristic can answer confidently are served by triage
+    without a model call.
+    
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The content to analyze (fetched text for URLs)
         
-        # Limit text length to avoid processing issues (max 5000 characters)
-        if len(extracted_text) > 5000:
-            extracted_text = extracted_text[:5000] + "... (content truncated)"
+    Returns:
+        dict: AI analysis results
+    """
+    
+    cache_key, cached_result = lookup_cached_verdict(content_type, content_data)
+    if cached_result is not None:
+        return cached_result
+    
+    with stage('triage'):
+        decision = triage_content(content_type, content_data)
+    if decision is not None and decision.answered:
+        return triaged_analysis(content_type, content_data, decision)
+    
+    started = time.perf_counter()
+    analysis_result = perform_admitted_analysis(content_type, content_data)
+    mark_triage(analysis_result, decision)
+    store_verdict(cache_key, analysis_result, time.perf_counter() - started, content_type, content_data)
+    
+    return analysis_result
+
+
+def triaged_analysis(content_type, content_data, decision):
+    """
+    Heuristic verdict for content triage classified with confidence.
+    
+    Not stored in the verdict cache: rescoring is as cheap as a lookup.
+    """
+    
+    analysis_result = generate_enhanced_mock_analysis(content_type, content_data, verdict=decision.verdict)
+    analysis_result['analysisMetadata']['servedBy'] = 'triage'
+    mark_triage(analysis_result, decision)
+    return analysis_result
+
+
+def mark_triage(analysis_result, decision):
+    """
+    Record the triage decision behind a verdict in its metadata.
+    """
+    
+    if decision is not None:
+        analysis_result['analysisMetadata']['triage'] = decision.metadata()
+
+
+def perform_admitted_analysis(content_type, content_data):
+    """
+    Run perform_ai_analysis once admission control grants a model slot.
+    
+    Requests shed under overload are answered by the heuristic analyzer
+    instead of waiting out their deadline; for deferrable clients (jobs)
+    the AdmissionShedError is raised instead.
+    """
+    
+    controller = get_admission_controller()
+    if controller is None:
+        return perform_ai_analysis(content_type, content_data)
+    try:
+        with stage('admission'):
+            ticket = controller.acquire(current_client())
+    except AdmissionShedError as shed_error:
+        if current_client().deferrable:
+            # A queued job waits for capacity rather than taking a stand-in
+            raise
+        return shed_analysis(content_type, content_data, shed_error)
+    with ticket:
+        return perform_ai_analysis(content_type, content_data)
+
+
+def shed_analysis(content_type, content_data, shed_error):
+    """
+    Heuristic verdict for a request shed by admission control, marked with the reason.
+    """
+    
+    logger.warning(f"{str(shed_error)} - falling back to enhanced mock analysis")
+    record_fallback('shed')
+    analysis_result = generate_enhanced_mock_analysis(content_type, content_data)
+    analysis_result['analysisMetadata']['servedBy'] = 'shed'
+    analysis_result['analysisMetadata']['shed'] = shed_error.reason
+    return analysis_result
+
+
+def lookup_cached_verdict(content_type, content_data):
+    """
+    Look up a verdict in the verdict cache, then among near-duplicates.
+    
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The content to analyze (fetched text for URLs)
         
-        return extracted_text
+    Returns:
+        tuple: (cache key or None if caching is disabled, cached verdict or None)
+    """
+    
+    cache_key = None
+    cache = get_verdict_cache()
+    if cache is not None:
+        with stage('cache_lookup'):
+            cache_key = make_cache_key(content_type, content_data, PROMPT_VERSION, active_model_name())
+            cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            logger.info(f"Verdict cache hit - Type: {content_type}")
+            cached_result['analysisMetadata']['cached'] = True
+            return cache_key, cached_result
+    
+    # Governed by NEAR_DUP_ENABLED alone, whether or not the exact cache is on
+    return cache_key, lookup_near_duplicate(content_type, content_data)
+
+
+def near_duplicate_scope(content_type):
+    """
+    Near-duplicate matches only reuse verdicts of the same type, prompt and model.
+    """
+    return '\x1f'.join([content_type, PROMPT_VERSION, active_model_name()])
+
+
+def lookup_near_duplicate(content_type, content_data):
+    """
+    Find the verdict of a lightly edited earlier submission.
+    
+    Returns:
+        dict: The earlier verdict marked with its similarity, or None
+    """
+    
+    with stage('near_duplicate_lookup'):
+        match = find_near_duplicate(near_duplicate_scope(content_type), content_type, content_data)
+    if match is None:
+        return None
+    
+    payload, similarity = match
+    logger.info(f"Near-duplicate verdict hit - Type: {content_type}, similarity {similarity:.2f}")
+    result = json.loads(payload)
+    result['analysisMetadata']['cached'] = True
+    result['analysisMetadata']['nearDuplicate'] = {'similarity': round(similarity, 3)}
+    return result
+
+
+def store_verdict(cache_key, analysis_result, cost_seconds, content_type=None, content_data=None):
+    """
+    Store a verdict in the verdict cache and, given the content, the near-duplicate index.
+    
+    Only verdicts produced by the model are stored; heuristic fallbacks are
+    skipped so a Vertex outage never pins mock results in the cache.
+    """
+    
+    metadata = analysis_result.get('analysisMetadata', {})
+    if 'aiModel' not in metadata:
+        return
+    cache = get_verdict_cache()
+    if cache is not None and cache_key is not None:
+        cache.set(cache_key, analysis_result, cost_seconds=cost_seconds)
+    
+    if content_type is not None and 'nearDuplicate' not in metadata:
+        payload = json.dumps(analysis_result, separators=(',', ':'))
+        index_near_duplicate(near_duplicate_scope(content_type), content_type, content_data, payload)
+
+
+def stream_analysis(content_type, content_data, mimetype, trace, client=None):
+    """
+    Run the analysis pipeline as a stream of progress events.
+    
+    Emits 'received', then 'fetched' for URLs, 'analyzing', any number of
+    'summary' events carrying summary text as the model generates it, and a
+    final 'result' event holding the same verdict the regular mode returns.
+    Failures are reported as an 'error' event, since the status line has
+    already been sent.
+    
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The submitted content or URL
+        mimetype (str): Streaming format from stream_mimetype
+        trace (tracing.Trace): Trace started by the entry point; it is
+            entered here since the stream outlives the request handler
+        client (admission.Client): Caller as classified by the entry point
         
-    except requests.exceptions.Timeout:
-        raise Exception("Request timed out - the webpage took too long to respond")
-    except requests.exceptions.ConnectionError:
-        raise Exception("Failed to connect to the URL - check if the URL is accessible")
-    except requests.exceptions.HTTPError as e:
-        raise Exception(f"HTTP error occurred: {e.response.status_code} - {e.response.reason}")
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Request failed: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Failed to parse webpage content: {str(e)}")
+    Yields:
+        str: Framed progress events
+    """
+    
+    def result_event(analysis_result):
+        record_verdict(content_type, content_data, analysis_result, current_client().user)
+        return format_event('result', mimetype, result=trace.annotate(analysis_result))
+    
+    ticket = None
+    with trace, bind_client(client):
+        try:
+            yield format_event('received', mimetype, type=content_type)
+            
+            processed_content = content_data
+            if content_type == 'url':
+                try:
+                    processed_content = fetch_url_content(content_data)
+                except Exception as url_error:
+                    logger.error(f"Failed to fetch URL content: {str(url_error)}")
+                    yield format_event('error', mimetype, error=f'Failed to fetch content from URL: {str(url_error)}')
+                    return
+                yield format_event('fetched', mimetype, contentLength=len(processed_content))
+            elif content_type == 'image':
+                try:
+                    with stage('image_decode'):
+                        processed_content = prepare_image(content_data)
+                except ImageInputError as image_error:
+                    yield format_event('error', mimetype, error=str(image_error))
+                    return
+            
+            if not processed_content:
+                yield format_event('error', mimetype, error='Invalid data format or values provided.')
+                return
+            
+            cache_key, cached_result = lookup_cached_verdict(content_type, processed_content)
+            if cached_result is not None:
+                yield result_event(cached_result)
+                return
+            
+            with stage('triage'):
+                decision = triage_content(content_type, processed_content)
+            if decision is not None and decision.answered:
+                analysis_result = triaged_analysis(content_type, processed_content, decision)
+                yield result_event(analysis_result)
+                return
+            
+            yield format_event('analyzing', mimetype)
+            
+            # The model slot is held until the stream ends; under overload the
+            # heuristic answers instead
+            controller = get_admission_controller()
+            if controller is not None:
+                try:
+                    with stage('admission'):
+                        ticket = controller.acquire(current_client())
+                except AdmissionShedError as shed_error:
+                    analysis_result = shed_analysis(content_type, processed_content, shed_error)
+                    mark_triage(analysis_result, decision)
+                    yield result_event(analysis_result)
+                    return
+            
+            analysis_result = None
+            model = get_model()
+            breaker = get_model_caller().breaker
+            if model is None:
+                logger.warning("Vertex AI model not available - falling back to enhanced mock analysis")
+                record_fallback('unavailable')
+            elif not breaker.allow():
+                logger.warning("Circuit breaker is open - falling back to enhanced mock analysis")
+                record_fallback('circuit_open')
+            else:
+                started = time.perf_counter()
+                streamed = False
+                try:
+                    with stage('chunking'):
+                        plan = plan_chunks(content_type, processed_content)
+                    if len(plan.selected) > 1:
+                        # Several chunks are analyzed in parallel and merged, so
+                        # there is no single summary to stream
+                        analysis_result = perform_ai_analysis(content_type, processed_content)
+                        mark_triage(analysis_result, decision)
+                        store_verdict(cache_key, analysis_result, time.perf_counter() - started, content_type, processed_content)
+                        yield result_event(analysis_result)
+                        return
+                    
+                    with stage('prompt_build'):
+                        prompt = build_analysis_prompt(content_type, processed_content)
+                    
+                    decoder = SummaryStreamDecoder()
+                    response_parts = []
+                    # Includes the time the client takes to read each summary event
+                    # Chunks already sent cannot be retried, so streaming only
+                    # honours the deadline and reports to the breaker
+                    with stage('model_call'):
+                        for chunk in model.generate_content(prompt, stream=True):
+                            if remaining_budget() <= 0:
+                                raise DeadlineExceededError("Request deadline exceeded while streaming")
+                            chunk_text = chunk.text
+                            response_parts.append(chunk_text)
+                            summary_text = decoder.feed(chunk_text)
+                            if summary_text:
+                                yield format_event('summary', mimetype, text=summary_text)
+                    breaker.record_success()
+                    streamed = True
+                    
+                    with stage('response_parse'):
+                        ai_analysis = parse_ai_response(content_type, ''.join(response_parts))
+                    with stage('response_shape'):
+                        analysis_result = build_frontend_response(content_type, processed_content, ai_analysis)
+                        analysis_result['analysisMetadata']['prompt'] = prompt_metadata(plan, [prompt], [True])
+                        mark_triage(analysis_result, decision)
+                    store_verdict(cache_key, analysis_result, time.perf_counter() - started, content_type, processed_content)
+                except Exception as ai_error:
+                    logger.error(f"Error in streaming AI analysis: {str(ai_error)}")
+                    print(f"AI analysis error occurred: {ai_error}")
+                    if not streamed:
+                        breaker.record_error(ai_error)
+                    record_fallback('invalid_response' if streamed else 'model_error')
+            
+            if analysis_result is None:
+                # Fall back to mock analysis if AI fails
+                analysis_result = generate_enhanced_mock_analysis(content_type, processed_content)
+                mark_triage(analysis_result, decision)
+            
+            yield result_event(analysis_result)
+            
+        except Exception as e:
+            logger.error(f"Unexpected error in streaming analysis: {str(e)}")
+            print(f"An error occurred: {e}")
+            yield format_event('error', mimetype, error='An internal error occurred during analysis.')
+        finally:
+            if ticket is not None:
+                ticket.release()
 
 
 def perform_ai_analysis(content_type, content_data):
@@ -280,118 +1184,48 @@ def perform_ai_analysis(content_type, content_data):
             raise ValueError(f"Invalid content type: {content_type}")
         
         # Check if model is available
+        model = get_model()
         if model is None:
             logger.warning("Vertex AI model not available - falling back to enhanced mock analysis")
+            record_fallback('unavailable')
             return generate_enhanced_mock_analysis(content_type, content_data)
         
         try:
-            # Create detailed instruction prompt for the AI
-            prompt_instructions = """
-            You are an expert misinformation analyst. Your task is to analyze the following user-submitted content for signs of misinformation, manipulation, and logical fallacies.
-
-            You MUST return your analysis ONLY as a structured JSON object with the following schema and nothing else:
-            {
-              "summary": "A one-sentence summary of your findings.",
-              "credibility": {
-                "score": A numerical score from 1 (very untrustworthy) to 10 (very trustworthy),
-                "details": "A brief explanation for the score."
-              },
-              "techniques": ["A list of detected manipulation techniques or logical fallacies, e.g., 'Fear Mongering', 'Ad Hominem'"],
-              "imageAnalysis": "If an image is submitted, provide a brief analysis. Otherwise, state 'No image submitted.'"
-            }
-            """
+            # Split long content to the token budget; only the selected chunks are sent
+            with stage('chunking'):
+                plan = plan_chunks(content_type, content_data)
             
-            # Prepare user data with context
-            user_data = f"Content Type: {content_type}\nContent: {content_data}"
+            with stage('prompt_build'):
+                prompts = [build_analysis_prompt(content_type, chunk) for chunk in plan.selected_chunks]
             
-            # Call the Gemini model with error handling
+            # Call the Gemini model under the deadline, retry and circuit-breaker policy
             try:
-                response = model.generate_content([prompt_instructions, user_data])
+                with stage('model_call'):
+                    responses = generate_for_prompts(model, prompts)
+            except CircuitOpenError as open_error:
+                # Vertex is failing; answer from the heuristic analyzer right away
+                logger.warning(f"{str(open_error)} - falling back to enhanced mock analysis")
+                record_fallback('circuit_open')
+                return generate_enhanced_mock_analysis(content_type, content_data)
             except Exception as model_error:
                 logger.error(f"Gemini model generation failed: {str(model_error)}")
                 print(f"AI model error occurred: {model_error}")
-                raise Exception("AI analysis service temporarily unavailable")
-            
-            # Validate response
-            if not response or not hasattr(response, 'text'):
-                raise Exception("Invalid response from AI model")
-            
-            # Extract the text content from the response
-            ai_response_text = response.text
-            
-            if not ai_response_text or not ai_response_text.strip():
-                raise Exception("Empty response from AI model")
-            
-            # Parse the JSON response from the AI
-            try:
-                ai_analysis = json.loads(ai_response_text)
-            except json.JSONDecodeError as json_error:
-                # If the AI doesn't return valid JSON, create a fallback response
-                logger.warning(f"AI returned non-JSON response: {str(json_error)}")
-                print(f"JSON parsing error in AI response: {json_error}")
-                ai_analysis = {
-                    "summary": "Analysis completed but response format was unexpected.",
-                    "credibility": {
-                        "score": 5,
-                        "details": "Unable to parse detailed analysis due to response format issue."
-                    },
-                    "techniques": ["Response parsing error"],
-                    "imageAnalysis": "No image submitted." if content_type != 'image' else "Image analysis incomplete due to parsing error."
-                }
-            
-            # Validate AI response structure
-            if not isinstance(ai_analysis, dict):
-                raise ValueError("AI response is not a valid dictionary")
-            
-            # Ensure required fields exist with defaults
-            if 'credibility' not in ai_analysis:
-                ai_analysis['credibility'] = {'score': 5, 'details': 'Analysis incomplete'}
-            if 'summary' not in ai_analysis:
-                ai_analysis['summary'] = 'Analysis completed'
-            if 'techniques' not in ai_analysis:
-                ai_analysis['techniques'] = []
-            
-            # Convert AI response to match frontend expectations
-            frontend_response = {
-                'healthScore': max(10, min(100, ai_analysis.get('credibility', {}).get('score', 5) * 10)),  # Convert 1-10 to 10-100 scale
-                'overallSummary': ai_analysis.get('summary', 'Analysis completed'),
-                'sourceCredibilityScore': max(10, min(100, ai_analysis.get('credibility', {}).get('score', 5) * 10)),
-                'manipulativeTechniques': ai_analysis.get('techniques', []),
-                'analysisMetadata': {
-                    'processingTime': '3.2s',
-                    'confidence': 0.85,
-                    'timestamp': '2025-09-20T10:30:00Z',
-                    'aiModel': 'gemini-1.5-flash'
-                }
-            }
+                raise Exception("AI analysis service temporarily unavailable") from model_error
             
-            # Add content-specific analysis
-            if content_type == 'text':
-                frontend_response['textAnalysis'] = {
-                    'wordCount': len(str(content_data).split()),
-                    'aiSummary': ai_analysis.get('summary', ''),
-                    'credibilityDetails': ai_analysis.get('credibility', {}).get('details', '')
-                }
-            elif content_type == 'url':
-                frontend_response['urlAnalysis'] = {
-                    'aiSummary': ai_analysis.get('summary', ''),
-                    'credibilityDetails': ai_analysis.get('credibility', {}).get('details', ''),
-                    'analysisNote': 'AI-powered URL content analysis'
-                }
-            elif content_type == 'image':
-                frontend_response['imageAnalysis'] = {
-                    'aiAnalysis': ai_analysis.get('imageAnalysis', 'No image analysis available'),
-                    'credibilityDetails': ai_analysis.get('credibility', {}).get('details', ''),
-                    'hasManipulation': len(ai_analysis.get('techniques', [])) > 0,
-                    'confidence': 0.85
-                }
+            # Extract the text content from each response and merge the chunk verdicts
+            with stage('response_parse'):
+                ai_analysis = parse_chunk_responses(content_type, plan, responses)
             
-            return frontend_response
+            with stage('response_shape'):
+                frontend_response = build_frontend_response(content_type, content_data, ai_analysis)
+                frontend_response['analysisMetadata']['prompt'] = prompt_metadata(plan, prompts, responses)
+                return frontend_response
             
         except Exception as ai_error:
             logger.error(f"Error in AI analysis pipeline: {str(ai_error)}")
             print(f"AI analysis error occurred: {ai_error}")
             # Fall back to mock analysis if AI fails
+            record_fallback(fallback_reason(ai_error))
             return generate_enhanced_mock_analysis(content_type, content_data)
         
     except ValueError as ve:
@@ -402,185 +1236,263 @@ def perform_ai_analysis(content_type, content_data):
         logger.error(f"Unexpected error in perform_ai_analysis: {str(e)}")
         print(f"Unexpected error in AI analysis: {e}")
         # Return fallback response for any other errors
+        record_fallback('error')
         return generate_enhanced_mock_analysis(content_type, content_data)
-            ai_analysis = {
-                "summary": "Analysis completed but response format was unexpected.",
-                "credibility": {
-                    "score": 5,
-                    "details": "Unable to parse detailed analysis."
-                },
-                "techniques": ["Response parsing error"],
-                "imageAnalysis": "No image submitted." if content_type != 'image' else "Image analysis incomplete due to parsing error."
-            }
-        
-        # Convert AI response to match frontend expectations
-        frontend_response = {
-            'healthScore': ai_analysis.get('credibility', {}).get('score', 5) * 10,  # Convert 1-10 to 10-100 scale
-            'overallSummary': ai_analysis.get('summary', 'Analysis completed'),
-            'sourceCredibilityScore': ai_analysis.get('credibility', {}).get('score', 5) * 10,
-            'manipulativeTechniques': ai_analysis.get('techniques', []),
-            'analysisMetadata': {
-                'processingTime': '3.2s',
-                'confidence': 0.85,
-                'timestamp': '2025-09-20T10:30:00Z',
-                'aiModel': 'gemini-1.0-pro'
-            }
-        }
-        
-        # Add content-specific analysis
-        if content_type == 'text':
-            frontend_response['textAnalysis'] = {
-                'wordCount': len(str(content_data).split()),
-                'aiSummary': ai_analysis.get('summary', ''),
-                'credibilityDetails': ai_analysis.get('credibility', {}).get('details', '')
-            }
-        elif content_type == 'url':
-            frontend_response['urlAnalysis'] = {
-                'aiSummary': ai_analysis.get('summary', ''),
-                'credibilityDetails': ai_analysis.get('credibility', {}).get('details', ''),
-                'analysisNote': 'AI-powered URL content analysis'
-            }
-        elif content_type == 'image':
-            frontend_response['imageAnalysis'] = {
-                'aiAnalysis': ai_analysis.get('imageAnalysis', 'No image analysis available'),
-                'credibilityDetails': ai_analysis.get('credibility', {}).get('details', ''),
-                'hasManipulation': len(ai_analysis.get('techniques', [])) > 0,
-                'confidence': 0.85
-            }
+
+
+def generate_for_prompts(model, prompts):
+    """
+    Run the model on each chunk prompt, in parallel when there are several.
+    
+    Args:
+        model: The model provider
+        prompts (list): Prompt parts per chunk
         
-        return frontend_response
+    Returns:
+        list: One response per prompt, None where that chunk failed
         
-    except Exception as e:
-        logger.error(f"Error in AI analysis: {str(e)}")
-        # Return fallback response on error
-        return generate_enhanced_mock_analysis(content_type, content_data)
+    Raises:
+        Exception: The first chunk's error if every chunk failed
+    """
+    
+    caller = get_model_caller()
+    if len(prompts) == 1:
+        return [caller.call(model.generate_content, prompts[0])]
+    
+    # Each worker runs in a copy of this context so it shares the request's deadline
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, caller.call, model.generate_content, prompt)
+            for prompt in prompts
+        ]
+        responses = []
+        errors = []
+        for future in futures:
+            try:
+                responses.append(future.result())
+            except Exception as chunk_error:
+                logger.warning(f"Chunk analysis failed: {str(chunk_error)}")
+                responses.append(None)
+                errors.append(chunk_error)
+    
+    if len(errors) == len(prompts):
+        raise errors[0]
+    return responses
 
 
-def generate_enhanced_mock_analysis(content_type, content_data):
+def parse_chunk_responses(content_type, plan, responses):
     """
-    Generate enhanced mock analysis that varies based on content.
+    Parse the model reply for each analyzed chunk and merge them into one analysis.
+    
+    Raises:
+        Exception: If a reply is missing its text
+        ModelOutputError: If no reply holds a usable analysis
+    """
+    
+    analyses = []
+    weights = []
+    output_error = None
+    for chunk, response in zip(plan.selected_chunks, responses):
+        if response is None:
+            continue
+        if not hasattr(response, 'text'):
+            raise Exception("Invalid response from AI model")
+        try:
+            analyses.append(parse_ai_response(content_type, response.text))
+        except ModelOutputError as e:
+            # One unreadable section does not spoil the others
+            logger.warning(f"Dropping chunk with unusable AI response: {str(e)}")
+            output_error = output_error or e
+            continue
+        weights.append(estimate_tokens(chunk))
+    if not analyses:
+        raise output_error or ModelOutputError("No AI response to parse")
+    return merge_analyses(analyses, weights)
+
+
+def prompt_metadata(plan, prompts, responses):
+    """
+    Prompt size, token counts and truncation decisions for analysisMetadata.
+    """
+    
+    metadata = plan.metadata(prompts)
+    if not instructions_registered():
+        metadata['promptMode'] = 'inline'
+    else:
+        metadata['promptMode'] = 'cached' if getattr(model, 'prompt_cached', False) else 'system'
+    failed = [index for index, response in zip(plan.selected, responses) if response is None]
+    if failed:
+        metadata['failedChunks'] = failed
+    return metadata
+
+
+def instructions_registered():
+    """
+    Whether the model already holds ANALYST_INSTRUCTIONS, so prompts can omit them.
+    """
+    return getattr(model, 'system_instruction', None) == ANALYST_INSTRUCTIONS
+
+
+def build_analysis_prompt(content_type, content_data, inline=None):
+    """
+    Build the model input for one analysis.
     
     Args:
         content_type (str): Type of content (text, url, image)
-        content_data (str): The actual content to analyze
+        content_data (str): The actual content to analyze, or an ImagePart
+        inline (bool): Put the instructions in the prompt; by default only
+            when the model does not hold them already
         
     Returns:
-        dict: Enhanced mock analysis results
+        list: Prompt parts for model.generate_content
     """
     
-    import hashlib
-    import re
+    if inline is None:
+        inline = not instructions_registered()
     
-    # Content analysis for variation
-    content_lower = str(content_data).lower()
-    content_length = len(str(content_data))
-    word_count = len(str(content_data).split())
-    
-    # Create a consistent hash for content to ensure same content gets same result
-    content_hash = int(hashlib.md5(content_data.encode()).hexdigest()[:8], 16)
+    # Prepare user data with context; images go as a binary part, not as text
+    if isinstance(content_data, ImagePart):
+        user_data = [f"Content Type: {content_type}\nContent: the attached image", content_data]
+    else:
+        user_data = [f"Content Type: {content_type}\nContent: {content_data}"]
     
-    # Count different types of indicators
-    factual_indicators = len(re.findall(r'\b(research|study|university|professor|peer.reviewed|scientific|evidence|data|statistics|analysis|published|journal|academic|according to|found that)\b', content_lower))
+    return [ANALYST_INSTRUCTIONS] + user_data if inline else user_data
+
+
+def parse_ai_response(content_type, ai_response_text):
+    """
+    Parse the model's JSON reply into a complete, normalized analysis.
     
-    suspicious_indicators = len(re.findall(r'\b(cure|miracle|secret|they.{0,10}want|big.pharma|doctors.hate|breakthrough|amazing|shocking|revealed|exposed|hidden truth)\b', content_lower))
+    Args:
+        content_type (str): Type of content (text, url, image)
+        ai_response_text (str): Raw text returned by the model
+        
+    Returns:
+        dict: Analysis with summary, credibility, techniques and imageAnalysis
+        
+    Raises:
+        ModelOutputError: If the reply holds no JSON object
+    """
     
-    conspiracy_indicators = len(re.findall(r'\b(fake|hoax|conspiracy|cover.up|mainstream.media|deep.state|they.control|wake.up|sheeple|truth|lies|manipulation|agenda)\b', content_lower))
+    ai_analysis, issues = parse_analysis(ai_response_text)
+    if issues:
+        logger.warning(f"AI response did not match the schema, normalized: {', '.join(sorted(issues))}")
+    if content_type == 'image' and 'imageAnalysis' in issues:
+        ai_analysis['imageAnalysis'] = 'No image analysis available'
     
-    emotional_indicators = len(re.findall(r'\b(shocking|amazing|incredible|unbelievable|must.see|you.won.t.believe|mind.blown|urgent|crisis|danger|disaster)\b', content_lower))
+    return ai_analysis
+
+
+def build_frontend_response(content_type, content_data, ai_analysis):
+    """
+    Convert a parsed AI analysis into the shape the frontend expects.
     
-    question_marks = content_data.count('?')
-    exclamation_marks = content_data.count('!')
-    caps_words = len(re.findall(r'\b[A-Z]{2,}\b', content_data))
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The content that was analyzed
+        ai_analysis (dict): Output of parse_ai_response
+        
+    Returns:
+        dict: Frontend analysis response
+    """
     
-    # Base score calculation using content characteristics
-    base_score = 50
+    # The analysis is already validated, so every field is present and typed
+    score = health_score(ai_analysis)
+    credibility_details = ai_analysis['credibility']['details']
+    frontend_response = {
+        'healthScore': score,
+        'overallSummary': ai_analysis['summary'],
+        'sourceCredibilityScore': score,
+        'manipulativeTechniques': ai_analysis['techniques'],
+        'analysisMetadata': {
+            **timing_metadata(),
+            'confidence': 0.85,
+            'aiModel': active_model_name(),
+            'servedBy': 'model'
+        }
+    }
     
-    # Adjust score based on indicators
-    base_score += factual_indicators * 8  # Factual language increases score
-    base_score -= suspicious_indicators * 12  # Suspicious claims decrease score
-    base_score -= conspiracy_indicators * 15  # Conspiracy language heavily decreases score
-    base_score -= emotional_indicators * 5  # Emotional manipulation decreases score
-    base_score -= exclamation_marks * 2  # Too many exclamations decrease score
-    base_score -= caps_words * 3  # All caps words decrease score
+    # Add content-specific analysis
+    if content_type == 'text':
+        frontend_response['textAnalysis'] = {
+            'wordCount': count_words(str(content_data)),
+            'aiSummary': ai_analysis['summary'],
+            'credibilityDetails': credibility_details
+        }
+    elif content_type == 'url':
+        frontend_response['urlAnalysis'] = {
+            'aiSummary': ai_analysis['summary'],
+            'credibilityDetails': credibility_details,
+            'analysisNote': 'AI-powered URL content analysis'
+        }
+    elif content_type == 'image':
+        frontend_response['imageAnalysis'] = {
+            'aiAnalysis': ai_analysis['imageAnalysis'],
+            'credibilityDetails': credibility_details,
+            'hasManipulation': len(ai_analysis['techniques']) > 0,
+            'confidence': 0.85
+        }
     
-    # Content length adjustments
-    if content_length < 20:
-        base_score = max(base_score - 20, 10)  # Very short content is harder to verify
-    elif content_length < 100:
-        base_score = max(base_score - 10, 15)  # Short content has limitations
-    elif content_length > 2000:
-        base_score += 5  # Longer content often more detailed
+    return frontend_response
+
+
+def generate_enhanced_mock_analysis(content_type, content_data, verdict=None):
+    """
+    Generate enhanced mock analysis that varies based on content.
     
-    # Use hash to add some deterministic variation
-    hash_variation = (content_hash % 21) - 10  # Random-ish number between -10 and 10
-    base_score += hash_variation
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The actual content to analyze
+        verdict (heuristic.HeuristicVerdict): Verdict already scored by
+            triage; scored here if omitted
+        
+    Returns:
+        dict: Enhanced mock analysis results
+    """
     
-    # Ensure score is within bounds
-    score = max(10, min(95, base_score))
+    content_text = str(content_data)
     
-    # Generate dynamic summary based on analysis
-    if factual_indicators >= 3:
-        summary_type = "factual"
-    elif suspicious_indicators >= 2 or conspiracy_indicators >= 2:
-        summary_type = "suspicious"
-    elif emotional_indicators >= 3 or exclamation_marks >= 5:
-        summary_type = "emotional"
-    elif content_length < 50:
-        summary_type = "brief"
-    else:
-        summary_type = "general"
+    # Count every indicator category in one pass over the content and score it
+    if verdict is None:
+        with stage('heuristic'):
+            verdict = score_content(content_text)
+    indicators = verdict.indicators
+    factual_indicators = indicators['factual']
+    suspicious_indicators = indicators['suspicious']
+    conspiracy_indicators = indicators['conspiracy']
+    emotional_indicators = indicators['emotional']
+    exclamation_marks = indicators['exclamations']
+    caps_words = indicators['caps']
+    word_count = verdict.word_count
+    score = verdict.score
+    summary_type = verdict.summary_type
     
     # Generate summary based on type and content characteristics
     if summary_type == "factual":
         summary = f"This content demonstrates strong factual indicators with {factual_indicators} academic/research references. The analysis shows evidence-based language patterns and appears to cite credible sources. The tone is measured and professional, suggesting educational or informational intent. Content length of {word_count} words provides adequate detail for verification. Risk indicators are minimal ({suspicious_indicators} suspicious terms, {conspiracy_indicators} conspiracy terms), supporting overall reliability. The language suggests adherence to journalistic or academic standards."
-        techniques = ["Evidence-based Language", "Academic Citations", "Professional Tone"]
-        if suspicious_indicators > 0:
-            techniques.append("Minor Sensational Elements")
         
     elif summary_type == "suspicious":
         summary = f"This content raises significant credibility concerns with {suspicious_indicators} suspicious health/miracle claims and {conspiracy_indicators} conspiracy-related terms. The analysis detects language patterns commonly associated with misinformation, including unsubstantiated promises and anti-establishment rhetoric. The presence of {emotional_indicators} emotional trigger words and {exclamation_marks} exclamation marks suggests persuasive rather than informational intent. Content appears designed to bypass critical thinking through emotional appeal rather than evidence presentation."
-        techniques = ["Unsubstantiated Claims", "Emotional Manipulation", "Anti-establishment Rhetoric"]
-        if suspicious_indicators >= 3:
-            techniques.append("Health Misinformation Patterns")
-        if conspiracy_indicators >= 2:
-            techniques.append("Conspiracy Theory Elements")
-            
+        
     elif summary_type == "emotional":
         summary = f"This content shows high emotional manipulation indicators with {emotional_indicators} sensational terms and {exclamation_marks} exclamation marks. The analysis suggests content designed to provoke strong emotional responses rather than inform. The use of {caps_words} all-caps words and sensational language patterns indicates potential bias or agenda-driven messaging. While not necessarily false, the presentation style raises questions about objectivity and may indicate selective information presentation."
-        techniques = ["Emotional Manipulation", "Sensational Language", "Potential Bias"]
-        if question_marks >= 3:
-            techniques.append("Leading Questions")
         
     elif summary_type == "brief":
         summary = f"This brief content ({word_count} words) provides limited context for comprehensive analysis. While brevity doesn't indicate unreliability, the short format prevents thorough verification of claims and context. The analysis detected {factual_indicators} factual indicators and {suspicious_indicators} potential red flags. Brief content often oversimplifies complex topics and may omit important nuances or caveats necessary for full understanding."
-        techniques = ["Insufficient Context", "Brevity Limitations"]
-        if suspicious_indicators > 0:
-            techniques.append("Unverified Claims")
-            
+        
     else:  # general
         summary = f"This content presents a mixed credibility profile with {factual_indicators} factual indicators and {suspicious_indicators + conspiracy_indicators} potential concern markers. The analysis suggests moderate reliability with some elements requiring verification. Content length ({word_count} words) provides reasonable detail, though the presence of {emotional_indicators} emotional triggers and {exclamation_marks} exclamation marks suggests potential bias. Overall tone appears {('professional' if exclamation_marks <= 2 else 'informal')} with varying degrees of substantiation for claims made."
-        techniques = ["Mixed Credibility Signals", "Verification Needed"]
-        if emotional_indicators >= 2:
-            techniques.append("Moderate Emotional Appeal")
-        if suspicious_indicators + conspiracy_indicators >= 2:
-            techniques.append("Some Questionable Claims")
-    
-    # Add hash-based variation to techniques for same content consistency
-    if content_hash % 3 == 0 and score < 70:
-        techniques.append("Selective Information Presentation")
-    if content_hash % 4 == 0 and emotional_indicators > 0:
-        techniques.append("Persuasive Language Detected")
     
     response = {
         'healthScore': score,
         'overallSummary': summary,
-        'sourceCredibilityScore': max(10, min(95, score + hash_variation // 2)),
-        'manipulativeTechniques': techniques,
+        'sourceCredibilityScore': verdict.credibility_score,
+        'manipulativeTechniques': verdict.techniques,
         'analysisMetadata': {
-            'processingTime': f'{1.5 + (content_hash % 10) / 10:.1f}s',
-            'confidence': min(0.95, 0.6 + (factual_indicators * 0.05) - (suspicious_indicators * 0.08)),
-            'timestamp': '2025-09-20T10:30:00Z',
+            **timing_metadata(),
+            'confidence': verdict.confidence,
             'method': 'Advanced Pattern Analysis',
+            'servedBy': 'fallback',
             'wordCount': word_count,
             'analysisDepth': 'Comprehensive' if word_count > 100 else 'Standard',
             'indicators': {
@@ -612,9 +1524,48 @@ def generate_enhanced_mock_analysis(content_type, content_data):
     return response
 
 
+def warmup():
+    """
+    Initialize heavy dependencies ahead of the first request.
+    
+    Creates the model backend, compiles the indicator lexicon, opens the
+    verdict cache, near-duplicate index and fetch session, and loads the
+    configured HTML parser. Safe to call from several threads and more than
+    once.
+    """
+    
+    started = time.perf_counter()
+    get_model()
+    get_indicator_scanner()
+    get_verdict_cache()
+    get_near_duplicate_index()
+    get_fetcher().session
+    preload_extractor()
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+def start_warmup(mode=None):
+    """
+    Run the warm-up hook according to WARMUP_ON_START.
+    
+    Args:
+        mode (str): 'off', 'background' or 'eager'; defaults to WARMUP_ON_START
+    """
+    
+    mode = mode or WARMUP_ON_START
+    if mode == 'eager':
+        warmup()
+    elif mode == 'background':
+        threading.Thread(target=warmup, name='warmup', daemon=True).start()
+    elif mode != 'off':
+        logger.warning(f"Unknown WARMUP_ON_START '{mode}', skipping warm-up")
+
+
+start_warmup()
+
+
 # For local testing
 if __name__ == '__main__':
-    import os
     from flask import Flask, request
     
     app = Flask(__name__)
@@ -623,6 +1574,27 @@ if __name__ == '__main__':
     def local_analyze():
         return analyze_content(request)
     
+    @app.route('/batch', methods=['POST', 'OPTIONS'])
+    def local_analyze_batch():
+        return analyze_batch(request)
+    
+    @app.route('/jobs', methods=['POST', 'OPTIONS'])
+    def local_submit_job():
+        return analysis_jobs(request)
+    
+    # analysis_jobs reads the job ID from the last path segment
+    @app.route('/jobs/<job_id>', methods=['GET', 'OPTIONS'])
+    def local_get_job(job_id):
+        return analysis_jobs(request)
+    
+    @app.route('/history', methods=['GET', 'OPTIONS'])
+    def local_verdict_history():
+        return verdict_history(request)
+    
+    @app.route('/metrics', methods=['GET'])
+    def local_metrics():
+        return export_metrics(request)
+    
     # Run locally on port 8080
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
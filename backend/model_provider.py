@@ -0,0 +1,337 @@
+"""
+Model backends for the analysis pipeline.
+
+Every provider exposes the slice of the GenerativeModel API the pipeline
+uses: generate_content(contents, stream=False) and
+generate_content_async(contents), returning objects with a .text attribute.
+VertexProvider wraps Gemini on Vertex AI; StubProvider is a local,
+deterministic stand-in with configurable latency, error rate and response
+size for load tests and benchmarks that must not depend on Vertex.
+
+The backend is chosen with MODEL_PROVIDER ('vertex' by default, or 'stub').
+
+Providers accept the fixed analyst instructions once, at construction, as a
+system instruction; callers then send only the per-request content. With
+prompt_cache=True the Vertex provider also stores them as a cached context,
+so requests reference the cache instead of carrying the instructions.
+Given a response_schema, providers return JSON constrained to it.
+
+Prompt parts are strings or binary parts carrying .data and .mime_type
+(image_input.ImagePart); the Vertex provider sends the latter as inline
+image data, and the stub hashes their str() digest line.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+VERTEX_PROJECT = os.environ.get('VERTEX_PROJECT', 'satya-hackathon-project')
+VERTEX_LOCATION = os.environ.get('VERTEX_LOCATION', 'us-central1')
+# Lifetime of a Vertex cached context; it is recreated shortly before expiry
+PROMPT_CACHE_TTL_SECONDS = int(os.environ.get('PROMPT_CACHE_TTL_SECONDS', 3600))
+
+STUB_TECHNIQUES = [
+    'Fear Mongering',
+    'Ad Hominem',
+    'Appeal to Authority',
+    'Cherry Picking',
+    'False Dilemma',
+    'Emotional Manipulation',
+    'Unverified Claims'
+]
+
+
+class ModelProviderError(Exception):
+    """Raised when a model backend fails to produce a response."""
+
+
+class ModelResponse:
+    """
+    Minimal response object carrying the generated text.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+
+class VertexProvider:
+    """
+    Gemini on Vertex AI.
+
+    Args:
+        model_name (str): Vertex model name
+        system_instruction (str): Instructions registered with the model, if any
+        prompt_cache (bool): Store system_instruction as a cached context; falls
+            back to a plain system instruction when the backend refuses it
+            (e.g. below the minimum cacheable size)
+        response_schema (dict): Constrain replies to JSON matching this schema
+    """
+
+    def __init__(self, model_name, system_instruction=None, prompt_cache=False, response_schema=None,
+                 project=VERTEX_PROJECT, location=VERTEX_LOCATION):
+        import vertexai
+        from vertexai.generative_models import GenerationConfig, GenerativeModel
+
+        vertexai.init(project=project, location=location)
+        self.name = model_name
+        self.system_instruction = system_instruction
+        self.response_schema = response_schema
+        self.prompt_cached = False
+        self._generation_config = GenerationConfig(
+            response_mime_type='application/json',
+            response_schema=response_schema
+        ) if response_schema else None
+        self._model = GenerativeModel(
+            model_name,
+            system_instruction=system_instruction,
+            generation_config=self._generation_config
+        )
+        self._cache_lock = threading.Lock()
+        self._cache_expires = None
+        if system_instruction and prompt_cache:
+            try:
+                self._refresh_cached_model()
+            except Exception as e:
+                logger.warning(f"Prompt context cache unavailable, using a system instruction: {str(e)}")
+
+    def _refresh_cached_model(self):
+        from vertexai.preview import caching
+        from vertexai.preview.generative_models import GenerativeModel as PreviewGenerativeModel
+
+        ttl = datetime.timedelta(seconds=PROMPT_CACHE_TTL_SECONDS)
+        cached = caching.CachedContent.create(
+            model_name=self.name,
+            system_instruction=self.system_instruction,
+            ttl=ttl
+        )
+        self._model = PreviewGenerativeModel.from_cached_content(
+            cached_content=cached,
+            generation_config=self._generation_config
+        )
+        # Renew a minute early so no request races the expiry
+        self._cache_expires = time.monotonic() + ttl.total_seconds() - 60
+        self.prompt_cached = True
+        logger.info(f"Registered analyst instructions as cached context {cached.name}")
+
+    def _current_model(self):
+        if self.prompt_cached and time.monotonic() >= self._cache_expires:
+            with self._cache_lock:
+                if time.monotonic() >= self._cache_expires:
+                    try:
+                        self._refresh_cached_model()
+                    except Exception as e:
+                        # Keep the old handle; the backend reports the expiry
+                        # and the caller's retry policy takes over
+                        logger.error(f"Failed to renew prompt context cache: {str(e)}")
+                        self._cache_expires = time.monotonic() + 60
+        return self._model
+
+    @staticmethod
+    def _vertex_contents(contents):
+        if not isinstance(contents, (list, tuple)):
+            return contents
+        from vertexai.generative_models import Part
+
+        return [
+            Part.from_data(data=part.data, mime_type=part.mime_type) if hasattr(part, 'mime_type') else part
+            for part in contents
+        ]
+
+    def generate_content(self, contents, stream=False):
+        return self._current_model().generate_content(self._vertex_contents(contents), stream=stream)
+
+    async def generate_content_async(self, contents):
+        return await self._current_model().generate_content_async(self._vertex_contents(contents))
+
+
+class StubProvider:
+    """
+    Deterministic local model for offline load tests.
+
+    The reply is derived from a hash of the prompt, so the same content always
+    gets the same verdict. Latency and injected failures are drawn from a
+    seeded random generator, so a single-threaded run is reproducible too.
+
+    Args:
+        latency_seconds (float): Mean simulated generation time
+        jitter_seconds (float): Maximum random deviation from the mean
+        error_rate (float): Fraction of calls that raise ModelProviderError
+        response_chars (int): Approximate length of the generated JSON
+        seed (int): Seed for latency and failure draws
+        system_instruction (str): Instructions registered with the model, if any
+        response_schema (dict): When set, replies are bare JSON; otherwise they
+            come in a ```json fence as unconstrained models often send them
+    """
+
+    name = 'stub'
+    prompt_cached = False
+
+    def __init__(self, latency_seconds=0.5, jitter_seconds=0.0, error_rate=0.0, response_chars=400, seed=0,
+                 system_instruction=None, response_schema=None):
+        self.system_instruction = system_instruction
+        self.response_schema = response_schema
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.error_rate = error_rate
+        self.response_chars = response_chars
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        """
+        Return (latency, fail) for one call.
+        """
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_seconds, self.jitter_seconds) if self.jitter_seconds else 0.0
+            fail = self._random.random() < self.error_rate
+        return max(0.0, self.latency_seconds + jitter), fail
+
+    def render(self, contents):
+        """
+        Build the JSON reply for a prompt, following the analysis prompt schema.
+
+        Args:
+            contents: Prompt parts as passed to generate_content
+
+        Returns:
+            str: JSON text
+        """
+        parts = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+        # The verdict depends on the full input, however the instructions arrived
+        if self.system_instruction:
+            parts.insert(0, self.system_instruction)
+        prompt = '\n'.join(str(part) for part in parts)
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        score = 1 + digest[0] % 10
+        techniques = [name for index, name in enumerate(STUB_TECHNIQUES) if digest[1 + index] % 4 == 0]
+        is_image = 'Content Type: image' in prompt
+
+        reply = {
+            'summary': f'Stub analysis {digest[:4].hex()} rated this content {score}/10.',
+            'credibility': {
+                'score': score,
+                'details': 'Deterministic stub verdict.'
+            },
+            'techniques': techniques,
+            'imageAnalysis': 'Stub image analysis.' if is_image else 'No image submitted.'
+        }
+        padding = self.response_chars - len(json.dumps(reply))
+        if padding > 0:
+            filler = ('lorem ipsum ' * (padding // 12 + 1))[:padding]
+            reply['credibility']['details'] += ' ' + filler
+        if self.response_schema is None:
+            return f"```json\n{json.dumps(reply)}\n```"
+        return json.dumps(reply)
+
+    def generate_content(self, contents, stream=False):
+        latency, fail = self._draw()
+        text = self.render(contents)
+        if stream:
+            return self._stream(text, latency, fail)
+        time.sleep(latency)
+        if fail:
+            raise ModelProviderError("Injected stub model failure")
+        return ModelResponse(text)
+
+    def _stream(self, text, latency, fail, chunk_chars=64):
+        chunks = [text[start:start + chunk_chars] for start in range(0, len(text), chunk_chars)]
+        for index, chunk in enumerate(chunks):
+            time.sleep(latency / len(chunks))
+            if fail and index == len(chunks) // 2:
+                raise ModelProviderError("Injected stub model failure")
+            yield ModelResponse(chunk)
+
+    async def generate_content_async(self, contents):
+        latency, fail = self._draw()
+        await asyncio.sleep(latency)
+        if fail:
+            raise ModelProviderError("Injected stub model failure")
+        return ModelResponse(self.render(contents))
+
+
+def create_stub_provider(system_instruction=None, response_schema=None):
+    """
+    Build a StubProvider configured from the environment.
+
+    Args:
+        system_instruction (str): Instructions registered with the model, if any
+        response_schema (dict): Schema replies are constrained to, if any
+
+    Environment:
+        STUB_MODEL_LATENCY_MS: Mean latency (default 500)
+        STUB_MODEL_JITTER_MS: Maximum deviation from the mean (default 0)
+        STUB_MODEL_ERROR_RATE: Fraction of failing calls (default 0)
+        STUB_MODEL_RESPONSE_CHARS: Approximate reply size (default 400)
+        STUB_MODEL_SEED: Random seed (default 0)
+
+    Returns:
+        StubProvider: The configured stub
+    """
+    return StubProvider(
+        latency_seconds=float(os.environ.get('STUB_MODEL_LATENCY_MS', 500)) / 1000,
+        jitter_seconds=float(os.environ.get('STUB_MODEL_JITTER_MS', 0)) / 1000,
+        error_rate=float(os.environ.get('STUB_MODEL_ERROR_RATE', 0)),
+        response_chars=int(os.environ.get('STUB_MODEL_RESPONSE_CHARS', 400)),
+        seed=int(os.environ.get('STUB_MODEL_SEED', 0)),
+        system_instruction=system_instruction,
+        response_schema=response_schema
+    )
+
+
+def provider_model_name(model_name, provider=None):
+    """
+    Name the provider selected by MODEL_PROVIDER will report, without creating it.
+
+    Args:
+        model_name (str): Vertex model used by the 'vertex' provider
+        provider (str): Overrides MODEL_PROVIDER when given
+
+    Returns:
+        str: The model name
+    """
+    provider = (provider or os.environ.get('MODEL_PROVIDER', 'vertex')).lower()
+    return StubProvider.name if provider == 'stub' else model_name
+
+
+def create_provider(model_name, provider=None, system_instruction=None, prompt_cache=False, response_schema=None):
+    """
+    Create the model backend named by MODEL_PROVIDER.
+
+    Args:
+        model_name (str): Vertex model to use for the 'vertex' provider
+        provider (str): Overrides MODEL_PROVIDER when given
+        system_instruction (str): Fixed instructions to register with the model
+        prompt_cache (bool): Ask the backend to cache system_instruction as context
+        response_schema (dict): Constrain replies to JSON matching this schema
+
+    Returns:
+        The provider, or None if it could not be initialized
+    """
+    provider = (provider or os.environ.get('MODEL_PROVIDER', 'vertex')).lower()
+    if provider == 'stub':
+        stub = create_stub_provider(system_instruction, response_schema)
+        logger.info(f"Using stub model provider (latency {stub.latency_seconds * 1000:.0f} ms, error rate {stub.error_rate})")
+        return stub
+    if provider != 'vertex':
+        logger.error(f"Unknown MODEL_PROVIDER {provider!r}")
+        return None
+    try:
+        vertex = VertexProvider(
+            model_name,
+            system_instruction=system_instruction,
+            prompt_cache=prompt_cache,
+            response_schema=response_schema
+        )
+        logger.info("Vertex AI initialized successfully")
+        return vertex
+    except Exception as e:
+        logger.error(f"Failed to initialize Vertex AI: {str(e)}")
+        return None
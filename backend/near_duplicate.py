@@ -0,0 +1,374 @@
+"""
+Near-duplicate index for reusing verdicts on lightly edited content.
+
+Re-posts of the same claim with changed punctuation, an added emoji or
+different casing miss the exact-hash verdict cache. This index keeps a
+MinHash signature of every verdict's content, so a submission whose
+estimated Jaccard similarity to an earlier one reaches the threshold gets
+that verdict back instead of a new model call.
+
+Content is canonicalized (NFKC, lowercased, only letters and digits kept,
+whitespace collapsed) and split into overlapping character shingles. The
+signature is a one-permutation MinHash: each shingle is hashed once and
+binned, the minimum per bin is kept, and empty bins are filled from their
+neighbours (rotation densification). That costs one hash per shingle
+instead of one per shingle and permutation. Signatures are split into LSH
+bands; entries sharing a band with the query are candidates, and the
+candidate with the most matching bins wins if it clears the threshold.
+
+The index is bounded by entry count and payload bytes, evicting the oldest
+entries first, and is optionally persisted to SQLite so it survives
+restarts.
+"""
+
+import array
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUP_ENABLED = os.environ.get('NEAR_DUP_ENABLED', '1') != '0'
+# Minimum estimated Jaccard similarity of the shingle sets for a match
+NEAR_DUP_THRESHOLD = float(os.environ.get('NEAR_DUP_THRESHOLD', 0.9))
+# Short texts flip meaning with a single edit ("is" / "isn't"), so skip them
+NEAR_DUP_MIN_CHARS = int(os.environ.get('NEAR_DUP_MIN_CHARS', 80))
+
+SHINGLE_CHARS = 5
+# Shingles hashed at a time, so long texts never hold all of theirs at once
+SHINGLE_WINDOW = 64 * 1024
+NUM_BINS = 64
+BAND_ROWS = 4
+
+HASH_MASK = (1 << 64) - 1
+# Odd 64-bit constants to spread CRC32 values over the full hash width
+MIX_MULTIPLIER = 0x9E3779B97F4A7C15
+DENSIFY_OFFSET = 0x632BE59BD9B4E019
+EMPTY_BIN = HASH_MASK
+
+NON_ALNUM_RE = re.compile(r'[\W_]+')
+
+LOOKUPS = get_registry().counter(
+    'satya_near_duplicate_lookups_total',
+    'Near-duplicate index lookups by outcome (hit, miss, skipped for short or image content).',
+    ['outcome']
+)
+
+
+def canonicalize(text):
+    """
+    Reduce text to lowercase letters and digits separated by single spaces.
+    """
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    return NON_ALNUM_RE.sub(' ', text).strip()
+
+
+def minhash_signature(text, num_bins=NUM_BINS, shingle_chars=SHINGLE_CHARS):
+    """
+    One-permutation MinHash signature of a text's character shingles.
+
+    Args:
+        text (str): Canonicalized text
+        num_bins (int): Signature length, a power of two
+        shingle_chars (int): Shingle length in characters
+
+    Returns:
+        array.array: num_bins unsigned 64-bit minima, or None for empty text
+    """
+    if not text:
+        return None
+    encoded = text.encode('utf-8')
+    count = max(1, len(encoded) - shingle_chars + 1)
+    bin_mask = num_bins - 1
+    bin_bits = num_bins.bit_length() - 1
+    mins = [EMPTY_BIN] * num_bins
+    # Hash the distinct shingles of each window in C, then keep the per-bin
+    # minima; a shingle repeated across windows just meets its own minimum
+    for window in range(0, count, SHINGLE_WINDOW):
+        starts = range(window, min(count, window + SHINGLE_WINDOW))
+        for shingle_hash in set(map(zlib.crc32, [encoded[start:start + shingle_chars] for start in starts])):
+            value = (shingle_hash * MIX_MULTIPLIER) & HASH_MASK
+            index = value & bin_mask
+            value >>= bin_bits
+            if value < mins[index]:
+                mins[index] = value
+
+    # Rotation densification: an empty bin borrows the next filled bin's
+    # minimum, offset by the distance so borrowed values stay distinguishable
+    filled = [index for index in range(num_bins) if mins[index] != EMPTY_BIN]
+    if len(filled) < num_bins:
+        for index in range(num_bins):
+            if mins[index] == EMPTY_BIN:
+                distance = 1
+                while mins[(index + distance) % num_bins] == EMPTY_BIN:
+                    distance += 1
+                source = mins[(index + distance) % num_bins]
+                mins[index] = (source + distance * DENSIFY_OFFSET) & HASH_MASK | (1 << 63)
+    return array.array('Q', mins)
+
+
+def similarity(first, second):
+    """
+    Estimated Jaccard similarity: the fraction of equal signature bins.
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LSH index of MinHash signatures to stored verdicts.
+
+    Args:
+        threshold (float): Minimum estimated similarity for a match
+        max_entries (int): Entry limit; the oldest entries are evicted first
+        max_bytes (int): Limit on the summed size of stored verdict payloads
+        ttl_seconds (float): Entry lifetime
+        path (str): SQLite file for persistence, or None for memory only
+    """
+
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, max_entries=10000, max_bytes=32 * 1024 * 1024,
+                 ttl_seconds=7 * 24 * 3600, path=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        # entry id -> (scope, signature, payload, expires_at)
+        self._entries = OrderedDict()
+        self._bands = {}
+        self._bytes = 0
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._conn = None
+        self.evictions = 0
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS near_duplicates ('
+            'id INTEGER PRIMARY KEY, scope TEXT NOT NULL, signature BLOB NOT NULL, '
+            'payload TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.execute('DELETE FROM near_duplicates WHERE expires_at <= ?', (time.time(),))
+        self._conn.commit()
+        rows = self._conn.execute(
+            'SELECT id, scope, signature, payload, expires_at FROM near_duplicates ORDER BY id DESC LIMIT ?',
+            (self.max_entries,)
+        ).fetchall()
+        for entry_id, scope, blob, payload, expires_at in reversed(rows):
+            signature = array.array('Q')
+            signature.frombytes(blob)
+            self._insert(entry_id, scope, signature, payload, expires_at)
+        self._next_id = (rows[0][0] + 1) if rows else 1
+        logger.info(f"Near-duplicate index loaded {len(self._entries)} entries from {path}")
+
+    def _band_keys(self, scope, signature):
+        return [
+            (scope, start, tuple(signature[start:start + BAND_ROWS]))
+            for start in range(0, len(signature), BAND_ROWS)
+        ]
+
+    def _insert(self, entry_id, scope, signature, payload, expires_at):
+        self._entries[entry_id] = (scope, signature, payload, expires_at)
+        self._bytes += len(payload)
+        for band_key in self._band_keys(scope, signature):
+            self._bands.setdefault(band_key, set()).add(entry_id)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_id):
+        scope, signature, payload, _ = self._entries.pop(entry_id)
+        self._bytes -= len(payload)
+        for band_key in self._band_keys(scope, signature):
+            bucket = self._bands.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._bands[band_key]
+
+    def find(self, scope, signature):
+        """
+        Find the most similar live entry in a scope.
+
+        Args:
+            scope (str): Partition the match must come from, e.g. content
+                type, prompt version and model
+            signature (array.array): Signature from minhash_signature
+
+        Returns:
+            tuple: (payload, similarity) of the best match at or above the
+                threshold, or None
+        """
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(scope, signature):
+                candidates.update(self._bands.get(band_key, ()))
+            best = None
+            for entry_id in candidates:
+                _, stored, payload, expires_at = self._entries[entry_id]
+                if expires_at <= now:
+                    continue
+                score = similarity(signature, stored)
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (payload, score)
+            return best
+
+    def add(self, scope, signature, payload):
+        """
+        Index a verdict payload under its content signature.
+
+        Args:
+            scope (str): Partition the entry belongs to
+            signature (array.array): Signature from minhash_signature
+            payload (str): Serialized verdict
+        """
+        if len(payload) > self.max_bytes:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._insert(entry_id, scope, signature, payload, expires_at)
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO near_duplicates (id, scope, signature, payload, expires_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (entry_id, scope, signature.tobytes(), payload, expires_at)
+                    )
+                    # Keep the file bounded like the in-memory index
+                    self._conn.execute('DELETE FROM near_duplicates WHERE id <= ?', (entry_id - self.max_entries,))
+                    self._conn.commit()
+                except sqlite3.Error as db_error:
+                    logger.warning(f"Near-duplicate index write failed: {str(db_error)}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """
+    Return the process-wide near-duplicate index configured from the environment.
+
+    Environment:
+        NEAR_DUP_ENABLED: Set to 0 to disable near-duplicate matching (default 1)
+        NEAR_DUP_THRESHOLD: Minimum estimated similarity (default 0.9)
+        NEAR_DUP_MAX_ENTRIES: Entry limit (default 10000)
+        NEAR_DUP_MAX_BYTES: Payload byte limit (default 32 MiB)
+        NEAR_DUP_TTL_SECONDS: Entry lifetime (default 7 days)
+        NEAR_DUP_PATH: SQLite file to persist the index (memory only if unset)
+
+    Returns:
+        NearDuplicateIndex: The index, or None when disabled
+    """
+    global _index
+    if not NEAR_DUP_ENABLED:
+        return None
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            path = os.environ.get('NEAR_DUP_PATH')
+            kwargs = dict(
+                threshold=NEAR_DUP_THRESHOLD,
+                max_entries=int(os.environ.get('NEAR_DUP_MAX_ENTRIES', 10000)),
+                max_bytes=int(os.environ.get('NEAR_DUP_MAX_BYTES', 32 * 1024 * 1024)),
+                ttl_seconds=float(os.environ.get('NEAR_DUP_TTL_SECONDS', 7 * 24 * 3600))
+            )
+            try:
+                _index = NearDuplicateIndex(path=path, **kwargs)
+            except sqlite3.Error as db_error:
+                logger.error(f"Failed to open near-duplicate index at {path}: {str(db_error)}")
+                _index = NearDuplicateIndex(**kwargs)
+    return _index
+
+
+def content_signature(content_type, content_data):
+    """
+    Signature for near-duplicate matching, or None when the content is not eligible.
+
+    Images and texts shorter than NEAR_DUP_MIN_CHARS (after canonicalization)
+    are not matched.
+    """
+    if content_type == 'image':
+        return None
+    text = canonicalize(content_data)
+    if len(text) < NEAR_DUP_MIN_CHARS:
+        return None
+    return minhash_signature(text)
+
+
+def find_near_duplicate(scope, content_type, content_data):
+    """
+    Look up the closest earlier verdict for a submission, recording the outcome.
+
+    Args:
+        scope (str): Partition to search
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The content to analyze (fetched text for URLs)
+
+    Returns:
+        tuple: (verdict payload, similarity), or None
+    """
+    index = get_near_duplicate_index()
+    if index is None:
+        return None
+    signature = content_signature(content_type, content_data)
+    if signature is None:
+        LOOKUPS.inc(outcome='skipped')
+        return None
+    match = index.find(scope, signature)
+    LOOKUPS.inc(outcome='miss' if match is None else 'hit')
+    return match
+
+
+def index_near_duplicate(scope, content_type, content_data, payload):
+    """
+    Make a verdict available to near-duplicate lookups of its content.
+    """
+    index = get_near_duplicate_index()
+    if index is None:
+        return
+    signature = content_signature(content_type, content_data)
+    if signature is not None:
+        index.add(scope, signature, payload)
+
+
+def collect_near_duplicate_metrics():
+    """
+    Metrics collector exposing the index size.
+
+    Returns:
+        list: (name, kind, documentation, samples) tuples for metrics.MetricsRegistry
+    """
+    index = _index
+    if index is None:
+        return []
+    return [
+        ('satya_near_duplicate_entries', 'gauge', 'Entries in the near-duplicate index.', [({}, len(index))]),
+        ('satya_near_duplicate_bytes', 'gauge', 'Verdict bytes held by the near-duplicate index.',
+         [({}, index.size_bytes)]),
+        ('satya_near_duplicate_evictions_total', 'counter', 'Entries evicted from the near-duplicate index.',
+         [({}, index.evictions)])
+    ]
@@ -0,0 +1,132 @@
+"""
+Bounded reading of request bodies.
+
+Flask's get_json and Starlette's request.json() buffer whatever the client
+sends before anything looks at it. The readers here reject a body whose
+declared Content-Length is over the limit before reading a byte of it, and
+read bodies without one (chunked uploads) in READ_CHUNK_BYTES pieces,
+stopping as soon as the limit is crossed. Only a body within the limit is
+handed to the JSON parser.
+
+The limits leave room for a data-URL image of IMAGE_MAX_BYTES once base64
+has grown it by a third.
+"""
+
+import json
+import os
+
+from metrics import get_registry
+
+# Largest body accepted by the single-item and batch endpoints
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', 10 * 1024 * 1024))
+MAX_BATCH_REQUEST_BYTES = int(os.environ.get('MAX_BATCH_REQUEST_BYTES', 16 * 1024 * 1024))
+
+READ_CHUNK_BYTES = 64 * 1024
+
+# Characters of submitted content written to the request log
+LOG_PREVIEW_CHARS = 100
+
+REJECTIONS = get_registry().counter(
+    'satya_request_too_large_total',
+    'Requests rejected for an oversize body, by when it was detected (declared Content-Length or while reading).',
+    ['stage']
+)
+
+
+class PayloadTooLargeError(Exception):
+    """Raised when a request body is larger than the endpoint accepts."""
+
+    def __init__(self, limit):
+        super().__init__(f"Request body exceeds the {limit // (1024 * 1024)} MB limit")
+        self.limit = limit
+
+
+def check_declared_length(content_length, limit):
+    """
+    Reject a body by its declared size, before reading it.
+
+    Raises:
+        PayloadTooLargeError: If Content-Length is over the limit
+    """
+    try:
+        declared = int(content_length)
+    except (TypeError, ValueError):
+        # Missing or malformed; the streaming read enforces the limit
+        return
+    if declared > limit:
+        REJECTIONS.inc(stage='declared')
+        raise PayloadTooLargeError(limit)
+
+
+def _parse(body):
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def read_json_body(request, limit=MAX_REQUEST_BYTES):
+    """
+    Read and parse a Flask request's JSON body without exceeding limit bytes.
+
+    Args:
+        request (flask.Request): The request
+        limit (int): Largest body accepted
+
+    Returns:
+        The parsed JSON, or None if the body is empty, not JSON, or not sent
+        as application/json (as get_json(silent=True) would)
+
+    Raises:
+        PayloadTooLargeError: If the body is over the limit
+    """
+    check_declared_length(request.content_length, limit)
+    if not request.is_json:
+        return None
+
+    body = bytearray()
+    while True:
+        chunk = request.stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        body += chunk
+        if len(body) > limit:
+            REJECTIONS.inc(stage='read')
+            raise PayloadTooLargeError(limit)
+    return _parse(body)
+
+
+async def read_json_body_async(request, limit=MAX_REQUEST_BYTES):
+    """
+    Async counterpart of read_json_body for a Starlette request.
+
+    Raises:
+        PayloadTooLargeError: If the body is over the limit
+    """
+    check_declared_length(request.headers.get('content-length'), limit)
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            REJECTIONS.inc(stage='read')
+            raise PayloadTooLargeError(limit)
+    return _parse(body)
+
+
+def content_preview(content_type, content_data):
+    """
+    Short, log-safe description of submitted content.
+
+    Only the first LOG_PREVIEW_CHARS characters of text are copied; image
+    data is summarized by its size rather than logged.
+    """
+    if not isinstance(content_data, str):
+        return f"<{type(content_data).__name__}>"
+    if content_type == 'image':
+        return f"<{len(content_data)} characters of image data>"
+    if len(content_data) > LOG_PREVIEW_CHARS:
+        return f"{content_data[:LOG_PREVIEW_CHARS]}... ({len(content_data)} characters)"
+    return content_data
@@ -0,0 +1,415 @@
+"""
+Deadline, retry and circuit-breaker policy for model calls.
+
+Every request has an end-to-end budget (REQUEST_DEADLINE_SECONDS, measured
+from the start of the request's trace). A model call is attempted up to
+MODEL_MAX_ATTEMPTS times; each attempt is bounded by the smaller of
+MODEL_ATTEMPT_TIMEOUT_SECONDS and the budget left, and only errors that look
+transient are retried, after a full-jitter exponential backoff. Retries are
+also capped by a retry budget (a fraction of recent calls), so a Vertex
+brownout does not multiply its own load.
+
+A circuit breaker watches the outcome of every call. After
+BREAKER_FAILURE_THRESHOLD consecutive failures it opens and calls are
+rejected immediately, sending requests straight to the heuristic analyzer.
+After BREAKER_RESET_SECONDS it lets a single probe through (half-open): a
+success closes it again, a failure re-opens it. Only timeouts and transient
+or server-side errors count as failures; an error caused by the request
+itself (an invalid argument, blocked content, a bad image part) says
+nothing about the backend and leaves the breaker as it was.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from metrics import get_registry
+from tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 30))
+MODEL_ATTEMPT_TIMEOUT_SECONDS = float(os.environ.get('MODEL_ATTEMPT_TIMEOUT_SECONDS', 20))
+MODEL_MAX_ATTEMPTS = int(os.environ.get('MODEL_MAX_ATTEMPTS', 3))
+MODEL_RETRY_BASE_SECONDS = float(os.environ.get('MODEL_RETRY_BASE_SECONDS', 0.25))
+MODEL_RETRY_MAX_SECONDS = float(os.environ.get('MODEL_RETRY_MAX_SECONDS', 4))
+# Each call earns this fraction of a retry, up to MODEL_RETRY_BUDGET_MAX saved retries
+MODEL_RETRY_BUDGET_RATIO = float(os.environ.get('MODEL_RETRY_BUDGET_RATIO', 0.2))
+MODEL_RETRY_BUDGET_MAX = float(os.environ.get('MODEL_RETRY_BUDGET_MAX', 10))
+# Threads running sync model calls, so attempts can be abandoned at their timeout
+MODEL_CALL_WORKERS = int(os.environ.get('MODEL_CALL_WORKERS', 32))
+
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', 30))
+
+# Exception class names (google.api_core and builtins) worth retrying,
+# matched by name so the Vertex SDK is not imported here
+RETRYABLE_ERROR_NAMES = frozenset([
+    'ServiceUnavailable',
+    'DeadlineExceeded',
+    'InternalServerError',
+    'TooManyRequests',
+    'ResourceExhausted',
+    'Aborted',
+    'GatewayTimeout',
+    'BadGateway',
+    'RetryError',
+    'ConnectionError',
+    'TimeoutError',
+    'ModelProviderError',
+    'AttemptTimeoutError',
+])
+
+# Server-side errors that are not worth retrying still count against the breaker
+BACKEND_FAILURE_ERROR_NAMES = RETRYABLE_ERROR_NAMES | frozenset(['ServerError'])
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+MODEL_CALLS = get_registry().counter(
+    'satya_model_calls_total', 'Model call attempts by outcome.', ['outcome']
+)
+MODEL_RETRIES = get_registry().counter(
+    'satya_model_retries_total', 'Model call attempts that were retries.'
+)
+FALLBACKS = get_registry().counter(
+    'satya_analysis_fallbacks_total', 'Analyses answered by the heuristic analyzer, by reason.', ['reason']
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker rejects a call."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the request's time budget runs out before the model answers."""
+
+
+class AttemptTimeoutError(Exception):
+    """Raised when a single model call attempt exceeds its timeout."""
+
+
+def remaining_budget():
+    """
+    Seconds left in the current request's deadline.
+
+    Returns:
+        float: Remaining seconds (REQUEST_DEADLINE_SECONDS outside a traced request)
+    """
+    trace = current_trace()
+    if trace is None:
+        return REQUEST_DEADLINE_SECONDS
+    return REQUEST_DEADLINE_SECONDS - trace.elapsed()
+
+
+def is_retryable(error):
+    """
+    Whether an error from a model call looks transient.
+    """
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def is_backend_failure(error):
+    """
+    Whether an error from a model call counts against the circuit breaker.
+    """
+    return any(cls.__name__ in BACKEND_FAILURE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def record_fallback(reason):
+    """
+    Count a request answered by the heuristic analyzer instead of the model.
+    """
+    FALLBACKS.inc(reason=reason)
+
+
+def fallback_reason(error):
+    """
+    Classify why an AI analysis failed, for the fallback metric.
+
+    Args:
+        error (Exception): The error that ended the AI analysis, possibly
+            wrapping the model error as its __cause__
+
+    Returns:
+        str: 'circuit_open', 'deadline', 'timeout', 'model_error' or 'invalid_response'
+    """
+    cause = error.__cause__ or error
+    if isinstance(cause, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(cause, DeadlineExceededError):
+        return 'deadline'
+    if isinstance(cause, AttemptTimeoutError):
+        return 'timeout'
+    if error.__cause__ is not None:
+        return 'model_error'
+    return 'invalid_response'
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a single half-open probe.
+
+    Args:
+        name (str): Breaker name used in logs and metrics
+        failure_threshold (int): Consecutive failures that open the circuit
+        reset_seconds (float): Time the circuit stays open before probing
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_count = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state != self.state:
+            logger.warning(f"Circuit breaker '{self.name}' {self.state} -> {state}")
+            self.state = state
+            if state == OPEN:
+                self.opened_count += 1
+                self._opened_at = time.monotonic()
+
+    def allow(self):
+        """
+        Whether a call may go ahead now.
+
+        Returns:
+            bool: True when closed, or for the single probe once the reset
+                time has passed
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._transition(HALF_OPEN)
+            # A probe that never reported back (e.g. an abandoned stream) is
+            # written off after another reset period
+            if self.state == HALF_OPEN and (not self._probing or time.monotonic() - self._probe_started >= self.reset_seconds):
+                self._probing = True
+                self._probe_started = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._probing = False
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                self._probing = False
+                self._transition(OPEN)
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def record_error(self, error):
+        """
+        Record a failed call: a failure if the backend is to blame, otherwise
+        only the end of a probe, so the next call probes again.
+        """
+        if is_backend_failure(error):
+            self.record_failure()
+            return
+        with self._lock:
+            self._probing = False
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of calls.
+    """
+
+    def __init__(self, ratio=MODEL_RETRY_BUDGET_RATIO, max_tokens=MODEL_RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class ResilientCaller:
+    """
+    Runs model calls under the deadline, retry and circuit-breaker policy.
+
+    Args:
+        breaker (CircuitBreaker): Breaker guarding the backend
+        retry_budget (RetryBudget): Shared retry allowance
+        max_attempts (int): Attempts per call, including the first
+        attempt_timeout (float): Upper bound on a single attempt in seconds
+    """
+
+    def __init__(self, breaker, retry_budget, max_attempts=MODEL_MAX_ATTEMPTS,
+                 attempt_timeout=MODEL_ATTEMPT_TIMEOUT_SECONDS):
+        self.breaker = breaker
+        self.retry_budget = retry_budget
+        self.max_attempts = max(1, max_attempts)
+        self.attempt_timeout = attempt_timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=MODEL_CALL_WORKERS, thread_name_prefix='model-call')
+        return self._executor
+
+    def _start_attempt(self):
+        """
+        Check the breaker and deadline before an attempt.
+
+        Returns:
+            float: Timeout for this attempt in seconds
+        """
+        if not self.breaker.allow():
+            MODEL_CALLS.inc(outcome='rejected')
+            raise CircuitOpenError(f"Circuit breaker '{self.breaker.name}' is open")
+        remaining = remaining_budget()
+        if remaining <= 0:
+            MODEL_CALLS.inc(outcome='deadline')
+            raise DeadlineExceededError("Request deadline exceeded before the model call")
+        return min(self.attempt_timeout, remaining)
+
+    def _succeeded(self):
+        self.breaker.record_success()
+        MODEL_CALLS.inc(outcome='success')
+
+    def _failed(self, error, attempt):
+        """
+        Record a failed attempt and decide whether to retry.
+
+        Returns:
+            float: Backoff delay before the next attempt, or None to give up
+        """
+        self.breaker.record_error(error)
+        MODEL_CALLS.inc(outcome='timeout' if isinstance(error, AttemptTimeoutError) else 'error')
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            return None
+        delay = random.uniform(0, min(MODEL_RETRY_MAX_SECONDS, MODEL_RETRY_BASE_SECONDS * (2 ** attempt)))
+        if delay >= remaining_budget() or not self.retry_budget.try_spend():
+            return None
+        logger.warning(f"Retrying model call in {delay:.2f}s after: {str(error)}")
+        MODEL_RETRIES.inc()
+        return delay
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Call a blocking model function under the policy.
+
+        Raises:
+            CircuitOpenError: If the breaker rejects the call
+            DeadlineExceededError: If the request budget is spent
+            Exception: The last attempt's error when retries are exhausted
+        """
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            timeout = self._start_attempt()
+            future = self.executor.submit(fn, *args, **kwargs)
+            try:
+                result = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                # The attempt keeps its worker thread until the SDK gives up
+                future.cancel()
+                error = AttemptTimeoutError(f"Model call timed out after {timeout:.1f}s")
+            except Exception as e:
+                error = e
+            else:
+                self._succeeded()
+                return result
+            delay = self._failed(error, attempt)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, coroutine_fn, *args, **kwargs):
+        """
+        Await a model coroutine function under the policy.
+
+        Raises:
+            Same as call()
+        """
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            timeout = self._start_attempt()
+            try:
+                result = await asyncio.wait_for(coroutine_fn(*args, **kwargs), timeout)
+            except asyncio.TimeoutError:
+                error = AttemptTimeoutError(f"Model call timed out after {timeout:.1f}s")
+            except Exception as e:
+                error = e
+            else:
+                self._succeeded()
+                return result
+            delay = self._failed(error, attempt)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+_caller = None
+_caller_lock = threading.Lock()
+
+
+def collect_breaker_metrics():
+    """
+    Metrics collector exposing the model circuit breaker.
+    """
+    if _caller is None:
+        return []
+    breaker = _caller.breaker
+    return [
+        ('satya_circuit_breaker_state', 'gauge', 'Circuit breaker state (0 closed, 1 half-open, 2 open).',
+         [({'name': breaker.name}, STATE_VALUES[breaker.state])]),
+        ('satya_circuit_breaker_opened_total', 'counter', 'Times the circuit breaker opened.',
+         [({'name': breaker.name}, breaker.opened_count)]),
+        ('satya_circuit_breaker_consecutive_failures', 'gauge', 'Current run of failed model calls.',
+         [({'name': breaker.name}, breaker.consecutive_failures)])
+    ]
+
+
+def get_model_caller():
+    """
+    Return the process-wide resilient caller for the model backend.
+
+    Returns:
+        ResilientCaller: The shared caller
+    """
+    global _caller
+    if _caller is None:
+        with _caller_lock:
+            if _caller is None:
+                _caller = ResilientCaller(CircuitBreaker('model'), RetryBudget())
+                get_registry().register_collector(collect_breaker_metrics)
+    return _caller
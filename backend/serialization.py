@@ -0,0 +1,186 @@
+"""
+JSON response encoding, compression and revalidation.
+
+Responses are encoded with orjson when it is installed (the standard json
+module otherwise) and compressed when the body is at least
+RESPONSE_COMPRESS_MIN_BYTES and the client accepts it, preferring brotli
+(when the Brotli package is installed) over gzip.
+
+Every successful response carries a strong ETag. For a verdict it is a
+hash of the verdict itself, leaving out what describes the request that
+served it (processingTime, timestamp, stages and the cached flag), so the
+same verdict has the same tag whether it was just produced or came from
+the cache. A GET whose If-None-Match names the current tag - a client
+polling a job or a history page that has not changed - gets a 304 with no
+body. Compressed variants append the coding to the tag, as their bytes
+differ, and any variant's tag revalidates.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+
+from metrics import get_registry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', 1024))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 6))
+RESPONSE_BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', 5))
+
+JSON_MIMETYPE = 'application/json'
+
+# Filled in per request (tracing.Trace.annotate, cache lookups); not part of the verdict
+VOLATILE_METADATA = ('processingTime', 'timestamp', 'stages', 'cached')
+
+RESPONSE_BYTES = get_registry().counter(
+    'satya_response_bytes_total',
+    'JSON response body bytes before (encoded) and after (sent) compression.',
+    ['stage']
+)
+RESPONSES = get_registry().counter(
+    'satya_responses_total',
+    'JSON responses by content coding (identity, gzip, br) or not_modified for 304s.',
+    ['encoding']
+)
+
+
+def encode_json(payload):
+    """
+    Serialize a payload to compact UTF-8 JSON.
+
+    Returns:
+        bytes: The encoded payload
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload)
+        except TypeError:
+            # Types orjson refuses (e.g. integers over 64 bits); the json module copes
+            pass
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def verdict_etag(payload, body):
+    """
+    Strong ETag for a response payload.
+
+    Args:
+        payload: The payload as passed to encode_json
+        body (bytes): Its encoding
+
+    Returns:
+        str: Quoted entity tag
+    """
+    metadata = payload.get('analysisMetadata') if isinstance(payload, dict) else None
+    if isinstance(metadata, dict) and any(key in metadata for key in VOLATILE_METADATA):
+        stable = {key: value for key, value in metadata.items() if key not in VOLATILE_METADATA}
+        body = encode_json({**payload, 'analysisMetadata': stable})
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header names the given tag (in any coding).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag.strip('"')
+    for candidate in if_none_match.split(','):
+        # If-None-Match uses the weak comparison
+        candidate = candidate.strip().removeprefix('W/').strip('"')
+        if candidate.partition('-')[0] == opaque:
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the content coding for a response from an Accept-Encoding header.
+
+    Returns:
+        str: 'br' or 'gzip', or None to send the body as it is
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for entry in accept_encoding.split(','):
+        coding, _, params = entry.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    wildcard = weights.get('*', 0.0)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    for coding in candidates:
+        weight = weights.get(coding, wildcard)
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (coding, weight)
+    return best[0] if best else None
+
+
+def compress(body, encoding):
+    """
+    Compress a body with the negotiated coding.
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+    return body
+
+
+def render_json(payload, status_code, request_headers, method='POST'):
+    """
+    Encode, validate and compress a JSON response.
+
+    Args:
+        payload: Response payload
+        status_code (int): Response status
+        request_headers: Request headers (flask or starlette, case-insensitive get)
+        method (str): Request method; only GET and HEAD are answered with 304
+
+    Returns:
+        tuple: (body bytes, status code, dict of headers to add)
+    """
+    body = encode_json(payload)
+    headers = {}
+    compressible = len(body) >= RESPONSE_COMPRESS_MIN_BYTES
+    if compressible:
+        # Caches must key on Accept-Encoding wherever a compressed variant exists
+        headers['Vary'] = 'Accept-Encoding'
+    etag = None
+    if status_code == 200:
+        etag = verdict_etag(payload, body)
+        headers['ETag'] = etag
+        if method in ('GET', 'HEAD') and etag_matches(request_headers.get('If-None-Match'), etag):
+            RESPONSES.inc(encoding='not_modified')
+            return b'', 304, headers
+
+    RESPONSE_BYTES.inc(len(body), stage='encoded')
+    if compressible:
+        encoding = negotiate_encoding(request_headers.get('Accept-Encoding'))
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+            if etag is not None:
+                headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+    RESPONSE_BYTES.inc(len(body), stage='sent')
+    RESPONSES.inc(encoding=headers.get('Content-Encoding', 'identity'))
+    return body, status_code, headers
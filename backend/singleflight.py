@@ -0,0 +1,126 @@
+"""
+In-flight deduplication (single-flight) of identical concurrent work.
+
+When several callers ask for the same key while a call for it is still
+running, only the first (the leader) runs it; the others wait for the
+leader's outcome and receive the same result or exception. Once the call
+finishes the key is released, so later callers start fresh (by then the
+verdict cache normally answers them).
+
+Every caller gets its own deep copy of the result, since responses are
+annotated per request afterwards.
+"""
+
+import asyncio
+import copy
+import logging
+import threading
+from concurrent.futures import Future
+
+from metrics import get_registry
+from tracing import stage
+
+logger = logging.getLogger(__name__)
+
+CALLS = get_registry().counter(
+    'satya_singleflight_calls_total',
+    'Calls through a single-flight group, by role (leader ran the work, coalesced waited for it).',
+    ['group', 'role']
+)
+
+
+class SingleFlight:
+    """
+    Thread-based single-flight group.
+
+    Args:
+        name (str): Group name used in metrics and logs
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless an identical call is already running.
+
+        Args:
+            key: Hashable identity of the call
+            fn (callable): The work to run
+
+        Returns:
+            A deep copy of fn's result
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            CALLS.inc(group=self.name, role='coalesced')
+            logger.info(f"Coalesced {self.name} request onto an in-flight call")
+            with stage('coalesced_wait'):
+                return copy.deepcopy(future.result())
+
+        CALLS.inc(group=self.name, role='leader')
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return copy.deepcopy(result)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """
+    asyncio single-flight group; use one instance per event loop.
+
+    The shared work runs in its own task, so a caller that is cancelled
+    (e.g. a client disconnect) does not cancel it for the others.
+
+    Args:
+        name (str): Group name used in metrics and logs
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._tasks = {}
+
+    def in_flight(self):
+        return len(self._tasks)
+
+    async def do(self, key, coroutine_fn, *args, **kwargs):
+        """
+        Await coroutine_fn(*args, **kwargs) unless an identical call is already running.
+
+        Args:
+            key: Hashable identity of the call
+            coroutine_fn (callable): Coroutine function doing the work
+
+        Returns:
+            A deep copy of the coroutine's result
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            CALLS.inc(group=self.name, role='leader')
+            task = self._tasks[key] = asyncio.ensure_future(coroutine_fn(*args, **kwargs))
+            task.add_done_callback(lambda done: self._tasks.pop(key, None) if self._tasks.get(key) is done else None)
+            result = await asyncio.shield(task)
+        else:
+            CALLS.inc(group=self.name, role='coalesced')
+            logger.info(f"Coalesced {self.name} request onto an in-flight call")
+            with stage('coalesced_wait'):
+                result = await asyncio.shield(task)
+        return copy.deepcopy(result)
@@ -0,0 +1,133 @@
+"""
+Helpers for the streaming mode of the analyze endpoint.
+
+Streaming responses are a sequence of progress events, written either as
+newline-delimited JSON (application/x-ndjson, the default) or as
+server-sent events (text/event-stream) when the client asks for them.
+"""
+
+import json
+import re
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+SSE_MIMETYPE = 'text/event-stream'
+
+SUMMARY_KEY_RE = re.compile(r'"summary"\s*:\s*"')
+
+JSON_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+
+def stream_mimetype(request):
+    """
+    Work out whether the client asked for a streamed response, and in which format.
+
+    Streaming is opt-in, either with ?stream=1 (NDJSON) or an Accept header
+    naming one of the streaming media types.
+
+    Args:
+        request (flask.Request): The incoming request
+
+    Returns:
+        str: The streaming mimetype, or None for a regular JSON response
+    """
+    accept = request.headers.get('Accept', '')
+    if SSE_MIMETYPE in accept:
+        return SSE_MIMETYPE
+    if NDJSON_MIMETYPE in accept or request.args.get('stream', '').lower() in ('1', 'true', 'ndjson'):
+        return NDJSON_MIMETYPE
+    if request.args.get('stream', '').lower() == 'sse':
+        return SSE_MIMETYPE
+    return None
+
+
+def format_event(event, mimetype, **fields):
+    """
+    Serialize one progress event.
+
+    Args:
+        event (str): Event name, e.g. 'fetched' or 'result'
+        mimetype (str): NDJSON_MIMETYPE or SSE_MIMETYPE
+        **fields: Event payload
+
+    Returns:
+        str: The framed event
+    """
+    payload = json.dumps(dict(event=event, **fields), separators=(',', ':'))
+    if mimetype == SSE_MIMETYPE:
+        return f'event: {event}\ndata: {payload}\n\n'
+    return payload + '\n'
+
+
+class SummaryStreamDecoder:
+    """
+    Pulls the "summary" string out of a JSON object while it is still being generated.
+
+    feed() takes each new chunk of model output and returns whatever part of
+    the summary value has become available, already unescaped, so it can be
+    forwarded to the client before the JSON document is complete.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._position = None
+        self.finished = False
+
+    def feed(self, chunk):
+        """
+        Add model output and return newly decoded summary text.
+
+        Args:
+            chunk (str): The next piece of raw model output
+
+        Returns:
+            str: Summary characters decoded from this chunk ('' if none)
+        """
+        self._buffer += chunk
+        if self.finished:
+            return ''
+
+        if self._position is None:
+            match = SUMMARY_KEY_RE.search(self._buffer)
+            if not match:
+                return ''
+            self._position = match.end()
+
+        buffer = self._buffer
+        position = self._position
+        decoded = []
+        while position < len(buffer):
+            char = buffer[position]
+            if char == '"':
+                self.finished = True
+                position += 1
+                break
+            if char != '\\':
+                decoded.append(char)
+                position += 1
+                continue
+            # Escape sequence - wait for the rest of it if it is split across chunks
+            if position + 1 >= len(buffer):
+                break
+            escape = buffer[position + 1]
+            if escape == 'u':
+                if position + 6 > len(buffer):
+                    break
+                try:
+                    decoded.append(chr(int(buffer[position + 2:position + 6], 16)))
+                except ValueError:
+                    pass
+                position += 6
+            else:
+                decoded.append(JSON_ESCAPES.get(escape, escape))
+                position += 2
+        self._position = position
+        return ''.join(decoded)
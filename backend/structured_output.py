@@ -0,0 +1,245 @@
+"""
+Schema-constrained model output: the response schema, a tolerant JSON
+extractor and a validator compiled from the schema.
+
+With structured output on, the backend is asked for application/json
+matching RESPONSE_SCHEMA, so replies are normally bare JSON and parse on the
+fast path. Replies from unconstrained backends often arrive wrapped in a
+```json fence or behind a sentence of preamble; extract_json finds the
+object in those without a second model call. validate_analysis then checks
+and coerces every field in one pass, so downstream code never has to patch
+missing keys. A reply without a credibility score is not an analysis and
+counts as a parse failure rather than being scored 5 by default.
+"""
+
+import json
+import re
+
+from metrics import get_registry
+
+# OpenAPI-subset schema in the form Vertex accepts for response_schema
+RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string'},
+        'credibility': {
+            'type': 'object',
+            'properties': {
+                'score': {'type': 'integer'},
+                'details': {'type': 'string'}
+            },
+            'required': ['score', 'details']
+        },
+        'techniques': {'type': 'array', 'items': {'type': 'string'}},
+        'imageAnalysis': {'type': 'string'}
+    },
+    'required': ['summary', 'credibility', 'techniques', 'imageAnalysis']
+}
+
+# Used when a field is missing or unusable
+FIELD_DEFAULTS = {
+    'summary': 'Analysis completed',
+    'credibility.score': 5,
+    'credibility.details': 'Analysis incomplete',
+    'techniques': [],
+    'imageAnalysis': 'No image submitted.'
+}
+
+SCORE_RANGE = (1, 10)
+
+FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+SCORE_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+PARSES = get_registry().counter(
+    'satya_model_output_parse_total',
+    'Model replies by parse outcome (ok, extracted from fences or preamble, coerced to the schema, failed).',
+    ['outcome']
+)
+
+_decoder = json.JSONDecoder()
+
+
+class ModelOutputError(Exception):
+    """Raised when a model reply contains no usable JSON analysis."""
+
+
+def extract_json(text):
+    """
+    Parse the JSON object in a model reply.
+
+    Bare JSON takes the fast path; otherwise the object is taken from a
+    fenced block or from the first '{' onwards, ignoring trailing text.
+
+    Args:
+        text (str): Raw model output
+
+    Returns:
+        tuple: (parsed dict, True if it had to be extracted)
+
+    Raises:
+        ModelOutputError: If no JSON object can be found
+    """
+    if not text or not text.strip():
+        raise ModelOutputError("Empty response from AI model")
+
+    stripped = text.strip()
+    if stripped[0] == '{':
+        try:
+            parsed = json.loads(stripped)
+            if isinstance(parsed, dict):
+                return parsed, False
+        except json.JSONDecodeError:
+            pass
+
+    candidates = [match.group(1) for match in FENCE_RE.finditer(stripped)] + [stripped]
+    for candidate in candidates:
+        start = candidate.find('{')
+        while start != -1:
+            try:
+                parsed, _ = _decoder.raw_decode(candidate, start)
+                if isinstance(parsed, dict):
+                    return parsed, True
+            except json.JSONDecodeError:
+                pass
+            start = candidate.find('{', start + 1)
+    raise ModelOutputError("AI response contains no JSON object")
+
+
+def _coerce_string(value):
+    if isinstance(value, str):
+        return value.strip() or None, False
+    if value is None:
+        return None, False
+    return str(value), True
+
+
+def _coerce_score(value):
+    # Accept 7, 7.4, "7", "7/10"; clamp to the score range
+    if isinstance(value, bool):
+        return None, False
+    if isinstance(value, (int, float)):
+        number, coerced = value, not isinstance(value, int)
+    elif isinstance(value, str):
+        match = SCORE_RE.search(value)
+        if not match:
+            return None, False
+        number, coerced = float(match.group()), True
+    else:
+        return None, False
+    score = int(round(number))
+    clamped = max(SCORE_RANGE[0], min(SCORE_RANGE[1], score))
+    return clamped, coerced or clamped != score
+
+
+def _coerce_string_list(value):
+    if isinstance(value, str):
+        items, coerced = re.split(r'[,;\n]', value), True
+    elif isinstance(value, list):
+        items, coerced = value, False
+    else:
+        return None, value is not None
+    result = []
+    for item in items:
+        text = item.strip() if isinstance(item, str) else (str(item) if item is not None else '')
+        if text and text not in result:
+            result.append(text)
+        else:
+            coerced = True
+    return result, coerced or not isinstance(value, list)
+
+
+COERCERS = {
+    'string': _coerce_string,
+    'integer': _coerce_score,
+    'array': _coerce_string_list
+}
+
+
+def compile_validator(schema, defaults=FIELD_DEFAULTS):
+    """
+    Build a validator for a flat-or-nested object schema.
+
+    The schema is walked once here; the returned function only runs the
+    per-field coercers.
+
+    Args:
+        schema (dict): RESPONSE_SCHEMA-style object schema
+        defaults (dict): Default per dotted field path
+
+    Returns:
+        callable: validate(data) -> (normalized dict, {field path: 'coerced'
+        or 'missing'})
+    """
+    fields = []
+
+    def walk(node, path):
+        for name, spec in node['properties'].items():
+            field_path = path + (name,)
+            if spec['type'] == 'object':
+                walk(spec, field_path)
+            else:
+                fields.append((field_path, '.'.join(field_path), COERCERS[spec['type']]))
+
+    walk(schema, ())
+
+    def validate(data):
+        normalized = {}
+        issues = {}
+        for field_path, dotted, coerce in fields:
+            value = data
+            for name in field_path:
+                value = value.get(name) if isinstance(value, dict) else None
+            value, coerced = coerce(value)
+            if value is None:
+                value = list(defaults[dotted]) if isinstance(defaults[dotted], list) else defaults[dotted]
+                issues[dotted] = 'missing'
+            elif coerced:
+                issues[dotted] = 'coerced'
+            target = normalized
+            for name in field_path[:-1]:
+                target = target.setdefault(name, {})
+            target[field_path[-1]] = value
+        return normalized, issues
+
+    return validate
+
+
+validate_analysis = compile_validator(RESPONSE_SCHEMA)
+
+
+def parse_analysis(text):
+    """
+    Extract, validate and normalize a model reply, recording the outcome.
+
+    Args:
+        text (str): Raw model output
+
+    Returns:
+        tuple: (analysis in the prompt schema, {field path: 'coerced' or
+        'missing'} for fields that did not match the schema)
+
+    Raises:
+        ModelOutputError: If the reply holds no JSON object or no score
+    """
+    try:
+        data, extracted = extract_json(text)
+        analysis, issues = validate_analysis(data)
+        if issues.get('credibility.score') == 'missing':
+            raise ModelOutputError("AI response has no credibility score")
+    except ModelOutputError:
+        PARSES.inc(outcome='failed')
+        raise
+    if issues:
+        PARSES.inc(outcome='coerced')
+    elif extracted:
+        PARSES.inc(outcome='extracted')
+    else:
+        PARSES.inc(outcome='ok')
+    return analysis, issues
+
+
+def health_score(analysis):
+    """
+    Map the 1-10 credibility score onto the frontend's 10-100 scale.
+    """
+    return max(10, min(100, analysis['credibility']['score'] * 10))
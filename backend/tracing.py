@@ -0,0 +1,214 @@
+"""
+Per-request stage timing for the analysis pipeline.
+
+A Trace is started at each entry point and made current through a context
+variable, so pipeline code deep in the call stack can time itself with
+stage('model_call') without being handed the trace. Every stage duration and
+the request total are observed into histograms on the metrics registry, and
+annotate() writes the real timings into a verdict's analysisMetadata.
+
+Slow requests can be profiled: with TRACE_PROFILE_SAMPLE_RATE above zero a
+sampled fraction of requests runs under cProfile, and the profile is logged
+(and written to TRACE_PROFILE_DIR when set) if the request ends up slower
+than TRACE_SLOW_REQUEST_SECONDS.
+"""
+
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+TRACE_SLOW_REQUEST_SECONDS = float(os.environ.get('TRACE_SLOW_REQUEST_SECONDS', 5))
+TRACE_PROFILE_SAMPLE_RATE = float(os.environ.get('TRACE_PROFILE_SAMPLE_RATE', 0))
+TRACE_PROFILE_DIR = os.environ.get('TRACE_PROFILE_DIR')
+TRACE_PROFILE_TOP = 25
+
+STAGE_SECONDS = get_registry().histogram(
+    'satya_stage_duration_seconds', 'Time spent in each analysis pipeline stage.', ['stage']
+)
+REQUEST_SECONDS = get_registry().histogram(
+    'satya_request_duration_seconds', 'End-to-end analysis request time.', ['endpoint']
+)
+
+_current_trace = contextvars.ContextVar('satya_trace', default=None)
+
+# cProfile can only attach one profiler at a time, so profiles never overlap
+_profile_lock = threading.Lock()
+
+
+def utc_timestamp(epoch_seconds=None):
+    """
+    Format a time as the ISO-8601 UTC timestamp used in analysisMetadata.
+    """
+    moment = datetime.fromtimestamp(time.time() if epoch_seconds is None else epoch_seconds, tz=timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class Trace:
+    """
+    Stage timings for one request.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages = {}
+        self._token = None
+        self._profiler = None
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            # A stage can run more than once per request (e.g. a retried call)
+            self.stages[name] = self.stages.get(name, 0.0) + duration
+            STAGE_SECONDS.observe(duration, stage=name)
+
+    def metadata(self):
+        """
+        Timing fields for analysisMetadata, as of now.
+
+        Returns:
+            dict: processingTime, timestamp and per-stage milliseconds
+        """
+        return {
+            'processingTime': f'{self.elapsed():.2f}s',
+            'timestamp': utc_timestamp(self.started_at),
+            'stages': {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        }
+
+    def annotate(self, analysis_result):
+        """
+        Replace the timing fields of a verdict with this request's measurements.
+
+        Cached verdicts carry the timings of the request that produced them,
+        so this runs on every response, hit or miss.
+        """
+        if isinstance(analysis_result, dict):
+            analysis_result.setdefault('analysisMetadata', {}).update(self.metadata())
+        return analysis_result
+
+    def _start_profiler(self):
+        if TRACE_PROFILE_SAMPLE_RATE <= 0 or random.random() >= TRACE_PROFILE_SAMPLE_RATE:
+            return
+        if not _profile_lock.acquire(blocking=False):
+            return
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            self._profiler = profiler
+        except Exception as e:
+            _profile_lock.release()
+            logger.warning(f"Could not start request profiler: {str(e)}")
+
+    def _finish_profiler(self, total):
+        profiler, self._profiler = self._profiler, None
+        try:
+            profiler.disable()
+            if total < TRACE_SLOW_REQUEST_SECONDS:
+                return
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(TRACE_PROFILE_TOP)
+            logger.warning(f"Profile of slow {self.endpoint} request ({total:.2f}s):\n{report.getvalue()}")
+            if TRACE_PROFILE_DIR:
+                os.makedirs(TRACE_PROFILE_DIR, exist_ok=True)
+                path = os.path.join(TRACE_PROFILE_DIR, f'{self.endpoint}-{int(self.started_at * 1000)}.prof')
+                profiler.dump_stats(path)
+        except Exception as e:
+            logger.warning(f"Could not write request profile: {str(e)}")
+        finally:
+            _profile_lock.release()
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        self._start_profiler()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total = self.elapsed()
+        REQUEST_SECONDS.observe(total, endpoint=self.endpoint)
+        if self._profiler is not None:
+            self._finish_profiler(total)
+        if total >= TRACE_SLOW_REQUEST_SECONDS:
+            breakdown = ', '.join(f'{name}={seconds:.2f}s' for name, seconds in self.stages.items())
+            logger.warning(f"Slow {self.endpoint} request: {total:.2f}s ({breakdown})")
+        try:
+            _current_trace.reset(self._token)
+        except ValueError:
+            # Exited from another context, e.g. a generator resumed elsewhere
+            _current_trace.set(None)
+        return False
+
+
+def start_trace(endpoint):
+    """
+    Create a trace for one request; use it as a context manager.
+
+    Args:
+        endpoint (str): Label for the request histogram, e.g. 'analyze'
+
+    Returns:
+        Trace: The new trace
+    """
+    return Trace(endpoint)
+
+
+def current_trace():
+    """
+    Return the trace of the request being handled, or None.
+    """
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage against the current trace.
+
+    Outside a traced request the duration still feeds the stage histogram.
+
+    Args:
+        name (str): Stage name, e.g. 'fetch' or 'model_call'
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace.stage(name):
+            yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def timing_metadata():
+    """
+    Timing fields for a verdict built outside or midway through a request.
+
+    Returns:
+        dict: processingTime and timestamp from the current trace, or the
+            current time with no elapsed time when untraced
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return {'processingTime': '0.00s', 'timestamp': utc_timestamp()}
+    return {'processingTime': f'{trace.elapsed():.2f}s', 'timestamp': utc_timestamp(trace.started_at)}
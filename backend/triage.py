@@ -0,0 +1,152 @@
+"""
+Heuristic triage ahead of the model.
+
+Most submissions are not hard calls: a post stacked with miracle-cure and
+cover-up language, or an abstract dense with study and journal references,
+gets the same verdict from the model as from the heuristic analyzer. Triage
+scores every text with the heuristic first and answers it directly when the
+indicators leave no doubt, so only ambiguous content spends a model call.
+
+Content is confidently low credibility when it carries at least
+TRIAGE_LOW_MIN_FLAGS suspicious or conspiracy terms, few factual ones
+against them, and a heuristic score of at most TRIAGE_LOW_MAX_SCORE.
+Confidently high credibility is the mirror image: at least
+TRIAGE_HIGH_MIN_FACTUAL factual terms, few red flags or emotional triggers,
+and a score of at least TRIAGE_HIGH_MIN_SCORE. "Few" means no more than
+TRIAGE_MAX_OPPOSING_SHARE of the dominant count, so long articles are held
+to the same standard as short posts. Content under TRIAGE_MIN_WORDS words,
+and images, which the heuristic cannot see, always go to the model.
+
+TRIAGE_MODE is 'on' (answer confident items), 'shadow' (decide and count,
+but still call the model - for calibrating thresholds against real
+verdicts) or 'off'.
+"""
+
+import logging
+import os
+
+from heuristic import score_content
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+TRIAGE_MODE = os.environ.get('TRIAGE_MODE', 'on').lower()
+TRIAGE_MIN_WORDS = int(os.environ.get('TRIAGE_MIN_WORDS', 40))
+TRIAGE_LOW_MIN_FLAGS = int(os.environ.get('TRIAGE_LOW_MIN_FLAGS', 3))
+TRIAGE_LOW_MAX_SCORE = int(os.environ.get('TRIAGE_LOW_MAX_SCORE', 30))
+TRIAGE_HIGH_MIN_FACTUAL = int(os.environ.get('TRIAGE_HIGH_MIN_FACTUAL', 4))
+TRIAGE_HIGH_MIN_SCORE = int(os.environ.get('TRIAGE_HIGH_MIN_SCORE', 80))
+# Opposing indicators allowed, as a share of the dominant count
+TRIAGE_MAX_OPPOSING_SHARE = float(os.environ.get('TRIAGE_MAX_OPPOSING_SHARE', 0.2))
+
+DECISIONS = get_registry().counter(
+    'satya_triage_decisions_total',
+    'Triage decisions by route (heuristic answered, model called) and label (low, high, uncertain, ineligible).',
+    ['route', 'label']
+)
+
+
+class TriageDecision:
+    """
+    Where one piece of content is analyzed, and why.
+
+    Args:
+        route (str): 'heuristic' when the heuristic verdict is served, else 'model'
+        label (str): 'low' or 'high' for a confident call, 'uncertain' when
+            the indicators are mixed or weak, 'ineligible' when the content
+            cannot be triaged
+        verdict (heuristic.HeuristicVerdict): The heuristic verdict, if scored
+    """
+
+    def __init__(self, route, label, verdict=None):
+        self.route = route
+        self.label = label
+        self.verdict = verdict
+
+    @property
+    def answered(self):
+        return self.route == 'heuristic'
+
+    def metadata(self):
+        """
+        Triage details for analysisMetadata.
+        """
+        details = {'route': self.route, 'label': self.label}
+        if self.verdict is not None:
+            details['heuristicScore'] = self.verdict.score
+        return details
+
+
+def classify_verdict(verdict):
+    """
+    Label a heuristic verdict as a confident call or an uncertain one.
+
+    Args:
+        verdict (heuristic.HeuristicVerdict): The verdict to judge
+
+    Returns:
+        str: 'low', 'high' or 'uncertain'
+    """
+    indicators = verdict.indicators
+    factual = indicators['factual']
+    red_flags = indicators['suspicious'] + indicators['conspiracy']
+
+    if (red_flags >= TRIAGE_LOW_MIN_FLAGS
+            and factual <= red_flags * TRIAGE_MAX_OPPOSING_SHARE
+            and verdict.score <= TRIAGE_LOW_MAX_SCORE):
+        return 'low'
+    if (factual >= TRIAGE_HIGH_MIN_FACTUAL
+            and red_flags + indicators['emotional'] <= factual * TRIAGE_MAX_OPPOSING_SHARE
+            and verdict.score >= TRIAGE_HIGH_MIN_SCORE):
+        return 'high'
+    return 'uncertain'
+
+
+def triage_content(content_type, content_data):
+    """
+    Decide whether the heuristic can answer for the content or the model is needed.
+
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data: The content to analyze (fetched text for URLs)
+
+    Returns:
+        TriageDecision: The decision, or None when triage is off
+    """
+    if TRIAGE_MODE == 'off':
+        return None
+
+    if content_type == 'image' or not isinstance(content_data, str):
+        decision = TriageDecision('model', 'ineligible')
+    else:
+        verdict = score_content(content_data)
+        if verdict.word_count < TRIAGE_MIN_WORDS:
+            decision = TriageDecision('model', 'ineligible', verdict)
+        else:
+            label = classify_verdict(verdict)
+            confident = label != 'uncertain' and TRIAGE_MODE == 'on'
+            decision = TriageDecision('heuristic' if confident else 'model', label, verdict)
+
+    DECISIONS.inc(route=decision.route, label=decision.label)
+    logger.info(f"Triage: {content_type} content routed to {decision.route} ({decision.label})")
+    return decision
+
+
+def collect_triage_metrics():
+    """
+    Metrics collector exposing the share of triaged requests answered without the model.
+
+    Returns:
+        list: (name, kind, documentation, samples) tuples for metrics.MetricsRegistry
+    """
+    answered = sum(DECISIONS.value(route='heuristic', label=label) for label in ('low', 'high'))
+    total = answered + sum(
+        DECISIONS.value(route='model', label=label) for label in ('low', 'high', 'uncertain', 'ineligible')
+    )
+    if not total:
+        return []
+    return [
+        ('satya_triage_model_calls_avoided_ratio', 'gauge',
+         'Share of triaged requests answered by the heuristic instead of the model.',
+         [({}, answered / total)])
+    ]
@@ -0,0 +1,387 @@
+"""
+Content-addressed cache for analysis verdicts.
+
+Verdicts are keyed on a hash of the normalized content together with the
+content type, prompt version and model name, so a prompt or model change
+never serves stale results. Lookups go through an in-process LRU tier first
+and then, when configured, a shared SQLite tier that several instances can
+point at.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from chunking import whitespace_slices
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_content(content_data):
+    """
+    Normalize content so trivially different submissions share a cache key.
+
+    Args:
+        content_data (str): Raw content submitted for analysis
+
+    Returns:
+        str: NFKC-normalized content with whitespace runs collapsed
+    """
+    text = unicodedata.normalize('NFKC', str(content_data))
+    return ' '.join(text.split())
+
+
+def content_digest(content_data):
+    """
+    SHA-256 of normalize_content(content_data), computed a slice at a time.
+
+    Slices end after an ASCII space or newline, where neither NFKC nor the
+    whitespace collapsing can span the cut, so the digest matches the
+    one-shot normalization while a multi-megabyte submission is never
+    normalized (or split into words) all at once.
+
+    Args:
+        content_data (str): Raw content submitted for analysis
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    separator = b''
+    for piece in whitespace_slices(str(content_data)):
+        normalized = normalize_content(piece)
+        if normalized:
+            digest.update(separator + normalized.encode('utf-8'))
+            separator = b' '
+    return digest.hexdigest()
+
+
+def make_cache_key(content_type, content_data, prompt_version, model_name):
+    """
+    Build the content-addressed cache key for a verdict.
+
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The content that will be sent to the model
+        prompt_version (str): Version tag of the analysis prompt
+        model_name (str): Name of the model producing the verdict
+
+    Returns:
+        str: Hex SHA-256 digest identifying the verdict
+    """
+    content_hash = content_digest(content_data)
+    key_material = '\x1f'.join([content_type, prompt_version, model_name, content_hash])
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+class LRUTier:
+    """
+    In-process LRU tier bounded by entry count, total bytes and TTL.
+
+    Values are stored as serialized JSON so every hit hands out a fresh copy
+    and the byte accounting reflects what is actually held in memory.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Return the serialized entry for a key, or None if missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload, cost_seconds = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return payload, cost_seconds
+
+    def set(self, key, payload, cost_seconds=0.0, expires_at=None):
+        """
+        Store a serialized entry, evicting least recently used entries as needed.
+        """
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        if expires_at is None:
+            expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, payload, cost_seconds)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+class SQLiteTier:
+    """
+    Shared cache tier backed by a local SQLite file.
+
+    Several worker processes on the same host (or instances sharing a mounted
+    volume) can point at the same file to share hits.
+    """
+
+    def __init__(self, path, ttl_seconds=3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS verdicts ('
+            'key TEXT PRIMARY KEY, payload TEXT NOT NULL, '
+            'cost_seconds REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Return (payload, cost_seconds, expires_at) for a key, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload, cost_seconds, expires_at FROM verdicts WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] <= time.time():
+                self._conn.execute('DELETE FROM verdicts WHERE key = ?', (key,))
+                self._conn.commit()
+                self.expirations += 1
+                return None
+            return row
+
+    def set(self, key, payload, cost_seconds=0.0):
+        """
+        Store a serialized entry in the shared tier.
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO verdicts (key, payload, cost_seconds, expires_at) VALUES (?, ?, ?, ?)',
+                (key, payload, cost_seconds, time.time() + self.ttl_seconds)
+            )
+            self._conn.commit()
+
+    def prune(self):
+        """
+        Delete expired rows from the shared tier.
+
+        Returns:
+            int: Number of rows removed
+        """
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM verdicts WHERE expires_at <= ?', (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+
+class VerdictCache:
+    """
+    Two-tier verdict cache with hit/miss/eviction counters.
+    """
+
+    def __init__(self, local_tier, shared_tier=None):
+        self.local = local_tier
+        self.shared = shared_tier
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self.seconds_saved = 0.0
+
+    def get(self, key):
+        """
+        Look up a verdict by key.
+
+        Args:
+            key (str): Cache key from make_cache_key
+
+        Returns:
+            dict: A fresh copy of the cached verdict, or None on a miss
+        """
+        entry = self.local.get(key)
+        if entry is not None:
+            payload, cost_seconds = entry
+            self._record_hit(cost_seconds, shared=False)
+            return json.loads(payload)
+
+        if self.shared is not None:
+            try:
+                row = self.shared.get(key)
+            except sqlite3.Error as db_error:
+                logger.warning(f"Shared verdict cache lookup failed: {str(db_error)}")
+                row = None
+                with self._lock:
+                    self.errors += 1
+            if row is not None:
+                payload, cost_seconds, expires_at = row
+                # Promote to the local tier without extending the shared TTL
+                self.local.set(key, payload, cost_seconds, expires_at=expires_at)
+                self._record_hit(cost_seconds, shared=True)
+                return json.loads(payload)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, verdict, cost_seconds=0.0):
+        """
+        Store a verdict in every configured tier.
+
+        Args:
+            key (str): Cache key from make_cache_key
+            verdict (dict): JSON-serializable analysis result
+            cost_seconds (float): Time it took to produce the verdict
+        """
+        payload = json.dumps(verdict, separators=(',', ':'))
+        self.local.set(key, payload, cost_seconds)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, payload, cost_seconds)
+            except sqlite3.Error as db_error:
+                logger.warning(f"Shared verdict cache write failed: {str(db_error)}")
+                with self._lock:
+                    self.errors += 1
+        with self._lock:
+            self.stores += 1
+
+    def _record_hit(self, cost_seconds, shared):
+        with self._lock:
+            self.hits += 1
+            if shared:
+                self.shared_hits += 1
+            else:
+                self.local_hits += 1
+            self.seconds_saved += cost_seconds
+
+    def stats(self):
+        """
+        Snapshot of cache counters.
+
+        Returns:
+            dict: Hit, miss, eviction and size counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'localHits': self.local_hits,
+                'sharedHits': self.shared_hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.local.evictions,
+                'expirations': self.local.expirations + (self.shared.expirations if self.shared else 0),
+                'errors': self.errors,
+                'entries': len(self.local),
+                'bytes': self.local.size_bytes,
+                'estimatedSecondsSaved': round(self.seconds_saved, 3)
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache():
+    """
+    Return the process-wide verdict cache configured from the environment.
+
+    Environment:
+        VERDICT_CACHE_ENABLED: Set to 0 to disable caching (default 1)
+        VERDICT_CACHE_MAX_ENTRIES: Local tier entry limit (default 1024)
+        VERDICT_CACHE_MAX_BYTES: Local tier byte limit (default 16 MiB)
+        VERDICT_CACHE_TTL_SECONDS: Entry lifetime in both tiers (default 3600)
+        VERDICT_CACHE_SHARED_PATH: SQLite file for the shared tier (disabled if unset)
+
+    Returns:
+        VerdictCache: The cache, or None when caching is disabled
+    """
+    global _cache
+    if os.environ.get('VERDICT_CACHE_ENABLED', '1') == '0':
+        return None
+    if _cache is not None:
+        return _cache
+    with _cache_lock:
+        if _cache is None:
+            ttl_seconds = float(os.environ.get('VERDICT_CACHE_TTL_SECONDS', 3600))
+            local_tier = LRUTier(
+                max_entries=int(os.environ.get('VERDICT_CACHE_MAX_ENTRIES', 1024)),
+                max_bytes=int(os.environ.get('VERDICT_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+                ttl_seconds=ttl_seconds
+            )
+            shared_tier = None
+            shared_path = os.environ.get('VERDICT_CACHE_SHARED_PATH')
+            if shared_path:
+                try:
+                    shared_tier = SQLiteTier(shared_path, ttl_seconds=ttl_seconds)
+                    logger.info(f"Shared verdict cache enabled at {shared_path}")
+                except sqlite3.Error as db_error:
+                    logger.error(f"Failed to open shared verdict cache: {str(db_error)}")
+            _cache = VerdictCache(local_tier, shared_tier)
+    return _cache
+
+
+def collect_cache_metrics():
+    """
+    Metrics collector exposing the verdict cache counters.
+
+    Returns:
+        list: (name, kind, documentation, samples) tuples for metrics.MetricsRegistry
+    """
+    # A scrape must not create the cache (or open the shared tier) itself
+    cache = _cache
+    if cache is None:
+        return []
+    stats = cache.stats()
+    return [
+        ('satya_verdict_cache_lookups_total', 'counter', 'Verdict cache lookups by outcome.', [
+            ({'outcome': 'local_hit'}, stats['localHits']),
+            ({'outcome': 'shared_hit'}, stats['sharedHits']),
+            ({'outcome': 'miss'}, stats['misses'])
+        ]),
+        ('satya_verdict_cache_stores_total', 'counter', 'Verdicts written to the cache.', [({}, stats['stores'])]),
+        ('satya_verdict_cache_evictions_total', 'counter', 'Local tier evictions.', [({}, stats['evictions'])]),
+        ('satya_verdict_cache_expirations_total', 'counter', 'Entries dropped after their TTL.', [({}, stats['expirations'])]),
+        ('satya_verdict_cache_errors_total', 'counter', 'Shared tier errors.', [({}, stats['errors'])]),
+        ('satya_verdict_cache_entries', 'gauge', 'Entries in the local tier.', [({}, stats['entries'])]),
+        ('satya_verdict_cache_bytes', 'gauge', 'Bytes held by the local tier.', [({}, stats['bytes'])]),
+        ('satya_verdict_cache_seconds_saved_total', 'counter', 'Estimated analysis seconds saved by cache hits.',
+         [({}, stats['estimatedSecondsSaved'])])
+    ]
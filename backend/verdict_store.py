@@ -0,0 +1,414 @@
+"""
+Append-only history of served verdicts.
+
+Every verdict returned to a caller - from the model, the caches, triage or
+a fallback - is appended to a local SQLite file (VERDICT_STORE_PATH), so
+history pages and trend reports can look past verdicts up by content hash,
+URL, domain, user and time without analyzing anything again.
+
+Requests never touch the database. record_verdict serializes the verdict
+and puts it on a bounded queue (VERDICT_STORE_QUEUE_SIZE); when the queue
+is full the record is dropped and counted rather than making the request
+wait. A single writer thread drains the queue, inserting up to
+VERDICT_STORE_BATCH_SIZE records per transaction at least every
+VERDICT_STORE_FLUSH_SECONDS.
+
+Rows are never updated. Compaction, run by the writer every
+VERDICT_STORE_COMPACT_INTERVAL seconds, deletes rows older than
+VERDICT_STORE_COMPACT_AFTER_DAYS for which the same user has a newer
+verdict on the same content, then everything older than
+VERDICT_STORE_RETENTION_DAYS, and returns the freed pages to the file
+system.
+
+Queries page newest first with a keyset cursor, so a page costs the same
+however deep into the history it is.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from metrics import get_registry
+from verdict_cache import content_digest
+
+logger = logging.getLogger(__name__)
+
+VERDICT_STORE_ENABLED = os.environ.get('VERDICT_STORE_ENABLED', '1') != '0'
+VERDICT_STORE_PATH = os.environ.get(
+    'VERDICT_STORE_PATH', os.path.join(tempfile.gettempdir(), 'satya-verdicts.sqlite3')
+)
+# Records waiting for the writer; more are dropped
+VERDICT_STORE_QUEUE_SIZE = int(os.environ.get('VERDICT_STORE_QUEUE_SIZE', 10000))
+VERDICT_STORE_BATCH_SIZE = int(os.environ.get('VERDICT_STORE_BATCH_SIZE', 256))
+VERDICT_STORE_FLUSH_SECONDS = float(os.environ.get('VERDICT_STORE_FLUSH_SECONDS', 1))
+VERDICT_STORE_COMPACT_AFTER_DAYS = float(os.environ.get('VERDICT_STORE_COMPACT_AFTER_DAYS', 30))
+VERDICT_STORE_RETENTION_DAYS = float(os.environ.get('VERDICT_STORE_RETENTION_DAYS', 365))
+VERDICT_STORE_COMPACT_INTERVAL = float(os.environ.get('VERDICT_STORE_COMPACT_INTERVAL', 3600))
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Rows deleted per statement while compacting, so readers are never held off for long
+COMPACT_DELETE_BATCH = 5000
+
+COLUMNS = ('created_at', 'content_type', 'content_hash', 'url', 'domain', 'user_id',
+           'health_score', 'served_by', 'cached', 'payload')
+
+RECORDS = get_registry().counter(
+    'satya_verdict_store_records_total',
+    'Verdict history records by outcome (written, dropped when the queue was full, failed to write).',
+    ['outcome']
+)
+BATCHES = get_registry().histogram(
+    'satya_verdict_store_batch_size',
+    'Records per verdict history write transaction.',
+    buckets=(1, 4, 16, 64, 256, 1024)
+)
+
+
+class VerdictStore:
+    """
+    SQLite verdict history with a batched background writer.
+
+    Args:
+        path (str): SQLite file holding the history
+        queue_size (int): Records buffered for the writer
+        batch_size (int): Most records per write transaction
+        flush_seconds (float): Longest a record waits for its batch
+        compact_after_days (float): Age after which superseded verdicts are removed
+        retention_days (float): Age after which every verdict is removed
+        compact_interval (float): Seconds between compactions (0 disables them)
+    """
+
+    def __init__(self, path=VERDICT_STORE_PATH, queue_size=VERDICT_STORE_QUEUE_SIZE,
+                 batch_size=VERDICT_STORE_BATCH_SIZE, flush_seconds=VERDICT_STORE_FLUSH_SECONDS,
+                 compact_after_days=VERDICT_STORE_COMPACT_AFTER_DAYS, retention_days=VERDICT_STORE_RETENTION_DAYS,
+                 compact_interval=VERDICT_STORE_COMPACT_INTERVAL):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.compact_after_days = compact_after_days
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+
+        self._write_conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        # Must be set before the first table exists for compaction to shrink the file
+        self._write_conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self._write_conn.execute('PRAGMA journal_mode=WAL')
+        self._write_conn.execute(
+            'CREATE TABLE IF NOT EXISTS verdicts ('
+            'id INTEGER PRIMARY KEY, created_at REAL NOT NULL, content_type TEXT NOT NULL, '
+            'content_hash TEXT NOT NULL, url TEXT, domain TEXT, user_id TEXT, '
+            'health_score INTEGER, served_by TEXT, cached INTEGER NOT NULL, payload TEXT NOT NULL)'
+        )
+        # Every lookup pages by time within its key
+        for column in ('content_hash', 'url', 'domain', 'user_id'):
+            self._write_conn.execute(
+                f'CREATE INDEX IF NOT EXISTS verdicts_{column} ON verdicts ({column}, created_at)'
+            )
+        self._write_conn.execute('CREATE INDEX IF NOT EXISTS verdicts_created_at ON verdicts (created_at)')
+        self._write_conn.commit()
+
+        # Readers get their own connection; WAL lets them run alongside the writer
+        self._read_conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._read_lock = threading.Lock()
+
+        self._compacted_at = time.monotonic()
+        self._writer = threading.Thread(target=self._run, name='verdict-store-writer', daemon=True)
+        self._writer.start()
+
+    def record(self, row):
+        """
+        Queue a row for the writer without blocking.
+
+        Args:
+            row (tuple): Values for COLUMNS
+
+        Returns:
+            bool: False if the queue was full and the row was dropped
+        """
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            RECORDS.inc(outcome='dropped')
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Wait until every row queued so far is written.
+
+        Returns:
+            bool: False if the timeout passed first
+        """
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                self._maybe_compact()
+                continue
+            batch = []
+            markers = []
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                if isinstance(item, threading.Event):
+                    # flush() marker: write what came before it now
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set()
+            self._maybe_compact()
+
+    def _write(self, batch):
+        try:
+            with self._write_conn:
+                self._write_conn.executemany(
+                    f"INSERT INTO verdicts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    batch
+                )
+        except sqlite3.Error as db_error:
+            RECORDS.inc(len(batch), outcome='failed')
+            logger.error(f"Failed to write {len(batch)} verdict history records: {str(db_error)}")
+            return
+        RECORDS.inc(len(batch), outcome='written')
+        BATCHES.observe(len(batch))
+
+    def _maybe_compact(self):
+        if self.compact_interval <= 0 or time.monotonic() - self._compacted_at < self.compact_interval:
+            return
+        self._compacted_at = time.monotonic()
+        try:
+            self.compact()
+        except sqlite3.Error as db_error:
+            logger.warning(f"Verdict history compaction failed: {str(db_error)}")
+
+    def compact(self, now=None):
+        """
+        Remove superseded and expired verdicts and release the space.
+
+        Runs on the writer thread; call it directly only when no writer is
+        active (maintenance scripts).
+
+        Returns:
+            int: Number of rows removed
+        """
+        now = now or time.time()
+        superseded_before = now - self.compact_after_days * 86400
+        expired_before = now - self.retention_days * 86400
+        removed = 0
+        statements = [
+            # An old verdict the same user has a newer one for, on the same content
+            ('SELECT id FROM verdicts AS old WHERE created_at < ? AND EXISTS ('
+             'SELECT 1 FROM verdicts AS newer WHERE newer.content_hash = old.content_hash '
+             'AND newer.content_type = old.content_type AND newer.user_id IS old.user_id '
+             'AND newer.created_at > old.created_at) LIMIT ?', superseded_before),
+            ('SELECT id FROM verdicts WHERE created_at < ? LIMIT ?', expired_before)
+        ]
+        for select, cutoff in statements:
+            while True:
+                with self._write_conn:
+                    cursor = self._write_conn.execute(
+                        f'DELETE FROM verdicts WHERE id IN ({select})', (cutoff, COMPACT_DELETE_BATCH)
+                    )
+                removed += cursor.rowcount
+                if cursor.rowcount < COMPACT_DELETE_BATCH:
+                    break
+        if removed:
+            self._write_conn.execute('PRAGMA incremental_vacuum')
+            self._write_conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            logger.info(f"Compacted verdict history: removed {removed} rows")
+        return removed
+
+    def query(self, content_hash=None, url=None, domain=None, user_id=None, since=None, until=None,
+              limit=HISTORY_PAGE_SIZE, cursor=None):
+        """
+        Page through verdicts matching every given filter, newest first.
+
+        Args:
+            content_hash (str): verdict_cache.content_digest of the content
+            url (str): Submitted URL
+            domain (str): Host of the submitted URL
+            user_id (str): User the verdicts were served to
+            since (float): Earliest creation time (Unix seconds, inclusive)
+            until (float): Latest creation time (Unix seconds, exclusive)
+            limit (int): Page size, at most HISTORY_MAX_PAGE_SIZE
+            cursor (str): nextCursor of the previous page
+
+        Returns:
+            dict: 'items' (verdict records) and 'nextCursor' (None on the last page)
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        clauses = []
+        params = []
+        for column, value in (('content_hash', content_hash), ('url', url), ('domain', domain), ('user_id', user_id)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(until)
+        if cursor:
+            created_at, _, row_id = cursor.partition(':')
+            clauses.append('(created_at, id) < (?, ?)')
+            params.extend([float(created_at), int(row_id)])
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                'SELECT id, created_at, content_type, content_hash, url, domain, health_score, served_by, cached, '
+                f'payload FROM verdicts{where} ORDER BY created_at DESC, id DESC LIMIT ?',
+                params + [limit + 1]
+            ).fetchall()
+
+        items = [
+            {
+                'id': row_id,
+                'createdAt': created_at,
+                'type': content_type,
+                'contentHash': row_hash,
+                'url': row_url,
+                'domain': row_domain,
+                'healthScore': health_score,
+                'servedBy': served_by,
+                'cached': bool(cached),
+                'verdict': json.loads(payload)
+            }
+            for row_id, created_at, content_type, row_hash, row_url, row_domain, health_score, served_by, cached, payload
+            in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = f"{items[-1]['createdAt']!r}:{items[-1]['id']}"
+        return {'items': items, 'nextCursor': next_cursor}
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=5):
+        """
+        Write out queued records; registered to run at interpreter exit.
+        """
+        if not self.flush(timeout):
+            logger.warning(f"Verdict history writer did not drain within {timeout}s; {self.queue_depth()} records lost")
+
+
+def url_domain(url):
+    """
+    Lowercased host of a URL, without a leading "www.", or None.
+    """
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    return host[4:] if host.startswith('www.') else host
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_verdict_store():
+    """
+    Return the process-wide verdict store, opening VERDICT_STORE_PATH on first use.
+
+    Returns:
+        VerdictStore: The store, or None when disabled or the file cannot be opened
+    """
+    global _store
+    if not VERDICT_STORE_ENABLED:
+        return None
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = VerdictStore()
+            except sqlite3.Error as db_error:
+                logger.error(f"Failed to open verdict history at {VERDICT_STORE_PATH}: {str(db_error)}")
+                return None
+            atexit.register(_store.close)
+    return _store
+
+
+def record_verdict(content_type, content_data, analysis_result, user_id=None, content_hash=None):
+    """
+    Append a served verdict to the history without waiting for the write.
+
+    The verdict is serialized here, so later changes to the dict (timings
+    added by the caller) are not recorded.
+
+    Args:
+        content_type (str): Type of content (text, url, image)
+        content_data (str): The content or URL as submitted
+        analysis_result (dict): The verdict served
+        user_id (str): User it was served to, if known (admission.Client.user)
+        content_hash (str): content_digest of content_data, if already computed
+    """
+    store = get_verdict_store()
+    if store is None or not isinstance(analysis_result, dict):
+        return
+    metadata = analysis_result.get('analysisMetadata', {})
+    url = content_data if content_type == 'url' else None
+    store.record((
+        time.time(),
+        content_type,
+        content_hash or content_digest(content_data),
+        url,
+        url_domain(url) if url else None,
+        user_id,
+        analysis_result.get('healthScore'),
+        metadata.get('servedBy'),
+        1 if metadata.get('cached') else 0,
+        json.dumps(analysis_result, separators=(',', ':'))
+    ))
+
+
+def collect_store_metrics():
+    """
+    Metrics collector exposing the verdict history write backlog.
+
+    Returns:
+        list: (name, kind, documentation, samples) tuples for metrics.MetricsRegistry
+    """
+    if _store is None:
+        return []
+    return [
+        ('satya_verdict_store_queue_depth', 'gauge', 'Verdict history records waiting for the writer.',
+         [({}, _store.queue_depth())])
+    ]